@@ -0,0 +1,18 @@
+# accounting_proj/db.py
+"""
+数据库连接初始化
+SQLite 每个新连接都要单独设置以下参数（在 FinanceAppConfig.ready 中注册到 connection_created 信号）：
+  - journal_mode=WAL：读写互不阻塞，写入只追加到 WAL 文件；
+  - synchronous=NORMAL：WAL 模式下只在检查点时同步磁盘，断电最多丢失最近的事务，不会损坏数据库。
+等待写锁的时间由 settings 中 DATABASES OPTIONS 的 timeout（取自 SQLITE_BUSY_TIMEOUT_MS）统一设置。
+"""
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """connection_created 信号处理：为新建的 SQLite 连接设置 WAL 等参数"""
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
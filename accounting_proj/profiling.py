@@ -0,0 +1,238 @@
+# accounting_proj/profiling.py
+"""
+请求性能采样
+RequestProfilingMiddleware（REQUEST_PROFILING = True 时启用）记录每个请求的：
+  - 总耗时；
+  - SQL 条数和 SQL 总耗时（通过 connection.execute_wrapper 统计，所有数据库连接）；
+  - 重复 SQL 条数：同一条 SQL 语句（参数不同也算）在一个请求内执行多次，通常是 N+1 查询；
+  - 模板渲染耗时（模板中惰性求值的查询同时计入 SQL 耗时）。
+采样结果保存在进程内的环形缓冲区（最近 REQUEST_PROFILING_BUFFER_SIZE 个请求），
+按视图汇总分位数后由 /admin/request-profile/ 以 JSON 返回（仅管理员可访问）；
+REQUEST_PROFILING_SERVER_TIMING = True 时同时输出 Server-Timing 响应头，可在浏览器开发者工具中查看。
+"""
+import contextvars
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.template.backends.django import Template as DjangoBackendTemplate
+
+DEFAULT_BUFFER_SIZE = 1000
+
+# 每个请求保留的重复 SQL 样例条数和长度
+DUPLICATE_SAMPLES = 3
+SQL_SAMPLE_LENGTH = 300
+
+_current_profile = contextvars.ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """一个请求的采样数据"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0
+        self.statements = Counter()
+        self.template_time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper：统计每条 SQL 的耗时"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql_count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        """(重复执行的次数, 重复最多的 SQL 样例)"""
+        repeated = [(sql, count) for sql, count in self.statements.items() if count > 1]
+        duplicate_count = sum(count - 1 for _, count in repeated)
+        repeated.sort(key=lambda item: item[1], reverse=True)
+        samples = [
+            {'sql': sql[:SQL_SAMPLE_LENGTH], 'count': count}
+            for sql, count in repeated[:DUPLICATE_SAMPLES]
+        ]
+        return duplicate_count, samples
+
+
+class ProfileBuffer:
+    """最近若干个请求的采样记录（环形缓冲区，线程安全）"""
+
+    def __init__(self, size=DEFAULT_BUFFER_SIZE):
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self._records.maxlen
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self):
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def summary(self):
+        """按视图汇总：请求数、总耗时 / SQL / 模板渲染的分位数、重复 SQL"""
+        by_view = defaultdict(list)
+        for record in self.records():
+            by_view[record['view']].append(record)
+
+        views = []
+        for view, records in by_view.items():
+            wall = [r['wall_ms'] for r in records]
+            sql_ms = [r['sql_ms'] for r in records]
+            sql_count = [r['sql_count'] for r in records]
+            template_ms = [r['template_ms'] for r in records]
+            worst = max(records, key=lambda r: r['duplicate_count'])
+            views.append({
+                'view': view,
+                'requests': len(records),
+                'wall_ms': percentiles(wall),
+                'sql_ms': percentiles(sql_ms),
+                'sql_count': {'avg': round(sum(sql_count) / len(sql_count), 1), 'max': max(sql_count)},
+                'template_ms': percentiles(template_ms),
+                'duplicate_queries': {
+                    'max': worst['duplicate_count'],
+                    'samples': worst['duplicate_samples'],
+                },
+            })
+        views.sort(key=lambda item: item['wall_ms']['p95'], reverse=True)
+        return views
+
+
+def percentile(values, pct):
+    """最近秩法分位数（values 已排序）"""
+    if not values:
+        return 0
+    index = min(int(round(pct / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def percentiles(values):
+    values = sorted(values)
+    return {
+        'p50': round(percentile(values, 50), 2),
+        'p90': round(percentile(values, 90), 2),
+        'p95': round(percentile(values, 95), 2),
+        'p99': round(percentile(values, 99), 2),
+        'max': round(values[-1], 2) if values else 0,
+    }
+
+
+profile_buffer = ProfileBuffer()
+
+_template_timer_lock = threading.Lock()
+_original_template_render = None
+
+
+def install_template_timer():
+    """
+    统计模板渲染耗时：包装 Django 模板后端的 Template.render（render()/render_to_string() 都经过这里），
+    嵌套的 include 不经过后端，不会重复计时
+    """
+    global _original_template_render
+    with _template_timer_lock:
+        if _original_template_render is not None:
+            return
+        _original_template_render = original = DjangoBackendTemplate.render
+
+        def render(self, context=None, request=None):
+            profile = _current_profile.get()
+            if profile is None:
+                return original(self, context, request)
+            started = time.perf_counter()
+            try:
+                return original(self, context, request)
+            finally:
+                profile.template_time += time.perf_counter() - started
+
+        DjangoBackendTemplate.render = render
+
+
+class RequestProfilingMiddleware:
+    """请求性能采样中间件，放在 MIDDLEWARE 最前面以包含其他中间件的耗时"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = getattr(settings, 'REQUEST_PROFILING_SERVER_TIMING', False)
+
+        global profile_buffer
+        buffer_size = getattr(settings, 'REQUEST_PROFILING_BUFFER_SIZE', DEFAULT_BUFFER_SIZE)
+        if profile_buffer.size != buffer_size:
+            profile_buffer = ProfileBuffer(buffer_size)
+        install_template_timer()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+
+        wall_time = time.perf_counter() - profile.started
+        duplicate_count, duplicate_samples = profile.duplicates()
+        match = request.resolver_match
+        profile_buffer.add({
+            'view': match.view_name if match else request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'wall_ms': wall_time * 1000,
+            'sql_count': profile.sql_count,
+            'sql_ms': profile.sql_time * 1000,
+            'duplicate_count': duplicate_count,
+            'duplicate_samples': duplicate_samples,
+            'template_ms': profile.template_time * 1000,
+            'time': time.time(),
+        })
+
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={profile.sql_time * 1000:.1f};desc="{profile.sql_count} queries, {duplicate_count} duplicate"',
+                f'tpl;dur={profile.template_time * 1000:.1f};desc="template"',
+                f'total;dur={wall_time * 1000:.1f}',
+            ])
+        return response
+
+
+@staff_member_required
+def request_profile_summary(request):
+    """
+    请求性能汇总（JSON）
+    参数：recent=N 同时返回最近 N 条原始记录
+    """
+    try:
+        recent = max(int(request.GET.get('recent', 0)), 0)
+    except ValueError:
+        recent = 0
+
+    data = {
+        'enabled': getattr(settings, 'REQUEST_PROFILING', False),
+        'buffer_size': profile_buffer.size,
+        'requests': len(profile_buffer.records()),
+        'views': profile_buffer.summary(),
+    }
+    if recent:
+        data['recent'] = profile_buffer.records()[-recent:]
+    return JsonResponse(data, json_dumps_params={'ensure_ascii': False})
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounting_proj.profiling.RequestProfilingMiddleware',  # 请求性能采样（REQUEST_PROFILING 开启时生效）
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,12 +82,52 @@ WSGI_APPLICATION = 'accounting_proj.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# 通过环境变量 ACCOUNTING_DB_PROFILE 选择数据库配置：
+#   sqlite（默认）：本地文件数据库，连接建立时开启 WAL 等参数（见 accounting_proj/db.py）
+#   postgres：生产环境，连接参数取自 ACCOUNTING_DB_NAME / USER / PASSWORD / HOST / PORT
+DB_PROFILE = os.environ.get('ACCOUNTING_DB_PROFILE', 'sqlite')
+
+# SQLite 等待写锁的最长毫秒数，超时后才报 database is locked（只通过下面 OPTIONS 的 timeout 设置）
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('ACCOUNTING_SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+if DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('ACCOUNTING_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # 写事务开始时就申请写锁，避免读锁升级为写锁时不经等待直接报 database is locked
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+            },
+        }
     }
-}
+elif DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('ACCOUNTING_DB_NAME', 'accounting'),
+            'USER': os.environ.get('ACCOUNTING_DB_USER', 'accounting'),
+            'PASSWORD': os.environ.get('ACCOUNTING_DB_PASSWORD', ''),
+            'HOST': os.environ.get('ACCOUNTING_DB_HOST', 'localhost'),
+            'PORT': os.environ.get('ACCOUNTING_DB_PORT', '5432'),
+            # 持久连接：每个工作线程复用连接 CONN_MAX_AGE 秒，复用前先检查连接是否可用
+            'CONN_MAX_AGE': int(os.environ.get('ACCOUNTING_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    # 连接池（需要 psycopg 3 和 psycopg-pool），与持久连接二选一
+    if os.environ.get('ACCOUNTING_DB_POOL') == '1':
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.environ.get('ACCOUNTING_DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.environ.get('ACCOUNTING_DB_POOL_MAX_SIZE', 10)),
+                'timeout': int(os.environ.get('ACCOUNTING_DB_POOL_TIMEOUT', 10)),
+            },
+        }
+else:
+    raise ImproperlyConfigured(f'不支持的数据库配置 ACCOUNTING_DB_PROFILE={DB_PROFILE}（可选 sqlite / postgres）')
 
 
 # Password validation
@@ -123,6 +166,50 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# 加载用户时一并取出扩展信息和角色，供权限判断使用
+AUTHENTICATION_BACKENDS = ['users_app.backends.ProfileModelBackend']
+
 LOGIN_URL = 'users:login'  # 未登录用户跳转至自定义登录页
 LOGIN_REDIRECT_URL =  'users:home'
-LOGOUT_REDIRECT_URL = 'users:login'  # 登出后跳转至登录页
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'users:login'  # 登出后跳转至登录页
+# 报表生成任务：登记到 ReportJob 表，由 `python manage.py run_report_worker` 在后台执行；
+# 为 True 时在提交请求内直接执行。开发环境（DEBUG）默认直接执行，不需要另外启动 worker，
+# 生产环境必须同时运行 worker，否则任务会一直停留在“排队中”
+REPORT_JOBS_RUN_INLINE = os.environ.get('ACCOUNTING_REPORT_JOBS_RUN_INLINE', '1' if DEBUG else '0') == '1'
+# 执行超过该秒数仍未结束的任务视为 worker 异常退出，领取任务和提交新任务时重新排队
+REPORT_JOB_STALE_TIMEOUT = int(os.environ.get('ACCOUNTING_REPORT_JOB_STALE_TIMEOUT', 1800))
+# 操作日志：默认放入进程内队列，由后台线程每攒够 OPERATION_LOG_BATCH_SIZE 条
+# 或每隔 OPERATION_LOG_FLUSH_INTERVAL_MS 毫秒批量写入一次；测试时设为 False 改为同步写入
+OPERATION_LOG_ASYNC = True
+OPERATION_LOG_BATCH_SIZE = 100
+OPERATION_LOG_FLUSH_INTERVAL_MS = 500
+# 操作日志归档：`python manage.py archive_oplog` 把超过保留月数的日志按月写入压缩文件后从日志表删除
+OPERATION_LOG_RETENTION_MONTHS = 6
+OPERATION_LOG_ARCHIVE_DIR = BASE_DIR / 'archives' / 'oplog'
+# 请求性能采样：记录每个请求的耗时、SQL 条数/耗时、重复 SQL 和模板渲染耗时，
+# 汇总结果见 /admin/request-profile/；SERVER_TIMING 为 True 时同时输出 Server-Timing 响应头
+REQUEST_PROFILING = os.environ.get('ACCOUNTING_REQUEST_PROFILING') == '1'
+REQUEST_PROFILING_BUFFER_SIZE = 1000
+REQUEST_PROFILING_SERVER_TIMING = DEBUG
+# 日志：输出到控制台，ACCOUNTING_LOG_LEVEL 控制本项目各模块的级别
+# （INFO 时每张报表输出一条汇总，DEBUG 时另外输出逐科目明细）
+LOG_LEVEL = os.environ.get('ACCOUNTING_LOG_LEVEL', 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'standard': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'standard',
+        },
+    },
+    'loggers': {
+        name: {'handlers': ['console'], 'level': LOG_LEVEL, 'propagate': False}
+        for name in ('finance_app', 'users_app', 'accounting_proj')
+    },
+}
@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory, TestCase, override_settings
+
+from . import profiling
+from .profiling import ProfileBuffer, RequestProfilingMiddleware, percentile, percentiles
+
+
+def make_record(view, wall_ms, duplicate_count=0):
+    return {
+        'view': view, 'wall_ms': wall_ms, 'sql_ms': wall_ms / 2, 'sql_count': duplicate_count + 1,
+        'template_ms': 0, 'duplicate_count': duplicate_count,
+        'duplicate_samples': [{'sql': 'SELECT 1', 'count': duplicate_count + 1}] if duplicate_count else [],
+    }
+
+
+class PercentileTests(TestCase):
+    """分位数计算"""
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 51)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([], 50), 0)
+
+    def test_percentiles_sorts_values(self):
+        self.assertEqual(percentiles([3, 1, 2]), {'p50': 2, 'p90': 3, 'p95': 3, 'p99': 3, 'max': 3})
+        self.assertEqual(percentiles([])['max'], 0)
+
+
+class ProfileBufferTests(TestCase):
+    """采样环形缓冲区"""
+
+    def test_keeps_most_recent_records(self):
+        buffer = ProfileBuffer(size=3)
+        for index in range(5):
+            buffer.add(make_record('home', index))
+        self.assertEqual(buffer.size, 3)
+        self.assertEqual([record['wall_ms'] for record in buffer.records()], [2, 3, 4])
+        buffer.clear()
+        self.assertEqual(buffer.records(), [])
+
+    def test_summary_groups_by_view(self):
+        buffer = ProfileBuffer()
+        for wall_ms in (10, 30, 20):
+            buffer.add(make_record('voucher_list', wall_ms))
+        buffer.add(make_record('home', 5, duplicate_count=4))
+        buffer.add(make_record('home', 6, duplicate_count=1))
+
+        slowest, home = buffer.summary()
+        self.assertEqual((slowest['view'], slowest['requests']), ('voucher_list', 3))
+        self.assertEqual((slowest['wall_ms']['p50'], slowest['wall_ms']['max']), (20, 30))
+        self.assertEqual(home['sql_count'], {'avg': 3.5, 'max': 5})
+        self.assertEqual(home['duplicate_queries']['max'], 4)
+        self.assertEqual(home['duplicate_queries']['samples'], [{'sql': 'SELECT 1', 'count': 5}])
+
+
+@override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_BUFFER_SIZE=3, REQUEST_PROFILING_SERVER_TIMING=True)
+class RequestProfilingMiddlewareTests(TestCase):
+    """请求性能采样中间件"""
+
+    def setUp(self):
+        # 中间件会替换模块级缓冲区，测试结束后恢复
+        patcher = mock.patch.object(profiling, 'profile_buffer', ProfileBuffer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('operator')
+
+    def view(self, request):
+        # 同一条 SQL 执行三次（参数不同），另有一条只执行一次
+        for pk in (self.user.pk, self.user.pk + 1, self.user.pk + 2):
+            User.objects.filter(pk=pk).exists()
+        User.objects.count()
+        return HttpResponse(engines['django'].from_string('{{ name }}').render({'name': 'ok'}))
+
+    def test_records_request(self):
+        middleware = RequestProfilingMiddleware(self.view)
+        response = middleware(RequestFactory().get('/finance/vouchers/'))
+
+        self.assertEqual(profiling.profile_buffer.size, 3)
+        record, = profiling.profile_buffer.records()
+        self.assertEqual((record['view'], record['method'], record['status']), ('/finance/vouchers/', 'GET', 200))
+        self.assertEqual((record['sql_count'], record['duplicate_count']), (4, 2))
+        self.assertEqual(record['duplicate_samples'][0]['count'], 3)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreaterEqual(record['wall_ms'], record['sql_ms'])
+        self.assertIn('desc="4 queries, 2 duplicate"', response['Server-Timing'])
+
+    def test_buffer_keeps_recent_requests(self):
+        middleware = RequestProfilingMiddleware(lambda request: HttpResponse())
+        for index in range(5):
+            middleware(RequestFactory().get(f'/page/{index}/'))
+        self.assertEqual([record['view'] for record in profiling.profile_buffer.records()],
+                         ['/page/2/', '/page/3/', '/page/4/'])
+
+    @override_settings(REQUEST_PROFILING_SERVER_TIMING=False)
+    def test_server_timing_is_optional(self):
+        response = RequestProfilingMiddleware(lambda request: HttpResponse())(RequestFactory().get('/'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(REQUEST_PROFILING=False)
+    def test_disabled_middleware_is_not_used(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestProfilingMiddleware(lambda request: HttpResponse())
+
+    def test_summary_view_is_staff_only(self):
+        # 测试客户端的请求同样经过 MIDDLEWARE 中的采样中间件
+        response = self.client.get('/admin/request-profile/')
+        self.assertEqual(response.status_code, 302)
+
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        data = self.client.get('/admin/request-profile/', {'recent': 1}).json()
+        self.assertEqual((data['enabled'], data['buffer_size'], data['requests']), (True, 3, 1))
+        self.assertEqual([view['view'] for view in data['views']], ['request_profile_summary'])
+        self.assertEqual(data['recent'][0]['status'], 302)
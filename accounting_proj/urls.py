@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path,include
 
+from .profiling import request_profile_summary
+
 urlpatterns = [
+    path('admin/request-profile/', request_profile_summary, name='request_profile_summary'),  # 请求性能汇总（JSON）
     path('admin/', admin.site.urls),
     path('users/', include('users_app.urls', namespace='users')),
     path('finance/', include('finance_app.urls')),  # 新增的会计模块
@@ -0,0 +1,120 @@
+# finance_app/account_ledger.py
+"""
+科目明细账（页面查询）
+一个科目在起止日期内已审核/已过账凭证的逐笔分录及累计余额：
+  - 累计余额由数据库窗口函数计算：SUM(带符号金额) OVER (ORDER BY 凭证日期, 分录 id)；
+  - 期初余额取起始期间之前最近一期总分类账的期末余额，再加上总分类账未覆盖部分（之后各期间到起始日期前一天）的分录合计；
+  - 按 (凭证日期, 分录 id) 键集分页：翻页游标记录上一页最后一行的排序键和余额，
+    下一页只查询游标之后的分录，窗口累计值加上游标余额即为累计余额，翻到第几页都不需要 OFFSET。
+游标用 django.core.signing 签名，防止篡改余额。
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.core import signing
+from django.db.models import Case, DecimalField, F, Q, Sum, When, Window
+from django.db.models.expressions import RowRange
+
+from .ledger import latest_ledgers_before, signed_balance, split_balance
+from .models import JournalEntry, Voucher
+
+# 每页行数
+LEDGER_PAGE_SIZE = 100
+
+CURSOR_SALT = 'finance_app.account_ledger'
+
+CENT = Decimal('0.01')
+
+SIGNED_AMOUNT = Case(
+    When(direction='DEBIT', then=F('amount')),
+    default=-F('amount'),
+    output_field=DecimalField(max_digits=15, decimal_places=2),
+)
+
+
+def ledger_entries(account):
+    """科目下参与明细账的分录（已审核/已过账凭证）"""
+    return JournalEntry.objects.filter(account=account, voucher__status__in=Voucher.LEDGER_STATUSES)
+
+
+def opening_balance(account, start):
+    """
+    起始日期之前的带符号余额（借方为正）
+    总分类账最近一期的期末余额 + 之后到 start 前一天的分录合计（一条聚合查询）
+    """
+    period = start.strftime('%Y%m')
+    last = latest_ledgers_before(period, [account.account_code]).get(account.account_code)
+
+    entries = ledger_entries(account).filter(voucher__voucher_date__lt=start)
+    balance = Decimal(0)
+    if last is not None:
+        balance = signed_balance(last.ending_balance, last.ending_direction)
+        entries = entries.filter(period__gt=last.period)
+    total = entries.aggregate(total=Sum(SIGNED_AMOUNT))['total']
+    return (balance + Decimal(str(total or 0))).quantize(CENT)
+
+
+def encode_cursor(entry_date, entry_id, balance):
+    return signing.dumps({'date': entry_date.isoformat(), 'id': entry_id, 'balance': str(balance)}, salt=CURSOR_SALT)
+
+
+def decode_cursor(cursor):
+    """解析翻页游标，返回 (凭证日期, 分录 id, 余额)；无效时抛出 ValueError"""
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+        return date.fromisoformat(data['date']), int(data['id']), Decimal(data['balance'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise ValueError('无效的翻页参数')
+
+
+def account_ledger_page(account, start, end, cursor=None, page_size=LEDGER_PAGE_SIZE):
+    """
+    明细账的一页
+    cursor: 上一页返回的 next_cursor，None 表示第一页
+    返回 {'opening': (期初余额, 方向)（仅第一页）, 'rows': [...], 'next_cursor': 下一页游标或 None}
+    每行：凭证日期、凭证编号、摘要、借方金额、贷方金额、累计余额及方向
+    """
+    entries = ledger_entries(account).filter(voucher__voucher_date__gte=start, voucher__voucher_date__lte=end)
+
+    opening = None
+    if cursor is None:
+        carried = opening_balance(account, start)
+        opening = split_balance(carried, account.balance_direction)
+    else:
+        after_date, after_id, carried = decode_cursor(cursor)
+        entries = entries.filter(
+            Q(voucher__voucher_date__gt=after_date) | Q(voucher__voucher_date=after_date, id__gt=after_id)
+        )
+
+    order = [F('voucher__voucher_date').asc(), F('id').asc()]
+    rows = entries.annotate(
+        running=Window(Sum(SIGNED_AMOUNT), order_by=order, frame=RowRange(start=None, end=0)),
+    ).order_by(*order).values(
+        'id', 'voucher__voucher_date', 'voucher__voucher_id', 'description', 'voucher__description',
+        'direction', 'amount', 'running',
+    )[:page_size + 1]
+
+    rows = list(rows)
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    page = []
+    balance = carried
+    for row in rows:
+        balance = (carried + Decimal(str(row['running']))).quantize(CENT)
+        amount, direction = split_balance(balance, account.balance_direction)
+        page.append({
+            'date': row['voucher__voucher_date'],
+            'voucher_id': row['voucher__voucher_id'],
+            'description': row['description'] or row['voucher__description'],
+            'debit': row['amount'] if row['direction'] == 'DEBIT' else None,
+            'credit': row['amount'] if row['direction'] == 'CREDIT' else None,
+            'balance': amount,
+            'balance_direction': direction,
+        })
+
+    next_cursor = None
+    if has_next:
+        last = rows[-1]
+        next_cursor = encode_cursor(last['voucher__voucher_date'], last['id'], balance)
+    return {'opening': opening, 'rows': page, 'next_cursor': next_cursor}
@@ -0,0 +1,192 @@
+# finance_app/account_tree.py
+"""
+会计科目树
+科目层级保存在 Account.path（物化路径，如 /1002/100201/）和 Account.depth 中，保存科目时自动维护：
+  - 某个科目的全部下级科目：Account.descendants() 一条路径前缀查询；
+  - 明细科目金额逐级汇总到上级科目：AccountTree.rollup()，按路径拆出祖先科目累加，不需要递归或逐级查询；
+  - 整棵科目树缓存在进程内（get_account_tree），每次取用时用一条聚合查询核对科目表的版本
+    （科目数 + 最近更新时间），其他进程新增、修改或删除科目后重新加载；
+    本进程内 Account 保存或删除时直接清空（信号在 apps.py 中注册）。
+批量改写路径的 UPDATE 同时更新 update_time，保证版本随之变化。
+"""
+import threading
+
+from django.db.models import Count, F, Max
+from django.db.models.functions import Now, Substr
+from django.utils import timezone
+
+from .models import Account
+
+
+class AccountNode:
+    """科目树中的一个科目"""
+
+    __slots__ = ('code', 'name', 'type', 'balance_direction', 'status', 'parent', 'path', 'depth', 'children')
+
+    def __init__(self, code, name, account_type, balance_direction, status, parent, path, depth):
+        self.code = code
+        self.name = name
+        self.type = account_type
+        self.balance_direction = balance_direction
+        self.status = status
+        self.parent = parent
+        self.path = path
+        self.depth = depth
+        self.children = []
+
+    @property
+    def ancestor_codes(self):
+        """从一级科目到本科目的科目代码（含本科目）"""
+        return self.path.strip('/').split('/')
+
+    @property
+    def is_leaf(self):
+        return not self.children
+
+
+class AccountTree:
+    """
+    内存中的科目树（一次查询加载全部科目）
+    nodes 按路径排序，即先序遍历顺序：每个科目后面紧跟它的全部下级科目
+    """
+
+    def __init__(self, accounts):
+        self.nodes = {}
+        for code, name, account_type, direction, status, parent, path, depth in accounts:
+            self.nodes[code] = AccountNode(code, name, account_type, direction, status, parent, path, depth)
+        self.ordered = sorted(self.nodes.values(), key=lambda node: node.path)
+        self.roots = []
+        for node in self.ordered:
+            parent = self.nodes.get(node.parent)
+            if parent is None:
+                self.roots.append(node)
+            else:
+                parent.children.append(node)
+
+    @classmethod
+    def load(cls):
+        return cls(Account.objects.values_list(
+            'account_code', 'account_name', 'account_type', 'balance_direction', 'status',
+            'parent_account_id', 'path', 'depth',
+        ).order_by('path'))
+
+    def __contains__(self, code):
+        return code in self.nodes
+
+    def __getitem__(self, code):
+        return self.nodes[code]
+
+    def get(self, code):
+        return self.nodes.get(code)
+
+    def root_code(self, code):
+        """科目所属的一级科目代码（不在树中的科目返回自身）"""
+        node = self.nodes.get(code)
+        return node.ancestor_codes[0] if node is not None else code
+
+    def ancestors(self, code, include_self=False):
+        """上级科目代码列表（从一级科目开始）"""
+        codes = self.nodes[code].ancestor_codes
+        return codes if include_self else codes[:-1]
+
+    def descendants(self, code, include_self=False):
+        """全部下级科目代码列表（先序遍历顺序）"""
+        prefix = self.nodes[code].path
+        codes = [node.code for node in self.ordered if node.path.startswith(prefix)]
+        return codes if include_self else codes[1:]
+
+    def rollup(self, totals, fields=('debit', 'credit')):
+        """
+        明细金额逐级汇总到所有上级科目
+        totals: {科目代码: {字段: 金额}}，通常是各科目的发生额（aggregate_account_totals 的结果）
+        返回 {科目代码: {字段: 本科目及全部下级科目的合计}}，只包含有金额的科目及其上级科目；
+        不在树中的科目代码原样保留
+        """
+        rolled = {}
+        for code, values in totals.items():
+            node = self.nodes.get(code)
+            for ancestor in (node.ancestor_codes if node is not None else [code]):
+                target = rolled.get(ancestor)
+                if target is None:
+                    target = rolled[ancestor] = dict.fromkeys(fields, 0)
+                for field in fields:
+                    target[field] += values[field]
+        return rolled
+
+
+_tree_lock = threading.Lock()
+_account_tree = None  # (科目表版本, 科目树)
+
+
+def account_tree_version():
+    """科目表的版本：(科目数, 最近更新时间)，任何进程新增、修改或删除科目后都会变化"""
+    version = Account.objects.aggregate(count=Count('pk'), updated=Max('update_time'))
+    return version['count'], version['updated']
+
+
+def get_account_tree():
+    """进程内缓存的科目树（科目表版本变化时重新加载）"""
+    global _account_tree
+    version = account_tree_version()
+    cached = _account_tree
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    tree = AccountTree.load()
+    with _tree_lock:
+        _account_tree = (version, tree)
+    return tree
+
+
+def invalidate_account_tree(**kwargs):
+    """清空进程内的科目树缓存（Account 保存或删除时调用）"""
+    global _account_tree
+    with _tree_lock:
+        _account_tree = None
+
+
+def reroot_children(sender, instance, **kwargs):
+    """
+    删除科目后，下级科目的父级科目已被置空（on_delete=SET_NULL），
+    这里用一条 UPDATE 去掉它们路径中被删除科目的前缀，直接下级科目成为一级科目
+    """
+    if not instance.path:
+        return
+    Account.objects.filter(Account.subtree_filter(instance.path, include_self=False)).update(
+        path=Substr('path', len(instance.path)),
+        depth=F('depth') - instance.depth,
+        update_time=Now(),
+    )
+
+
+def rebuild_account_paths():
+    """按父级科目重新计算全部科目的路径和级次（数据迁移、批量导入后调用），返回更新的科目数"""
+    parents = dict(Account.objects.values_list('account_code', 'parent_account_id'))
+    paths = {}
+
+    def resolve(code):
+        # 沿父级链向上找到已知路径的科目，再依次向下计算（迭代实现，父级链有环时断开）
+        chain = []
+        seen = set()
+        while code is not None and code not in paths and code not in seen:
+            seen.add(code)
+            chain.append(code)
+            code = parents.get(code)
+        base_path, base_depth = paths.get(code, ('/', 0))
+        for item in reversed(chain):
+            base_path, base_depth = f'{base_path}{item}/', base_depth + 1
+            paths[item] = (base_path, base_depth)
+
+    for code in parents:
+        resolve(code)
+
+    now = timezone.now()
+    changed = []
+    for account in Account.objects.only('account_code', 'path', 'depth'):
+        path, depth = paths[account.account_code]
+        if (account.path, account.depth) != (path, depth):
+            account.path, account.depth, account.update_time = path, depth, now
+            changed.append(account)
+    Account.objects.bulk_update(changed, ['path', 'depth', 'update_time'], batch_size=500)
+    invalidate_account_tree()
+    return len(changed)
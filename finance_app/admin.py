@@ -1,20 +1,30 @@
 # 导入Django后台管理模块和我们创建的三个模型
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.urls import reverse
+from django.utils.html import format_html
 from .models import PurchaseOrder, SalesOrder
-from .models import Account, Customer, Supplier, Voucher, JournalEntry, GeneralLedger, BalanceSheet, IncomeStatement, ReportPeriod
+from .models import Account, Customer, Supplier, Voucher, JournalEntry, GeneralLedger, BalanceSheet, IncomeStatement, ReportPeriod, ReportJob
+from .models import AccountBalanceSnapshot
+from .period_close import close_period, reopen_period
+from .reports import freeze_account_balances
 
 # -------------------------- 注册会计科目模型 --------------------------
 @admin.register(Account)  # 装饰器方式注册模型
 class AccountAdmin(admin.ModelAdmin):
     # 后台列表页面显示的字段（对应模型的属性）
-    list_display = ('account_code', 'account_name', 'account_type', 'parent_account', 'balance_direction', 'status', 'create_time')
+    list_display = ('account_code', 'account_name', 'account_type', 'parent_account', 'depth', 'balance_direction', 'status', 'create_time', 'ledger_link')
     # 可搜索的字段（输入关键词能搜索对应字段内容）
     search_fields = ('account_code', 'account_name')  # 按科目代码、科目名称搜索
     # 可筛选的字段（右侧出现筛选栏）
-    list_filter = ('account_type', 'balance_direction', 'status')
+    list_filter = ('account_type', 'depth', 'balance_direction', 'status')
     # 排序方式（默认按科目代码升序排列）
     ordering = ('account_code',)
 
+    @admin.display(description='明细账')
+    def ledger_link(self, obj):
+        # 科目明细账页面（窗口函数计算累计余额，键集分页），代替在分录列表中按科目名称搜索
+        return format_html('<a href="{}">查看</a>', reverse('finance_app:account_ledger', args=[obj.account_code]))
+
 # -------------------------- 注册客户模型 --------------------------
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
@@ -36,17 +46,49 @@ class SupplierAdmin(admin.ModelAdmin):
 class VoucherAdmin(admin.ModelAdmin):
     list_display = ('voucher_id', 'voucher_date', 'description', 'total_debit', 'total_credit', 'status', 'created_by', 'audited_by', 'create_time')
     search_fields = ('voucher_id', 'description')  # 按凭证编号、摘要搜索
-    list_filter = ('status', 'voucher_date', 'created_by')  # 按状态、日期、制单人筛选
+    list_filter = ('status', 'period', 'voucher_date', 'created_by')  # 按状态、期间、日期、制单人筛选
     ordering = ('-voucher_date', '-voucher_id')  # 按日期倒序，凭证编号倒序
     # 添加一个内联显示，方便查看分录明细
     inlines = []
 
+    def save_model(self, request, obj, form, change):
+        # 分录由内联表单在凭证之后保存，而已审核/已过账凭证的分录不能再写入：
+        # 改为已审核/已过账时先按原状态保存凭证，等分录保存完（save_related）再切换状态并过账
+        if obj.status in Voucher.LEDGER_STATUSES and getattr(obj, '_db_status', None) not in Voucher.LEDGER_STATUSES:
+            obj._pending_status = obj.status
+            obj.status = getattr(obj, '_db_status', None) or 'DRAFT'
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        voucher = form.instance
+        pending_status = voucher.__dict__.pop('_pending_status', None)
+        if pending_status:
+            voucher.status = pending_status
+            voucher.save()
+
 # -------------------------- 注册分录明细模型 --------------------------
+def is_posted(voucher):
+    """凭证是否已记入总分类账"""
+    return voucher is not None and voucher.status in Voucher.LEDGER_STATUSES
+
+
 class JournalEntryInline(admin.TabularInline):
     """内联显示分录明细"""
     model = JournalEntry
     extra = 1  # 默认显示1个空行
     fields = ('account', 'direction', 'amount', 'description', 'customer', 'supplier')
+    ordering = ('id',)  # 分录模型没有默认排序，按录入顺序显示
+
+    # 已审核/已过账凭证的分录只读，修改需要先把凭证退回（否则总分类账与分录不一致）
+    def has_add_permission(self, request, obj=None):
+        return super().has_add_permission(request, obj) and not is_posted(obj)
+
+    def has_change_permission(self, request, obj=None):
+        return super().has_change_permission(request, obj) and not is_posted(obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return super().has_delete_permission(request, obj) and not is_posted(obj)
     # 限制每行显示字段数量，使界面更紧凑
 
 @admin.register(JournalEntry)
@@ -56,6 +98,12 @@ class JournalEntryAdmin(admin.ModelAdmin):
     list_filter = ('direction', 'account__account_type')  # 按借贷方向、科目类型筛选
     ordering = ('-create_time',)  # 按创建时间倒序
 
+    def has_change_permission(self, request, obj=None):
+        return super().has_change_permission(request, obj) and not (obj and is_posted(obj.voucher))
+
+    def has_delete_permission(self, request, obj=None):
+        return super().has_delete_permission(request, obj) and not (obj and is_posted(obj.voucher))
+
 # 将内联添加到VoucherAdmin
 VoucherAdmin.inlines = [JournalEntryInline]
 
@@ -107,7 +155,64 @@ class ReportPeriodAdmin(admin.ModelAdmin):
     search_fields = ('period_code', 'period_name')  # 按期间代码、期间名称搜索
     list_filter = ('is_closed',)  # 按是否结账筛选
     ordering = ('-period_code',)  # 按期间代码倒序
+    # 结账状态只能通过结账 / 反结账操作修改（需要同时重算总分类账、冻结快照）
+    readonly_fields = ('is_closed', 'closed_by', 'closed_date')
+    actions = ['close_periods', 'reopen_periods', 'refreeze_balances']
+
+    @admin.action(description='结账所选期间')
+    def close_periods(self, request, queryset):
+        # 按期间先后逐期结账，遇到错误时停止
+        closed = 0
+        for period in queryset.filter(is_closed=False).order_by('period_code').values_list('period_code', flat=True):
+            try:
+                close_period(period, request.user)
+            except ValueError as e:
+                self.message_user(request, str(e), level=messages.ERROR)
+                break
+            closed += 1
+        self.message_user(request, f'已结账 {closed} 个期间')
+
+    @admin.action(description='反结账所选期间')
+    def reopen_periods(self, request, queryset):
+        # 从最后一个期间开始逐期反结账
+        reopened = 0
+        for period in queryset.filter(is_closed=True).order_by('-period_code').values_list('period_code', flat=True):
+            try:
+                reopen_period(period, request.user)
+            except ValueError as e:
+                self.message_user(request, str(e), level=messages.ERROR)
+                break
+            reopened += 1
+        self.message_user(request, f'已反结账 {reopened} 个期间')
+
+    @admin.action(description='重新冻结所选已结账期间的科目余额快照')
+    def refreeze_balances(self, request, queryset):
+        # 各期快照只包含本期发生额，互不依赖；分录在结账后被直接改动时用于重新冻结
+        periods = list(queryset.filter(is_closed=True).order_by('period_code').values_list('period_code', flat=True))
+        for period in periods:
+            freeze_account_balances(period)
+        self.message_user(request, f'已重新冻结 {len(periods)} 个期间的科目余额快照')
 
+# -------------------------- 注册科目余额快照模型 --------------------------
+@admin.register(AccountBalanceSnapshot)
+class AccountBalanceSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('period', 'account', 'debit_total', 'credit_total',
+                    'closing_balance', 'closing_direction', 'create_time')
+    search_fields = ('period', 'account__account_code', 'account__account_name')  # 按期间、科目代码、科目名称搜索
+    list_filter = ('period', 'account__account_type')  # 按期间、科目类型筛选
+    ordering = ('-period', 'account__account_code')  # 按期间倒序，科目代码正序
+    # 快照只在结账时生成，后台只读
+    readonly_fields = ('period', 'account', 'debit_total', 'credit_total',
+                       'closing_balance', 'closing_direction', 'create_time')
+
+# -------------------------- 注册报表生成任务模型 --------------------------
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'report_type', 'period', 'status', 'progress', 'message',
+                    'requested_by', 'create_time', 'start_time', 'finish_time')
+    search_fields = ('period',)  # 按期间搜索
+    list_filter = ('report_type', 'status')  # 按报表类型、状态筛选
+    ordering = ('-create_time',)  # 按提交时间倒序
 
 
 @admin.register(PurchaseOrder)
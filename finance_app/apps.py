@@ -1,5 +1,20 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 
 
 class FinanceAppConfig(AppConfig):
     name = 'finance_app'
+
+    def ready(self):
+        from accounting_proj.db import configure_sqlite_connection
+        from .account_tree import invalidate_account_tree, reroot_children
+        from .models import Account
+
+        # 新建 SQLite 连接时开启 WAL 和 synchronous=NORMAL（忙等待时间由 DATABASES OPTIONS 的 timeout 设置）
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='configure_sqlite_connection')
+
+        # 科目删除后修正下级科目路径；科目变更时清空进程内的科目树缓存
+        post_delete.connect(reroot_children, sender=Account, dispatch_uid='reroot_account_children')
+        post_save.connect(invalidate_account_tree, sender=Account, dispatch_uid='invalidate_account_tree_save')
+        post_delete.connect(invalidate_account_tree, sender=Account, dispatch_uid='invalidate_account_tree_delete')
@@ -0,0 +1,535 @@
+# finance_app/benchmarks.py
+"""
+性能基准测试
+  - 测试数据：seed_benchmark_data 生成合成的明细科目、客户、供应商、采购/销售订单和指定行数的分录，
+    所有数据都带有 BENCH_TAG 标记，可以用 clear_benchmark_data 整体删除；
+  - 测试用例：用 @benchmark 注册，每个用例通过测试客户端请求一个热点页面，
+    与浏览器访问走同一条路径（中间件、权限、模板渲染）；
+  - 结果：run_benchmarks 按 pytest-benchmark 的统计口径（min/max/mean/median/stddev/ops）
+    输出 JSON，compare_results 对比两次结果找出变慢的用例。
+对应的管理命令：seed_benchmark_data、run_benchmarks。
+"""
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .account_tree import rebuild_account_paths
+from .ledger import apply_ledger_deltas, period_range
+from .models import Account, Customer, GeneralLedger, JournalEntry, PurchaseOrder, SalesOrder, Supplier, Voucher
+from .reports import period_date_range
+
+# 测试数据标记（凭证摘要、科目名称、订单备注的前缀，客户/供应商编号的前缀）
+BENCH_TAG = '[bench]'
+BENCH_ID_PREFIX = 'BENCH'
+
+# 每个事务写入的凭证张数
+SEED_BATCH_SIZE = 1000
+
+# 生成凭证的状态分布
+SEED_STATUS_WEIGHTS = [('POSTED', 70), ('SUBMITTED', 25), ('DRAFT', 5)]
+
+# 比较结果时，中位数变慢超过该比例视为性能回退
+REGRESSION_THRESHOLD = 0.2
+
+
+# ======================== 测试数据 ========================
+
+def default_seed_periods(months=12):
+    """截止到上个月的最近 months 个会计期间"""
+    last = timezone.localdate().replace(day=1) - timedelta(days=1)
+    index = last.year * 12 + last.month - 1 - (months - 1)
+    start = f'{index // 12}{index % 12 + 1:02d}'
+    return period_range(start, last.strftime('%Y%m'))
+
+
+def seed_accounts(per_parent):
+    """在每个一级科目下生成 per_parent 个明细科目（科目代码：上级代码 + B + 序号）"""
+    parents = Account.objects.filter(parent_account__isnull=True).exclude(account_name__startswith=BENCH_TAG)
+    accounts = [
+        Account(
+            account_code=f'{parent.account_code}B{number:02d}',
+            account_name=f'{BENCH_TAG}{parent.account_name}{number:02d}',
+            account_type=parent.account_type,
+            parent_account=parent,
+            balance_direction=parent.balance_direction,
+        )
+        for parent in parents
+        for number in range(1, per_parent + 1)
+    ]
+    Account.objects.bulk_create(accounts, ignore_conflicts=True)
+    rebuild_account_paths()  # bulk_create 不经过 save()，补上科目路径
+    return [account.account_code for account in accounts]
+
+
+def seed_partners(customers, suppliers):
+    """生成客户和供应商，返回 (客户编号列表, 供应商编号列表)"""
+    customer_objs = [
+        Customer(
+            customer_id=f'{BENCH_ID_PREFIX}-C{number:06d}',
+            customer_name=f'{BENCH_TAG}客户{number:06d}',
+            credit_limit=Decimal('100000.00'),
+        )
+        for number in range(1, customers + 1)
+    ]
+    supplier_objs = [
+        Supplier(
+            supplier_id=f'{BENCH_ID_PREFIX}-S{number:06d}',
+            supplier_name=f'{BENCH_TAG}供应商{number:06d}',
+            payment_terms='月结30天',
+        )
+        for number in range(1, suppliers + 1)
+    ]
+    Customer.objects.bulk_create(customer_objs, batch_size=SEED_BATCH_SIZE, ignore_conflicts=True)
+    Supplier.objects.bulk_create(supplier_objs, batch_size=SEED_BATCH_SIZE, ignore_conflicts=True)
+    return [c.customer_id for c in customer_objs], [s.supplier_id for s in supplier_objs]
+
+
+def random_amount(rng):
+    return Decimal(rng.randint(100, 1000000)) / 100
+
+
+def seed_orders(user, orders, customer_ids, supplier_ids, periods, rng):
+    """生成采购订单和销售订单各 orders 张"""
+    dates = [period_date_range(period)[0] for period in periods]
+    purchase_orders = []
+    sales_orders = []
+    for number in range(1, orders + 1):
+        quantity = Decimal(rng.randint(1, 500))
+        unit_price = random_amount(rng)
+        order_date = rng.choice(dates) + timedelta(days=rng.randrange(28))
+        if supplier_ids:
+            purchase_orders.append(PurchaseOrder(
+                order_number=f'{BENCH_ID_PREFIX}-PO{number:08d}',
+                supplier_id=rng.choice(supplier_ids),
+                order_date=order_date,
+                status=rng.choice(PurchaseOrder.ORDER_STATUS)[0],
+                product_name=f'商品{rng.randint(1, 200):03d}',
+                quantity=quantity,
+                unit_price=unit_price,
+                total_amount=quantity * unit_price,
+                notes=BENCH_TAG,
+                created_by=user,
+            ))
+        if customer_ids:
+            sales_orders.append(SalesOrder(
+                order_number=f'{BENCH_ID_PREFIX}-SO{number:08d}',
+                customer_id=rng.choice(customer_ids),
+                order_date=order_date,
+                status=rng.choice(SalesOrder.ORDER_STATUS)[0],
+                product_name=f'商品{rng.randint(1, 200):03d}',
+                quantity=quantity,
+                unit_price=unit_price,
+                total_amount=quantity * unit_price,
+                notes=BENCH_TAG,
+                created_by=user,
+            ))
+    PurchaseOrder.objects.bulk_create(purchase_orders, batch_size=SEED_BATCH_SIZE, ignore_conflicts=True)
+    SalesOrder.objects.bulk_create(sales_orders, batch_size=SEED_BATCH_SIZE, ignore_conflicts=True)
+    return len(purchase_orders), len(sales_orders)
+
+
+def build_voucher(user, account_codes, customer_ids, supplier_ids, periods, line_count, rng, now):
+    """生成一张借贷平衡的凭证（未保存）：line_count - 1 条借方分录 + 1 条贷方分录"""
+    period = rng.choice(periods)
+    start, end = period_date_range(period)
+    voucher_date = start + timedelta(days=rng.randrange((end - start).days + 1))
+    status = rng.choices(
+        [status for status, _ in SEED_STATUS_WEIGHTS], [weight for _, weight in SEED_STATUS_WEIGHTS]
+    )[0]
+
+    entries = []
+    total = Decimal('0.00')
+    for _ in range(line_count - 1):
+        amount = random_amount(rng)
+        total += amount
+        entries.append(JournalEntry(
+            account_id=rng.choice(account_codes),
+            direction='DEBIT',
+            amount=amount,
+            description='测试分录',
+            customer=rng.choice(customer_ids) if customer_ids and rng.random() < 0.1 else None,
+        ))
+    entries.append(JournalEntry(
+        account_id=rng.choice(account_codes),
+        direction='CREDIT',
+        amount=total,
+        description='测试分录',
+        supplier=rng.choice(supplier_ids) if supplier_ids and rng.random() < 0.1 else None,
+    ))
+
+    voucher = Voucher(
+        voucher_date=voucher_date,
+        period=period,  # bulk_create 不会调用 save()，会计期间需要手动设置
+        description=f'{BENCH_TAG}测试凭证',
+        total_debit=total,
+        total_credit=total,
+        status=status,
+        created_by=user,
+    )
+    if status == 'POSTED':
+        voucher.audited_by = user
+        voucher.audit_time = now
+    return voucher, entries
+
+
+def seed_vouchers(user, lines, account_codes, customer_ids, supplier_ids, periods, rng,
+                  batch_size=SEED_BATCH_SIZE, progress=None):
+    """
+    生成共约 lines 条分录的凭证（每张 2~6 条分录），每批凭证一个事务写入，已过账凭证同时记入总分类账
+    返回 (凭证张数, 分录条数)；progress(已生成分录数) 每批调用一次
+    """
+    now = timezone.now()
+    vouchers_written = 0
+    lines_written = 0
+    while lines_written < lines:
+        batch = []
+        batch_lines = 0
+        while len(batch) < batch_size and lines_written + batch_lines < lines:
+            line_count = max(2, min(rng.randint(2, 6), lines - lines_written - batch_lines))
+            voucher, entries = build_voucher(
+                user, account_codes, customer_ids, supplier_ids, periods, line_count, rng, now,
+            )
+            batch.append((voucher, entries))
+            batch_lines += len(entries)
+
+        with transaction.atomic():
+            voucher_ids = Voucher.allocate_voucher_ids(len(batch))
+            vouchers = []
+            ledger_statuses = {}
+            for (voucher, _), voucher_id in zip(batch, voucher_ids):
+                voucher.voucher_id = voucher_id
+                # 已审核/已过账凭证的分录不能写入：先以草稿写入，分录写完后再批量改为目标状态
+                if voucher.status in Voucher.LEDGER_STATUSES:
+                    ledger_statuses.setdefault(voucher.status, []).append(voucher_id)
+                    voucher.status = 'DRAFT'
+                vouchers.append(voucher)
+            Voucher.objects.bulk_create(vouchers)
+
+            entries = []
+            for voucher, voucher_entries in batch:
+                for entry in voucher_entries:
+                    entry.voucher = voucher
+                    entries.append(entry)
+            JournalEntry.objects.bulk_create(entries, batch_size=SEED_BATCH_SIZE)
+
+            for status, ids in ledger_statuses.items():
+                Voucher.objects.filter(voucher_id__in=ids).update(status=status)
+
+            # 与过账相同，已审核/已过账凭证的分录按期间汇总后记入总分类账（apply_ledger_deltas）
+            posted_ids = {voucher_id for ids in ledger_statuses.values() for voucher_id in ids}
+            period_deltas = {}
+            for voucher, voucher_entries in batch:
+                if voucher.voucher_id not in posted_ids:
+                    continue
+                deltas = period_deltas.setdefault(voucher.period, {})
+                for entry in voucher_entries:
+                    debit, credit = deltas.get(entry.account_id, (0, 0))
+                    if entry.direction == 'DEBIT':
+                        debit += entry.amount
+                    else:
+                        credit += entry.amount
+                    deltas[entry.account_id] = (debit, credit)
+            for period in sorted(period_deltas):
+                apply_ledger_deltas(period, period_deltas[period])
+
+        vouchers_written += len(batch)
+        lines_written += batch_lines
+        if progress is not None:
+            progress(lines_written)
+    return vouchers_written, lines_written
+
+
+def clear_benchmark_data(batch_size=SEED_BATCH_SIZE):
+    """删除所有带测试标记的数据，返回各类删除条数"""
+    deleted = {'vouchers': 0, 'entries': 0}
+    vouchers = Voucher.objects.filter(description__startswith=BENCH_TAG)
+    while True:
+        # 分批删除，避免一次把全部凭证加载到内存
+        ids = list(vouchers.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            deleted['entries'] += JournalEntry.objects.filter(voucher_id__in=ids).delete()[0]
+            deleted['vouchers'] += Voucher.objects.filter(pk__in=ids).delete()[0]
+
+    deleted['purchase_orders'] = PurchaseOrder.objects.filter(order_number__startswith=f'{BENCH_ID_PREFIX}-PO').delete()[0]
+    deleted['sales_orders'] = SalesOrder.objects.filter(order_number__startswith=f'{BENCH_ID_PREFIX}-SO').delete()[0]
+    deleted['customers'] = Customer.objects.filter(customer_id__startswith=f'{BENCH_ID_PREFIX}-C').delete()[0]
+    deleted['suppliers'] = Supplier.objects.filter(supplier_id__startswith=f'{BENCH_ID_PREFIX}-S').delete()[0]
+    # 明细科目的总分类账记录随科目级联删除
+    _, counts = Account.objects.filter(account_name__startswith=BENCH_TAG).delete()
+    deleted['accounts'] = counts.get(Account._meta.label, 0)
+    deleted['general_ledgers'] = counts.get(GeneralLedger._meta.label, 0)
+    return deleted
+
+
+# ======================== 测试用例 ========================
+
+BENCHMARKS = {}
+
+
+def benchmark(name, group):
+    """注册一个基准测试用例：func(ctx) 发出一次请求并返回响应"""
+    def decorator(func):
+        BENCHMARKS[name] = (group, func)
+        return func
+    return decorator
+
+
+class BenchmarkContext:
+    """用例共用的客户端和参数（期间取测试数据中分录最多的期间）"""
+
+    def __init__(self, user):
+        self.user = user
+        self.client = Client()
+        self.client.force_login(user)
+
+        busiest = JournalEntry.objects.values('period').annotate(
+            count=Count('id')
+        ).order_by('-count').first()
+        self.period = busiest['period'] if busiest else timezone.localdate().strftime('%Y%m')
+
+        busiest_account = JournalEntry.objects.filter(period=self.period).values('account_id').annotate(
+            count=Count('id')
+        ).order_by('-count').first()
+        accounts = list(Account.objects.filter(status='ACTIVE').order_by('account_code').values_list(
+            'account_code', flat=True)[:2])
+        self.account_code = busiest_account['account_id'] if busiest_account else accounts[0]
+
+        self.voucher_data = {
+            'voucher_date': period_date_range(self.period)[0].isoformat(),
+            'description': f'{BENCH_TAG}基准测试创建',
+            'entries-TOTAL_FORMS': 2,
+            'entries-INITIAL_FORMS': 0,
+            'entries-MIN_NUM_FORMS': 2,
+            'entries-MAX_NUM_FORMS': 1000,
+            'entries-0-account': accounts[0],
+            'entries-0-direction': 'DEBIT',
+            'entries-0-amount': '100.00',
+            'entries-1-account': accounts[-1],
+            'entries-1-direction': 'CREDIT',
+            'entries-1-amount': '100.00',
+        }
+
+
+def consume(response):
+    """读完整个响应（流式导出需要迭代完才算完成）"""
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+@benchmark('voucher_list', 'vouchers')
+def bench_voucher_list(ctx):
+    return ctx.client.get(reverse('finance_app:voucher_list'))
+
+
+@benchmark('voucher_list_filtered', 'vouchers')
+def bench_voucher_list_filtered(ctx):
+    return ctx.client.get(reverse('finance_app:voucher_list'), {'period': ctx.period, 'status': 'POSTED'})
+
+
+@benchmark('voucher_create', 'vouchers')
+def bench_voucher_create(ctx):
+    return ctx.client.post(reverse('finance_app:voucher_create'), ctx.voucher_data)
+
+
+@benchmark('balance_sheet_generate', 'reports')
+def bench_balance_sheet_generate(ctx):
+    return ctx.client.post(reverse('finance_app:balance_sheet_generate'), {'period': ctx.period})
+
+
+@benchmark('income_statement_generate', 'reports')
+def bench_income_statement_generate(ctx):
+    return ctx.client.post(reverse('finance_app:income_statement_generate'), {'period': ctx.period})
+
+
+@benchmark('trial_balance', 'reports')
+def bench_trial_balance(ctx):
+    return ctx.client.get(reverse('finance_app:trial_balance'), {'start': ctx.period, 'end': ctx.period})
+
+
+@benchmark('account_ledger', 'reports')
+def bench_account_ledger(ctx):
+    start, end = period_date_range(ctx.period)
+    return ctx.client.get(reverse('finance_app:account_ledger', args=[ctx.account_code]),
+                          {'start': start.isoformat(), 'end': end.isoformat()})
+
+
+@benchmark('export_balance_sheet', 'exports')
+def bench_export_balance_sheet(ctx):
+    return ctx.client.get(reverse('finance_app:export_balance_sheet', args=[ctx.period]))
+
+
+@benchmark('export_income_statement', 'exports')
+def bench_export_income_statement(ctx):
+    return ctx.client.get(reverse('finance_app:export_income_statement', args=[ctx.period]))
+
+
+@benchmark('export_voucher_journal', 'exports')
+def bench_export_voucher_journal(ctx):
+    return consume(ctx.client.get(reverse('finance_app:export_voucher_journal'), {'period': ctx.period}))
+
+
+@benchmark('export_general_ledger', 'exports')
+def bench_export_general_ledger(ctx):
+    return consume(ctx.client.get(reverse('finance_app:export_general_ledger')))
+
+
+@benchmark('export_account_ledger', 'exports')
+def bench_export_account_ledger(ctx):
+    return consume(ctx.client.get(
+        reverse('finance_app:export_account_ledger', args=[ctx.account_code]),
+        {'start': ctx.period, 'end': ctx.period},
+    ))
+
+
+@benchmark('purchase_order_list', 'orders')
+def bench_purchase_order_list(ctx):
+    return ctx.client.get(reverse('finance_app:purchase_order_list'))
+
+
+@benchmark('sales_order_list', 'orders')
+def bench_sales_order_list(ctx):
+    return ctx.client.get(reverse('finance_app:sales_order_list'))
+
+
+# ======================== 运行与结果 ========================
+
+def summarize(timings):
+    """与 pytest-benchmark 相同的统计字段（单位：秒）"""
+    mean = statistics.mean(timings)
+    return {
+        'min': min(timings),
+        'max': max(timings),
+        'mean': mean,
+        'median': statistics.median(timings),
+        'stddev': statistics.stdev(timings) if len(timings) > 1 else 0,
+        'rounds': len(timings),
+        'ops': 1 / mean if mean else 0,
+    }
+
+
+def run_case(ctx, func, rounds, warmup):
+    """执行一个用例：先预热 warmup 次，再计时 rounds 次，记录每次的 SQL 条数和响应状态"""
+    for _ in range(warmup):
+        func(ctx)
+
+    timings = []
+    queries = []
+    status_codes = set()
+    for _ in range(rounds):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = func(ctx)
+            timings.append(time.perf_counter() - started)
+        queries.append(len(captured))
+        status_codes.add(response.status_code)
+
+    stats = summarize(timings)
+    stats['queries'] = max(queries)
+    stats['status_codes'] = sorted(status_codes)
+    return stats
+
+
+def environment_info():
+    """本次运行的环境和数据规模，便于判断两次结果是否可比"""
+    db = settings.DATABASES['default']
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'db_profile': getattr(settings, 'DB_PROFILE', connection.vendor),
+        'db_vendor': connection.vendor,
+        'conn_max_age': db.get('CONN_MAX_AGE', 0),
+        'rows': {
+            'accounts': Account.objects.count(),
+            'customers': Customer.objects.count(),
+            'suppliers': Supplier.objects.count(),
+            'vouchers': Voucher.objects.count(),
+            'journal_entries': JournalEntry.objects.count(),
+            'purchase_orders': PurchaseOrder.objects.count(),
+            'sales_orders': SalesOrder.objects.count(),
+        },
+    }
+
+
+def run_benchmarks(user, names=None, rounds=5, warmup=1, progress=None):
+    """
+    依次执行选中的用例，返回可直接写成 JSON 的结果
+    报表生成在请求内直接执行（REPORT_JOBS_RUN_INLINE），测试过程中创建的凭证在结束后删除
+    """
+    names = names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f'未知的基准测试：{", ".join(unknown)}')
+
+    results = []
+    # 测试客户端使用 testserver 作为主机名；调试模式会记录每条 SQL，测试时关闭
+    with override_settings(
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        REPORT_JOBS_RUN_INLINE=True,
+        DEBUG=False,
+    ):
+        ctx = BenchmarkContext(user)
+        try:
+            for name in names:
+                group, func = BENCHMARKS[name]
+                stats = run_case(ctx, func, rounds, warmup)
+                results.append({'name': name, 'group': group, 'stats': stats})
+                if progress is not None:
+                    progress(name, stats)
+        finally:
+            Voucher.objects.filter(description=ctx.voucher_data['description']).delete()
+
+    return {
+        'datetime': timezone.now().isoformat(),
+        'machine_info': environment_info(),
+        'params': {'rounds': rounds, 'warmup': warmup, 'period': ctx.period, 'account': ctx.account_code},
+        'benchmarks': results,
+    }
+
+
+def save_results(results, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_results(previous, current, threshold=REGRESSION_THRESHOLD):
+    """
+    按用例比较两次结果的中位数耗时
+    返回 [(用例, 上次中位数, 本次中位数, 变化比例, 是否回退), ...]
+    """
+    previous_stats = {bench['name']: bench['stats'] for bench in previous.get('benchmarks', [])}
+    rows = []
+    for bench in current['benchmarks']:
+        before = previous_stats.get(bench['name'])
+        if before is None or not before['median']:
+            continue
+        after = bench['stats']['median']
+        change = after / before['median'] - 1
+        rows.append((bench['name'], before['median'], after, change, change > threshold))
+    return rows
@@ -0,0 +1,224 @@
+# finance_app/exports.py
+"""
+明细数据 Excel 导出（凭证序时账、总分类账、科目明细账、试算平衡表）
+数据用 .iterator(chunk_size=...) 分块读取，逐行写入 xlsxwriter 的 constant_memory 模式，
+工作簿写入临时文件后以 FileResponse 分块返回，内存占用与导出行数无关。
+"""
+import tempfile
+
+import xlsxwriter
+from django.http import FileResponse
+
+from .account_ledger import opening_balance
+from .ledger import split_balance
+from .models import GeneralLedger, JournalEntry, Voucher
+from .reports import period_date_range
+
+# 每次从数据库读取的行数
+EXPORT_CHUNK_SIZE = 2000
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+DIRECTION_NAMES = {'DEBIT': '借', 'CREDIT': '贷'}
+STATUS_NAMES = dict(Voucher.STATUS_CHOICES)
+
+
+class StreamingSheet:
+    """
+    按行顺序写入的单工作表 Excel 文件
+    columns: [(表头, 列宽, 是否金额列), ...]
+    """
+
+    def __init__(self, sheet_name, title, columns):
+        self.file = tempfile.TemporaryFile()
+        self.workbook = xlsxwriter.Workbook(self.file, {'constant_memory': True})
+        self.worksheet = self.workbook.add_worksheet(sheet_name)
+
+        title_format = self.workbook.add_format({'bold': True, 'font_size': 16})
+        header_format = self.workbook.add_format({
+            'bold': True,
+            'border': 1,
+            'bg_color': '#D9E1F2',
+            'align': 'center',
+        })
+        self.number_format = self.workbook.add_format({'num_format': '#,##0.00'})
+        self.number_columns = {index for index, (_, _, is_number) in enumerate(columns) if is_number}
+
+        for index, (_, width, _) in enumerate(columns):
+            self.worksheet.set_column(index, index, width)
+
+        # constant_memory 模式只能按行号递增的顺序写入
+        self.worksheet.write(0, 0, title, title_format)
+        for index, (header, _, _) in enumerate(columns):
+            self.worksheet.write(2, index, header, header_format)
+        self.row = 3
+
+    def write_row(self, values):
+        for index, value in enumerate(values):
+            if value is None:
+                continue
+            if index in self.number_columns:
+                self.worksheet.write_number(self.row, index, float(value), self.number_format)
+            else:
+                self.worksheet.write(self.row, index, value)
+        self.row += 1
+
+    def response(self, filename):
+        """关闭工作簿并返回下载响应（临时文件在响应结束后自动删除）"""
+        self.workbook.close()
+        self.file.seek(0)
+        return FileResponse(self.file, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def export_voucher_journal(period=None, status=None):
+    """凭证序时账：按凭证日期、凭证编号逐条列出分录"""
+    entries = JournalEntry.objects.all()
+    if period:
+        entries = entries.filter(period=period)
+    if status:
+        entries = entries.filter(voucher__status=status)
+
+    rows = entries.order_by('voucher__voucher_date', 'voucher__voucher_id', 'id').values_list(
+        'voucher__voucher_date', 'voucher__voucher_id', 'voucher__description', 'voucher__status',
+        'account_id', 'account__account_name', 'direction', 'amount',
+        'description', 'customer', 'supplier',
+    )
+
+    sheet = StreamingSheet('凭证序时账', f'凭证序时账 - {period or "全部期间"}', [
+        ('凭证日期', 12, False),
+        ('凭证编号', 14, False),
+        ('凭证摘要', 30, False),
+        ('状态', 8, False),
+        ('科目代码', 10, False),
+        ('科目名称', 20, False),
+        ('借方金额', 15, True),
+        ('贷方金额', 15, True),
+        ('分录摘要', 30, False),
+        ('客户', 15, False),
+        ('供应商', 15, False),
+    ])
+    for (voucher_date, voucher_id, voucher_description, voucher_status,
+         account_code, account_name, direction, amount, description, customer, supplier) in rows.iterator(
+            chunk_size=EXPORT_CHUNK_SIZE):
+        sheet.write_row([
+            voucher_date.strftime('%Y-%m-%d'), voucher_id, voucher_description,
+            STATUS_NAMES.get(voucher_status, voucher_status),
+            account_code, account_name,
+            amount if direction == 'DEBIT' else None,
+            amount if direction == 'CREDIT' else None,
+            description, customer or '', supplier or '',
+        ])
+
+    return sheet.response(f'凭证序时账_{period or "全部"}.xlsx')
+
+
+def export_general_ledger(period=None):
+    """总分类账：各期间各科目的期初余额、本期发生额和期末余额"""
+    ledgers = GeneralLedger.objects.all()
+    if period:
+        ledgers = ledgers.filter(period=period)
+
+    rows = ledgers.order_by('period', 'account_id').values_list(
+        'period', 'account_id', 'account__account_name',
+        'opening_direction', 'opening_balance',
+        'debit_total', 'credit_total',
+        'ending_direction', 'ending_balance',
+    )
+
+    sheet = StreamingSheet('总分类账', f'总分类账 - {period or "全部期间"}', [
+        ('会计期间', 10, False),
+        ('科目代码', 10, False),
+        ('科目名称', 20, False),
+        ('期初方向', 8, False),
+        ('期初余额', 15, True),
+        ('本期借方', 15, True),
+        ('本期贷方', 15, True),
+        ('期末方向', 8, False),
+        ('期末余额', 15, True),
+    ])
+    for (ledger_period, account_code, account_name, opening_direction, opening_balance,
+         debit_total, credit_total, ending_direction, ending_balance) in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        sheet.write_row([
+            ledger_period, account_code, account_name,
+            DIRECTION_NAMES.get(opening_direction), opening_balance,
+            debit_total, credit_total,
+            DIRECTION_NAMES.get(ending_direction), ending_balance,
+        ])
+
+    return sheet.response(f'总分类账_{period or "全部"}.xlsx')
+
+
+def export_account_ledger(account, start, end):
+    """
+    科目明细账：起止期间内已审核/已过账凭证的逐笔分录及累计余额
+    期初余额与明细账页面相同（account_ledger.opening_balance）：最近一期总分类账的期末余额
+    加上总分类账未覆盖部分的分录合计
+    """
+    balance = opening_balance(account, period_date_range(start)[0])
+
+    rows = JournalEntry.objects.filter(
+        account=account,
+        period__gte=start,
+        period__lte=end,
+        voucher__status__in=Voucher.LEDGER_STATUSES,
+    ).order_by('voucher__voucher_date', 'voucher__voucher_id', 'id').values_list(
+        'voucher__voucher_date', 'voucher__voucher_id', 'description', 'voucher__description',
+        'direction', 'amount',
+    )
+
+    sheet = StreamingSheet('科目明细账', f'{account.account_code} {account.account_name} 明细账（{start} ~ {end}）', [
+        ('日期', 12, False),
+        ('凭证编号', 14, False),
+        ('摘要', 30, False),
+        ('借方金额', 15, True),
+        ('贷方金额', 15, True),
+        ('余额方向', 8, False),
+        ('余额', 15, True),
+    ])
+
+    opening, opening_direction = split_balance(balance, account.balance_direction)
+    sheet.write_row(['', '', '期初余额', None, None, DIRECTION_NAMES.get(opening_direction), opening])
+
+    for voucher_date, voucher_id, description, voucher_description, direction, amount in rows.iterator(
+            chunk_size=EXPORT_CHUNK_SIZE):
+        balance += amount if direction == 'DEBIT' else -amount
+        ending, ending_direction = split_balance(balance, account.balance_direction)
+        sheet.write_row([
+            voucher_date.strftime('%Y-%m-%d'), voucher_id, description or voucher_description,
+            amount if direction == 'DEBIT' else None,
+            amount if direction == 'CREDIT' else None,
+            DIRECTION_NAMES.get(ending_direction), ending,
+        ])
+
+    return sheet.response(f'明细账_{account.account_code}_{start}_{end}.xlsx')
+
+
+def export_trial_balance(trial_balance, start, end):
+    """试算平衡表：build_trial_balance 的计算结果，下级科目名称按级次缩进"""
+    sheet = StreamingSheet('试算平衡表', f'试算平衡表（{start} ~ {end}）', [
+        ('科目代码', 12, False),
+        ('科目名称', 28, False),
+        ('期初借方', 15, True),
+        ('期初贷方', 15, True),
+        ('本期借方', 15, True),
+        ('本期贷方', 15, True),
+        ('期末借方', 15, True),
+        ('期末贷方', 15, True),
+    ])
+    for row in trial_balance['rows']:
+        sheet.write_row([
+            row['account_code'], '  ' * (row['depth'] - 1) + row['account_name'],
+            row['opening_debit'], row['opening_credit'],
+            row['debit'], row['credit'],
+            row['closing_debit'], row['closing_credit'],
+        ])
+
+    totals = trial_balance['totals']
+    sheet.write_row([
+        '合计', '平衡' if trial_balance['is_balanced'] else '不平衡',
+        totals['opening_debit'], totals['opening_credit'],
+        totals['debit'], totals['credit'],
+        totals['closing_debit'], totals['closing_credit'],
+    ])
+
+    return sheet.response(f'试算平衡表_{start}_{end}.xlsx')
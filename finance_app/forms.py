@@ -1,8 +1,26 @@
 # finance_app/forms.py
 from django import forms
+from django.core.exceptions import ValidationError
 from .models import Voucher, JournalEntry, Account,Customer, Supplier
 
 
+class AccountChoiceField(forms.ModelChoiceField):
+    """会计科目选择字段：提供了预加载的科目字典时直接查字典，不再逐行查询数据库"""
+    accounts = None
+
+    def to_python(self, value):
+        if self.accounts is None or value in self.empty_values:
+            return super().to_python(value)
+        account = self.accounts.get(str(value))
+        if account is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return account
+
+
 class JournalEntryForm(forms.ModelForm):
     """单个分录表单"""
     # 将外键字段改为CharField，用于文本输入
@@ -33,6 +51,33 @@ class JournalEntryForm(forms.ModelForm):
             'amount': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'description': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '摘要'}),
         }
+        field_classes = {
+            'account': AccountChoiceField,
+        }
+
+    def __init__(self, *args, accounts=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['account'].accounts = accounts
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        # 科目已按预加载的科目字典校验过，模型校验时不再逐行查询
+        if self.fields['account'].accounts is not None:
+            exclude.add('account')
+        return exclude
+
+
+class BaseJournalEntryFormSet(forms.BaseFormSet):
+    """分录表单集：提交时一次性加载全部科目，供各行分录校验使用"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accounts = Account.objects.in_bulk() if self.is_bound else None
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs['accounts'] = self.accounts
+        return kwargs
 
 
 class VoucherForm(forms.ModelForm):
@@ -0,0 +1,310 @@
+# finance_app/importers.py
+"""
+凭证批量导入
+从 CSV 或 JSONL 逐行读取分录，按 voucher_ref 把连续的行归为一张凭证，
+用与 voucher_create 相同的表单字段规则校验（凭证表单、分录表单、至少两条分录、借贷平衡），
+校验通过的凭证攒够一批后在一个事务内整批预留凭证编号并 bulk_create 写入。
+整个过程只保留当前凭证和当前批次，不会把整个文件读入内存。
+
+CSV 表头 / JSONL 每行的字段：
+    voucher_ref          凭证参考号（上游系统中的凭证号，仅用于分组和报错）
+    voucher_date         凭证日期，如 2024-01-31
+    voucher_description  凭证摘要
+    account              科目代码
+    direction            DEBIT / CREDIT
+    amount               金额
+    description          分录摘要（可选）
+    customer, supplier   辅助核算（可选）
+JSONL 也可以一行一张凭证：{"voucher_ref": ..., "voucher_date": ..., "voucher_description": ..., "entries": [{...}, ...]}
+"""
+import csv
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from .forms import JournalEntryForm, VoucherForm
+from .models import Account, JournalEntry, ReportPeriod, Voucher
+
+# 每个事务写入的凭证张数
+IMPORT_BATCH_SIZE = 500
+
+# 最多记录的错误条数（超出部分只计数）
+IMPORT_MAX_ERRORS = 1000
+
+IMPORT_FORMATS = ['csv', 'jsonl']
+
+
+def detect_format(filename, default='csv'):
+    """根据文件扩展名判断导入格式"""
+    name = (filename or '').lower()
+    if name.endswith('.jsonl') or name.endswith('.json'):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, file_format):
+    """
+    逐行读取导入文件
+    生成 (行号, 分录字典)，无法解析的行生成 (行号, 错误信息字符串)
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == 'jsonl':
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                yield line_no, f'JSON 格式错误：{e}'
+                continue
+            if not isinstance(data, dict):
+                yield line_no, 'JSON 行必须是对象'
+                continue
+
+            # 一行一张凭证：展开为多条分录
+            entries = data.pop('entries', None)
+            if entries is None:
+                yield line_no, data
+            elif not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+                # 整行报错，不拆出半张凭证
+                yield line_no, 'entries 必须是对象数组'
+            else:
+                for entry in entries:
+                    yield line_no, {**data, **entry}
+    else:
+        raise ValueError(f'不支持的导入格式：{file_format}')
+
+
+def group_vouchers(rows):
+    """把 voucher_ref 相同的连续行归为一张凭证，生成 (voucher_ref, [(行号, 分录字典), ...])"""
+    current_ref = None
+    lines = []
+    for line_no, row in rows:
+        ref = row.get('voucher_ref', '') if isinstance(row, dict) else None
+        if lines and ref != current_ref:
+            yield current_ref, lines
+            lines = []
+        current_ref = ref
+        lines.append((line_no, row))
+    if lines:
+        yield current_ref, lines
+
+
+def error_text(errors):
+    """把 {字段: [错误信息...]} 拼接成一行文字"""
+    return '；'.join(f"{field}: {' '.join(messages)}" for field, messages in errors.items())
+
+
+class FormFieldCleaner:
+    """
+    用表单的字段定义校验字典数据
+    表单只实例化一次，之后每行直接调用各字段的 clean()，
+    规则与表单一致，但省去了逐行实例化表单时复制全部字段的开销。
+    """
+
+    def __init__(self, form):
+        self.fields = form.fields
+
+    def clean(self, data):
+        """返回 (cleaned_data, errors)"""
+        cleaned_data = {}
+        errors = {}
+        for name, field in self.fields.items():
+            value = data.get(name)
+            if value is None:
+                value = ''
+            try:
+                cleaned_data[name] = field.clean(value)
+            except ValidationError as e:
+                errors[name] = e.messages
+        return cleaned_data, errors
+
+
+class ImportResult:
+    """导入结果：计数、错误明细和吞吐量"""
+
+    def __init__(self, max_errors=IMPORT_MAX_ERRORS):
+        self.rows = 0
+        self.vouchers = 0
+        self.entries = 0
+        self.failed_vouchers = 0
+        self.error_count = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.started = time.perf_counter()
+        self.elapsed = 0
+
+    def add_error(self, line_no, voucher_ref, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line_no, 'voucher_ref': voucher_ref, 'error': message})
+
+    def finish(self):
+        """更新已用时间"""
+        self.elapsed = time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0
+
+    @property
+    def vouchers_per_second(self):
+        return self.vouchers / self.elapsed if self.elapsed else 0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'vouchers': self.vouchers,
+            'entries': self.entries,
+            'failed_vouchers': self.failed_vouchers,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'elapsed': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'vouchers_per_second': round(self.vouchers_per_second, 1),
+        }
+
+
+class VoucherImporter:
+    """
+    凭证导入器
+    用法：VoucherImporter(user).run(read_rows(stream, 'csv'))
+    """
+
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE, max_errors=IMPORT_MAX_ERRORS, progress=None):
+        self.user = user
+        self.batch_size = max(batch_size, 1)
+        self.progress = progress  # 每写入一批后回调 progress(result)
+        self.result = ImportResult(max_errors)
+        # 科目表只加载一次，各行分录按字典校验
+        self.voucher_cleaner = FormFieldCleaner(VoucherForm())
+        self.entry_cleaner = FormFieldCleaner(JournalEntryForm(accounts=Account.objects.in_bulk()))
+        # 最后一个已结账期间只查询一次，落在它及之前期间的凭证逐张报错，不让整批写入失败
+        self.last_closed_period = ReportPeriod.last_closed_period()
+        self.batch = []
+
+    def run(self, rows):
+        for voucher_ref, lines in group_vouchers(rows):
+            self.result.rows += len(lines)
+            prepared = self.validate(voucher_ref, lines)
+            if prepared is None:
+                self.result.failed_vouchers += 1
+                continue
+
+            self.batch.append(prepared)
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+
+        self.flush()
+        self.result.finish()
+        return self.result
+
+    def validate(self, voucher_ref, lines):
+        """
+        按 voucher_create 的规则校验一张凭证
+        通过时返回 (凭证, [分录...])（均未保存），否则记录错误并返回 None
+        """
+        first_line = lines[0][0]
+        valid = True
+
+        for line_no, row in lines:
+            if not isinstance(row, dict):
+                self.result.add_error(line_no, voucher_ref, row)
+                valid = False
+        if not valid:
+            return None
+
+        header = lines[0][1]
+        voucher_data, errors = self.voucher_cleaner.clean({
+            'voucher_date': header.get('voucher_date'),
+            'description': header.get('voucher_description'),
+        })
+        if errors:
+            self.result.add_error(first_line, voucher_ref, error_text(errors))
+            valid = False
+
+        entries = []
+        total_debit = 0
+        total_credit = 0
+        for line_no, row in lines:
+            entry_data, errors = self.entry_cleaner.clean(row)
+            if errors:
+                self.result.add_error(line_no, voucher_ref, error_text(errors))
+                valid = False
+                continue
+
+            entry = JournalEntry(**entry_data)
+            if entry.direction == 'DEBIT':
+                total_debit += entry.amount
+            else:
+                total_credit += entry.amount
+            entries.append(entry)
+
+        if not valid:
+            return None
+
+        if len(entries) < 2:
+            self.result.add_error(first_line, voucher_ref, '凭证至少需要两条分录')
+            return None
+
+        if total_debit != total_credit:
+            self.result.add_error(
+                first_line, voucher_ref, f'借贷不平衡！借方合计：{total_debit}，贷方合计：{total_credit}'
+            )
+            return None
+
+        voucher = Voucher(
+            **voucher_data,
+            created_by=self.user,
+            total_debit=total_debit,
+            total_credit=total_credit,
+        )
+        # bulk_create 不会调用 save()，会计期间需要手动设置
+        voucher.period = voucher.voucher_date.strftime('%Y%m')
+        if self.last_closed_period and voucher.period <= self.last_closed_period:
+            self.result.add_error(first_line, voucher_ref, f'会计期间 {voucher.period} 已结账')
+            return None
+        voucher.import_ref = voucher_ref
+        voucher.import_line = first_line
+        return voucher, entries
+
+    def flush(self):
+        """在一个事务内写入当前批次：整批预留凭证编号，凭证和分录各一次 bulk_create"""
+        if not self.batch:
+            return
+
+        batch, self.batch = self.batch, []
+        try:
+            with transaction.atomic():
+                voucher_ids = Voucher.allocate_voucher_ids(len(batch))
+                vouchers = []
+                for (voucher, _), voucher_id in zip(batch, voucher_ids):
+                    voucher.voucher_id = voucher_id
+                    vouchers.append(voucher)
+                Voucher.objects.bulk_create(vouchers)
+
+                entries = []
+                for voucher, voucher_entries in batch:
+                    for entry in voucher_entries:
+                        entry.voucher = voucher
+                        entries.append(entry)
+                JournalEntry.objects.bulk_create(entries)
+        except (DatabaseError, ValueError) as e:
+            # ValueError：导入过程中期间被结账，分录写入被拒绝
+            for voucher, _ in batch:
+                self.result.add_error(voucher.import_line, voucher.import_ref, f'写入失败：{e}')
+            self.result.failed_vouchers += len(batch)
+            return
+
+        self.result.vouchers += len(vouchers)
+        self.result.entries += len(entries)
+        if self.progress is not None:
+            self.result.finish()
+            self.progress(self.result)
@@ -0,0 +1,86 @@
+# finance_app/jobs.py
+"""
+报表生成后台任务
+任务登记在 ReportJob 表中（不依赖外部消息队列），
+由 run_report_worker 命令轮询领取并在进程池中执行；
+settings.REPORT_JOBS_RUN_INLINE = True 时在当前请求内直接执行（DEBUG 下的默认值）。
+执行超过 settings.REPORT_JOB_STALE_TIMEOUT 秒的任务在 worker 每次领取任务前、
+以及提交同一报表时重新排队，worker 异常退出后任务不会一直停留在“执行中”。
+"""
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .models import ReportJob
+from .reports import generate_balance_sheet, generate_income_statement, period_date_range
+
+# 报表类型 -> (生成函数, 没有数据时的提示)
+REPORT_GENERATORS = {
+    'BALANCE_SHEET': (generate_balance_sheet, '期间 {period} 没有找到凭证'),
+    'INCOME_STATEMENT': (generate_income_statement, '期间 {period} 没有找到已提交的凭证'),
+}
+
+
+def run_inline():
+    """是否在请求内直接执行任务"""
+    return getattr(settings, 'REPORT_JOBS_RUN_INLINE', False)
+
+
+def submit_report_job(report_type, period, user):
+    """
+    提交报表生成任务，返回 (任务, 是否新建)
+    同一报表、同一期间已有未结束的任务时复用该任务
+    """
+    period_date_range(period)  # 校验期间格式
+    requeue_stale_jobs()
+    job, created = ReportJob.enqueue(report_type, period, user)
+    # 直接执行时，超时后重新排队的旧任务也在本次请求中执行
+    if run_inline() and job.status == 'PENDING':
+        run_job(job.pk)
+        job.refresh_from_db()
+    return job, created
+
+
+def run_job(job_id):
+    """执行一个报表生成任务（在 worker 子进程或当前进程中调用），返回最终状态"""
+    job = ReportJob.objects.select_related('requested_by').get(pk=job_id)
+    if job.status == 'PENDING' and not job.claim():
+        return job.status
+    if job.status != 'RUNNING':
+        return job.status
+
+    generate, empty_message = REPORT_GENERATORS[job.report_type]
+    try:
+        report = generate(job.period, job.requested_by, progress=job.update_progress)
+    except Exception as e:
+        job.finish('FAILED', f'生成失败：{e}')
+        return job.status
+
+    if report is None:
+        job.finish('FAILED', empty_message.format(period=job.period))
+    else:
+        job.finish('SUCCESS', f'{job.period}{job.get_report_type_display()}已生成')
+    return job.status
+
+
+def init_worker():
+    """worker 子进程初始化：确保 Django 已加载，且不复用父进程的数据库连接"""
+    django.setup()
+    connections.close_all()
+
+
+def requeue_stale_jobs(timeout_seconds=None, exclude=()):
+    """
+    把执行时间超过 timeout_seconds（默认 settings.REPORT_JOB_STALE_TIMEOUT）的任务
+    （worker 异常退出遗留）重新放回队列；exclude 为调用方自己仍在执行的任务编号
+    返回重新排队的任务数
+    """
+    if timeout_seconds is None:
+        timeout_seconds = getattr(settings, 'REPORT_JOB_STALE_TIMEOUT', 1800)
+    deadline = timezone.now() - timedelta(seconds=timeout_seconds)
+    return ReportJob.objects.filter(status='RUNNING', start_time__lt=deadline).exclude(pk__in=list(exclude)).update(
+        status='PENDING', start_time=None, progress=0, message='任务超时，重新排队'
+    )
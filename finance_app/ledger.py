@@ -0,0 +1,160 @@
+# finance_app/ledger.py
+"""
+总分类账增量维护
+凭证进入已审核/已过账状态时，把该凭证按科目汇总后的借贷发生额增量记入总分类账；
+离开该状态时冲回。每次更新在同一事务内用一次批量 upsert 完成。
+"""
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import OuterRef, Q, Subquery, Sum
+
+from .models import Account, GeneralLedger, JournalEntry
+
+# 总分类账中随发生额变动的字段
+LEDGER_BALANCE_FIELDS = [
+    'opening_balance', 'opening_direction',
+    'debit_total', 'credit_total',
+    'ending_balance', 'ending_direction',
+]
+
+
+def signed_balance(balance, direction):
+    """余额转换为带符号金额（借方为正，贷方为负）"""
+    return balance if direction == 'DEBIT' else -balance
+
+
+def split_balance(value, default_direction):
+    """带符号金额拆分为 (余额, 方向)，余额为零时使用默认方向"""
+    if value > 0:
+        return value, 'DEBIT'
+    if value < 0:
+        return -value, 'CREDIT'
+    return 0, default_direction
+
+
+def set_opening_balance(ledger, value, default_direction):
+    """设置期初余额（带符号金额）并重新计算期末余额"""
+    ledger.opening_balance, ledger.opening_direction = split_balance(value, default_direction)
+    ledger.calculate_ending_balance()
+
+
+def next_period(period):
+    """下一个会计期间（202412 -> 202501）"""
+    year, month = int(period[:4]), int(period[4:])
+    if month == 12:
+        return f"{year + 1}01"
+    return f"{year}{month + 1:02d}"
+
+
+def period_range(start, end):
+    """起止期间之间（含两端）的所有会计期间"""
+    periods = []
+    period = start
+    while period <= end:
+        periods.append(period)
+        period = next_period(period)
+    return periods
+
+
+def latest_ledgers_before(period, account_ids=None):
+    """各科目在指定期间之前最近一期的总分类账记录（一条查询），account_ids 为 None 时查询全部科目"""
+    latest_period = GeneralLedger.objects.filter(
+        account=OuterRef('account'),
+        period__lt=period,
+    ).order_by('-period').values('period')[:1]
+
+    ledgers = GeneralLedger.objects.filter(period__lt=period, period=Subquery(latest_period))
+    if account_ids is not None:
+        ledgers = ledgers.filter(account_id__in=account_ids)
+    return {ledger.account_id: ledger for ledger in ledgers}
+
+
+def voucher_account_deltas(voucher):
+    """凭证分录按科目汇总的借贷发生额 {科目代码: (借方, 贷方)}"""
+    rows = JournalEntry.objects.filter(voucher=voucher).values('account_id').annotate(
+        debit_sum=Sum('amount', filter=Q(direction='DEBIT')),
+        credit_sum=Sum('amount', filter=Q(direction='CREDIT')),
+    ).order_by()
+
+    return {row['account_id']: (row['debit_sum'] or 0, row['credit_sum'] or 0) for row in rows}
+
+
+@transaction.atomic
+def apply_ledger_deltas(period, deltas):
+    """
+    把各科目的借贷发生额增量记入指定期间的总分类账
+    deltas: {科目代码: (借方增量, 贷方增量)}，冲回时传入负数
+    新建的总分类账记录以上一期的期末余额作为期初余额；
+    之后各期已存在的记录按净变动额顺延调整期初/期末余额。
+    发生额在行锁内累加到数据库中的当前值上，并发过账同一科目、同一期间时不会丢失。
+    """
+    if not deltas:
+        return []
+
+    account_ids = list(deltas)
+    directions = dict(Account.objects.filter(account_code__in=account_ids).values_list(
+        'account_code', 'balance_direction'
+    ))
+
+    # 先补齐本期缺少的记录（期初余额取上一期期末余额，发生额为零）。
+    # 并发过账可能同时新建同一条记录，忽略冲突即可：发生额统一在下面加锁后累加，不会互相覆盖
+    existing = set(GeneralLedger.objects.filter(
+        period=period, account_id__in=account_ids
+    ).values_list('account_id', flat=True))
+    missing = [account_id for account_id in account_ids if account_id not in existing]
+    if missing:
+        previous = latest_ledgers_before(period, missing)
+        new_ledgers = []
+        for account_id in missing:
+            ledger = GeneralLedger(period=period, account_id=account_id)
+            last = previous.get(account_id)
+            opening = signed_balance(last.ending_balance, last.ending_direction) if last is not None else 0
+            set_opening_balance(ledger, opening, directions[account_id])
+            new_ledgers.append(ledger)
+        GeneralLedger.objects.bulk_create(new_ledgers, ignore_conflicts=True)
+
+    # 锁定本期全部相关记录后再累加发生额
+    now = timezone.now()
+    ledgers = list(GeneralLedger.objects.select_for_update().filter(period=period, account_id__in=account_ids))
+    for ledger in ledgers:
+        debit, credit = deltas[ledger.account_id]
+        ledger.debit_total += debit
+        ledger.credit_total += credit
+        ledger.calculate_ending_balance()
+        ledger.update_time = now
+    GeneralLedger.objects.bulk_update(ledgers, LEDGER_BALANCE_FIELDS + ['update_time'])
+
+    # 顺延调整之后各期的期初余额
+    later_ledgers = list(GeneralLedger.objects.select_for_update().filter(
+        period__gt=period, account_id__in=account_ids
+    ))
+    for ledger in later_ledgers:
+        debit, credit = deltas[ledger.account_id]
+        opening = signed_balance(ledger.opening_balance, ledger.opening_direction) + debit - credit
+        set_opening_balance(ledger, opening, directions[ledger.account_id])
+
+    if later_ledgers:
+        GeneralLedger.objects.bulk_update(later_ledgers, LEDGER_BALANCE_FIELDS)
+
+    return ledgers
+
+
+def reverse_deltas(deltas):
+    """发生额增量取反（冲回用）"""
+    return {account_id: (-debit, -credit) for account_id, (debit, credit) in deltas.items()}
+
+
+def post_voucher_to_ledger(voucher, reverse=False):
+    """凭证记入总分类账；reverse=True 时冲回"""
+    deltas = voucher_account_deltas(voucher)
+    if reverse:
+        deltas = reverse_deltas(deltas)
+    return apply_ledger_deltas(voucher.period, deltas)
+
+
+@transaction.atomic
+def repost_voucher(voucher, old_period):
+    """已记账凭证改到其他期间：从原期间冲回，再记入新期间"""
+    deltas = voucher_account_deltas(voucher)
+    apply_ledger_deltas(old_period, reverse_deltas(deltas))
+    return apply_ledger_deltas(voucher.period, deltas)
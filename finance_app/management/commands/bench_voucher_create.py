@@ -0,0 +1,147 @@
+# finance_app/management/commands/bench_voucher_create.py
+"""
+并发创建凭证基准测试
+  python manage.py bench_voucher_create --threads 1,4,8 --vouchers 50
+  ACCOUNTING_DB_PROFILE=postgres python manage.py bench_voucher_create
+
+每个线程用测试客户端登录后循环 POST voucher_create（与页面提交走同一条路径），
+统计各并发数下的吞吐量、延迟和失败次数，用于比较不同数据库配置（ACCOUNTING_DB_PROFILE）。
+测试产生的凭证默认在结束后删除。
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from accounting_proj.profiling import percentile
+from finance_app.models import Account, Voucher
+
+BENCH_DESCRIPTION = '[bench] 并发创建凭证'
+
+
+def voucher_post_data(debit_account, credit_account, lines):
+    """一张 lines 条借方分录、一条贷方分录的凭证表单数据"""
+    data = {
+        'voucher_date': time.strftime('%Y-%m-%d'),
+        'description': BENCH_DESCRIPTION,
+        'entries-TOTAL_FORMS': lines + 1,
+        'entries-INITIAL_FORMS': 0,
+        'entries-MIN_NUM_FORMS': 2,
+        'entries-MAX_NUM_FORMS': 1000,
+    }
+    for i in range(lines):
+        data.update({
+            f'entries-{i}-account': debit_account,
+            f'entries-{i}-direction': 'DEBIT',
+            f'entries-{i}-amount': '10.00',
+        })
+    data.update({
+        f'entries-{lines}-account': credit_account,
+        f'entries-{lines}-direction': 'CREDIT',
+        f'entries-{lines}-amount': f'{10 * lines}.00',
+    })
+    return data
+
+
+class Command(BaseCommand):
+    help = '并发创建凭证基准测试（比较不同数据库配置的写入吞吐量）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', default='1,4,8', help='并发线程数，逗号分隔，依次测试')
+        parser.add_argument('--vouchers', type=int, default=50, help='每个线程创建的凭证张数')
+        parser.add_argument('--lines', type=int, default=4, help='每张凭证的借方分录条数')
+        parser.add_argument('--user', default='admin', help='提交凭证的用户名')
+        parser.add_argument('--keep', action='store_true', help='保留测试产生的凭证')
+
+    def handle(self, *args, **options):
+        try:
+            thread_counts = [int(value) for value in options['threads'].split(',')]
+        except ValueError:
+            raise CommandError('--threads 必须是逗号分隔的整数')
+
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'用户不存在：{options["user"]}')
+
+        accounts = list(Account.objects.filter(status='ACTIVE').order_by('account_code').values_list(
+            'account_code', flat=True)[:2])
+        if len(accounts) < 2:
+            raise CommandError('至少需要两个启用的会计科目')
+
+        self.stdout.write(f'数据库配置：{getattr(settings, "DB_PROFILE", "-")}（{self.describe_connection()}）')
+        self.stdout.write(f'每线程 {options["vouchers"]} 张凭证，每张 {options["lines"] + 1} 条分录')
+
+        data = voucher_post_data(accounts[0], accounts[1], options['lines'])
+        url = reverse('finance_app:voucher_create')
+        try:
+            # 测试客户端使用 testserver 作为主机名
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for threads in thread_counts:
+                    self.run_round(user, url, data, threads, options['vouchers'])
+        finally:
+            if not options['keep']:
+                deleted, _ = Voucher.objects.filter(description=BENCH_DESCRIPTION, status='DRAFT').delete()
+                self.stdout.write(f'已删除测试数据 {deleted} 条')
+
+    def describe_connection(self):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+                cursor.execute('PRAGMA synchronous')
+                synchronous = cursor.fetchone()[0]
+                cursor.execute('PRAGMA busy_timeout')
+                busy_timeout = cursor.fetchone()[0]
+            return f'sqlite journal_mode={journal_mode} synchronous={synchronous} busy_timeout={busy_timeout}ms'
+        db = settings.DATABASES['default']
+        pool = 'pool' in db.get('OPTIONS', {})
+        return f'{connection.vendor} CONN_MAX_AGE={db.get("CONN_MAX_AGE", 0)} pool={pool}'
+
+    def run_round(self, user, url, data, threads, vouchers):
+        """threads 个线程同时提交，返回后打印本轮统计"""
+        ready = threading.Barrier(threads + 1)
+
+        def worker():
+            client = Client()
+            client.force_login(user)
+            latencies = []
+            failures = 0
+            ready.wait()
+            try:
+                for _ in range(vouchers):
+                    started = time.perf_counter()
+                    try:
+                        response = client.post(url, data)
+                        ok = response.status_code == 302  # 创建成功后跳转到凭证详情
+                    except Exception:
+                        ok = False
+                    latencies.append(time.perf_counter() - started)
+                    if not ok:
+                        failures += 1
+            finally:
+                connections.close_all()
+            return latencies, failures
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [executor.submit(worker) for _ in range(threads)]
+            ready.wait()
+            started = time.perf_counter()
+            results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for result, _ in results for latency in result)
+        failures = sum(failures for _, failures in results)
+        succeeded = len(latencies) - failures
+        self.stdout.write(
+            f'  {threads:>3} 线程：成功 {succeeded} 张，失败 {failures} 张，耗时 {elapsed:.2f}s，'
+            f'{succeeded / max(elapsed, 1e-9):.1f} 张/秒，'
+            f'延迟 p50 {percentile(latencies, 50) * 1000:.1f}ms / p95 {percentile(latencies, 95) * 1000:.1f}ms'
+        )
@@ -0,0 +1,71 @@
+# finance_app/management/commands/import_vouchers.py
+"""
+批量导入凭证
+  python manage.py import_vouchers vouchers.csv --user admin --batch-size 500
+  python manage.py import_vouchers vouchers.jsonl --format jsonl --user admin
+
+文件逐行读取并校验，校验通过的凭证按批次写入，最后输出吞吐量和出错的行。
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from finance_app.importers import (
+    IMPORT_BATCH_SIZE, IMPORT_FORMATS, IMPORT_MAX_ERRORS, VoucherImporter, detect_format, read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = '从 CSV / JSONL 文件批量导入凭证（流式读取，分批写入）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='导入文件路径')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='文件格式（默认按扩展名判断）')
+        parser.add_argument('--user', default='admin', help='制单人用户名')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='每个事务写入的凭证张数')
+        parser.add_argument('--encoding', default='utf-8-sig', help='文件编码')
+        parser.add_argument('--max-errors', type=int, default=IMPORT_MAX_ERRORS, help='最多显示的错误条数')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'用户不存在：{options["user"]}')
+
+        file_format = options['format'] or detect_format(options['path'])
+
+        def report_progress(result):
+            self.stdout.write(
+                f'已导入凭证 {result.vouchers} 张、分录 {result.entries} 条'
+                f'（{result.rows_per_second:.0f} 行/秒）'
+            )
+
+        importer = VoucherImporter(
+            user,
+            batch_size=options['batch_size'],
+            max_errors=options['max_errors'],
+            progress=report_progress if options['verbosity'] > 1 else None,
+        )
+
+        try:
+            with open(options['path'], encoding=options['encoding'], newline='') as stream:
+                result = importer.run(read_rows(stream, file_format))
+        except OSError as e:
+            raise CommandError(f'无法读取文件：{e}')
+
+        for error in result.errors:
+            self.stderr.write(f"第 {error['line']} 行（凭证 {error['voucher_ref']}）：{error['error']}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'……另有 {result.error_count - len(result.errors)} 条错误未显示')
+
+        self.stdout.write(
+            f'读取 {result.rows} 行，导入凭证 {result.vouchers} 张、分录 {result.entries} 条，'
+            f'失败凭证 {result.failed_vouchers} 张'
+        )
+        message = (
+            f'耗时 {result.elapsed:.2f}s（{result.rows_per_second:.0f} 行/秒，'
+            f'{result.vouchers_per_second:.0f} 张凭证/秒）'
+        )
+        if result.failed_vouchers:
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,170 @@
+# finance_app/management/commands/rebuild_ledger.py
+"""
+重建总分类账
+  python manage.py rebuild_ledger --start 202401 --end 202412 --workers 4
+
+各期间的发生额汇总在进程池中并行计算（每个进程处理一个期间），
+主进程按期间顺序结转期初余额，并用 bulk_create(update_conflicts=True) 覆盖写入。
+与结账（period_close.close_ledger）相同，本期没有发生额但有期初余额的科目也保留一条记录。
+已结账期间的总分类账不再变化，默认从最后一个已结账期间的下一期开始重建，指定的范围包含已结账期间时拒绝执行。
+重复执行结果相同，不会累加。
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count, Q, Sum
+
+from finance_app.ledger import (
+    LEDGER_BALANCE_FIELDS, latest_ledgers_before, next_period, period_range, set_opening_balance, signed_balance,
+)
+from finance_app.models import Account, GeneralLedger, JournalEntry, ReportPeriod, Voucher
+from finance_app.reports import period_date_range
+
+
+def _init_worker():
+    """子进程初始化：确保 Django 已加载，且不复用父进程的数据库连接"""
+    django.setup()
+    connections.close_all()
+
+
+def aggregate_period(period):
+    """汇总一个期间已审核/已过账凭证的各科目借贷发生额"""
+    rows = JournalEntry.objects.filter(
+        voucher__period=period,
+        voucher__status__in=Voucher.LEDGER_STATUSES,
+    ).values('account_id').annotate(
+        debit_sum=Sum('amount', filter=Q(direction='DEBIT')),
+        credit_sum=Sum('amount', filter=Q(direction='CREDIT')),
+        entry_count=Count('id'),
+    ).order_by()
+
+    totals = {}
+    entry_count = 0
+    for row in rows:
+        totals[row['account_id']] = (row['debit_sum'] or 0, row['credit_sum'] or 0)
+        entry_count += row['entry_count']
+    return period, totals, entry_count
+
+
+class Command(BaseCommand):
+    help = '按期间重建总分类账（并行汇总，可重复执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='起始期间，如 202401（默认：最早的已审核凭证期间，已结账期间之后，且不晚于结束期间）')
+        parser.add_argument('--end', help='结束期间，如 202412（默认：最晚的已审核凭证期间，且不早于起始期间）')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行进程数')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        last_closed = ReportPeriod.last_closed_period()
+        ledger_periods = Voucher.objects.filter(
+            status__in=Voucher.LEDGER_STATUSES
+        ).values_list('period', flat=True).order_by('period')
+        if last_closed:
+            ledger_periods = ledger_periods.filter(period__gt=last_closed)
+        start, end = options['start'], options['end']
+        # 只指定一端时，另一端取已审核凭证的期间范围，并且至少包含指定的期间本身
+        # （指定的期间没有凭证时仍需清除旧记录、结转期初余额）
+        if start and not end:
+            end = max(start, ledger_periods.last() or start)
+        elif end and not start:
+            start = min(end, ledger_periods.first() or end)
+        elif not start:
+            start, end = ledger_periods.first(), ledger_periods.last()
+        if last_closed and start and start <= last_closed:
+            raise CommandError(
+                f'会计期间 {last_closed} 已结账，已结账期间及之前的总分类账不能重建，'
+                f'请从 {next_period(last_closed)} 开始或先反结账'
+            )
+
+        if not start or not end:
+            self.stdout.write(self.style.WARNING(
+                f'{last_closed} 之后没有已审核/已过账的凭证，无需重建' if last_closed else '没有已审核/已过账的凭证，无需重建'
+            ))
+            return
+
+        try:
+            period_date_range(start)
+            period_date_range(end)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if start > end:
+            raise CommandError(f'起始期间 {start} 晚于结束期间 {end}')
+
+        periods = period_range(start, end)
+        self.stdout.write(f'重建期间 {start} ~ {end}，共 {len(periods)} 个期间，{options["workers"]} 个进程')
+
+        # 1. 并行汇总各期间发生额
+        period_totals = {}
+        entry_count = 0
+        if options['workers'] > 1 and len(periods) > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as executor:
+                for period, totals, count in executor.map(aggregate_period, periods):
+                    period_totals[period] = totals
+                    entry_count += count
+        else:
+            for period in periods:
+                _, period_totals[period], count = aggregate_period(period)
+                entry_count += count
+
+        aggregated = time.perf_counter()
+
+        # 2. 按期间顺序结转期初余额并写入
+        directions = dict(Account.objects.values_list('account_code', 'balance_direction'))
+        balances = {
+            account_id: signed_balance(ledger.ending_balance, ledger.ending_direction)
+            for account_id, ledger in latest_ledgers_before(start, list(directions)).items()
+        }
+
+        written = 0
+        with transaction.atomic():
+            for period in periods:
+                totals = period_totals[period]
+                ledgers = []
+                for account_id in set(balances) | set(totals):
+                    debit, credit = totals.get(account_id, (0, 0))
+                    opening = balances.get(account_id, 0)
+                    if not (opening or debit or credit):
+                        continue
+                    ledger = GeneralLedger(period=period, account_id=account_id, debit_total=debit, credit_total=credit)
+                    set_opening_balance(ledger, opening, directions[account_id])
+                    balances[account_id] = signed_balance(ledger.ending_balance, ledger.ending_direction)
+                    ledgers.append(ledger)
+
+                # 期初、发生额都为零的旧记录删除（只有期初余额的记录保留，与结账一致）
+                GeneralLedger.objects.filter(period=period).exclude(
+                    account_id__in=[ledger.account_id for ledger in ledgers]
+                ).delete()
+                GeneralLedger.objects.bulk_create(
+                    ledgers,
+                    update_conflicts=True,
+                    unique_fields=['period', 'account'],
+                    update_fields=LEDGER_BALANCE_FIELDS + ['update_time'],
+                )
+                written += len(ledgers)
+
+            # 重建范围之后的期间顺延期初余额
+            later_ledgers = list(GeneralLedger.objects.filter(period__gt=end).order_by('period'))
+            for ledger in later_ledgers:
+                set_opening_balance(ledger, balances.get(ledger.account_id, 0), directions[ledger.account_id])
+                balances[ledger.account_id] = signed_balance(ledger.ending_balance, ledger.ending_direction)
+            if later_ledgers:
+                GeneralLedger.objects.bulk_update(later_ledgers, LEDGER_BALANCE_FIELDS, batch_size=1000)
+
+        finished = time.perf_counter()
+        elapsed = finished - started
+        self.stdout.write(
+            f'汇总分录 {entry_count} 条，耗时 {aggregated - started:.2f}s'
+            f'（{entry_count / max(aggregated - started, 1e-9):.0f} 条/秒）'
+        )
+        self.stdout.write(
+            f'写入总分类账 {written} 条，耗时 {finished - aggregated:.2f}s'
+            f'（{written / max(finished - aggregated, 1e-9):.0f} 条/秒）'
+        )
+        self.stdout.write(self.style.SUCCESS(f'总分类账重建完成，总耗时 {elapsed:.2f}s'))
@@ -0,0 +1,93 @@
+# finance_app/management/commands/run_benchmarks.py
+"""
+运行性能基准测试
+  python manage.py run_benchmarks --rounds 5
+  python manage.py run_benchmarks --only voucher_list,export_voucher_journal --compare latest
+
+先用 seed_benchmark_data 生成测试数据。每个用例通过测试客户端请求对应页面，
+结果写入 --output（默认 benchmarks/results/时间戳.json）；
+--compare 指定上一次的结果文件（latest 表示结果目录中最新的一份），中位数变慢超过 --threshold 的用例标为回退。
+"""
+import glob
+import os
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from finance_app.benchmarks import (
+    BENCHMARKS, REGRESSION_THRESHOLD, compare_results, load_results, run_benchmarks, save_results,
+)
+
+
+def default_results_dir():
+    return os.path.join(settings.BASE_DIR, 'benchmarks', 'results')
+
+
+class Command(BaseCommand):
+    help = '运行 finance_app 热点页面的性能基准测试，结果输出为 JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=5, help='每个用例计时的次数')
+        parser.add_argument('--warmup', type=int, default=1, help='每个用例计时前的预热次数')
+        parser.add_argument('--only', help=f'只运行指定用例，逗号分隔（可选：{", ".join(BENCHMARKS)}）')
+        parser.add_argument('--user', default='admin', help='发起请求的用户名')
+        parser.add_argument('--output', help='结果文件路径（默认 benchmarks/results/时间戳.json）')
+        parser.add_argument('--compare', help='与之前的结果文件比较（latest 表示最新的一份）')
+        parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                            help='中位数变慢超过该比例视为回退（默认 0.2）')
+        parser.add_argument('--fail-on-regression', action='store_true', help='有回退时以非零状态退出')
+
+    def handle(self, *args, **options):
+        if options['rounds'] < 1:
+            raise CommandError('--rounds 至少为 1')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'用户不存在：{options["user"]}')
+
+        names = [name.strip() for name in options['only'].split(',')] if options['only'] else None
+
+        previous_path = options['compare']
+        if previous_path == 'latest':
+            candidates = sorted(glob.glob(os.path.join(default_results_dir(), '*.json')))
+            previous_path = candidates[-1] if candidates else None
+            if previous_path is None:
+                self.stdout.write(self.style.WARNING('没有之前的结果可供比较'))
+
+        self.stdout.write(f'{"用例":<28}{"中位数":>12}{"最小":>12}{"最大":>12}{"SQL":>6}  状态码')
+
+        def progress(name, stats):
+            self.stdout.write(
+                f'{name:<28}{stats["median"] * 1000:>10.1f}ms{stats["min"] * 1000:>10.1f}ms'
+                f'{stats["max"] * 1000:>10.1f}ms{stats["queries"]:>6}  {stats["status_codes"]}'
+            )
+
+        try:
+            results = run_benchmarks(user, names, options['rounds'], max(options['warmup'], 0), progress)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = options['output'] or os.path.join(
+            default_results_dir(), f'{timezone.localtime().strftime("%Y%m%d-%H%M%S")}.json'
+        )
+        save_results(results, output)
+        self.stdout.write(self.style.SUCCESS(f'结果已写入 {output}'))
+
+        if not previous_path:
+            return
+
+        rows = compare_results(load_results(previous_path), results, options['threshold'])
+        self.stdout.write(f'与 {previous_path} 比较（中位数）：')
+        regressions = []
+        for name, before, after, change, regressed in rows:
+            line = f'  {name:<28}{before * 1000:>10.1f}ms -> {after * 1000:>10.1f}ms  {change:+.1%}'
+            if regressed:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line + '  回退'))
+            else:
+                self.stdout.write(line)
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'性能回退：{", ".join(regressions)}')
@@ -0,0 +1,79 @@
+# finance_app/management/commands/run_report_worker.py
+"""
+报表生成任务 worker
+  python manage.py run_report_worker --workers 4
+  python manage.py run_report_worker --once      # 处理完当前排队的任务后退出
+
+主进程轮询 ReportJob 表领取排队中的任务，交给进程池执行；
+子进程只接收任务编号，执行结果和进度直接写回数据库。
+每次领取前把执行超时的任务（其他 worker 异常退出遗留）重新排队。
+settings.REPORT_JOBS_RUN_INLINE 为 False（生产环境）时必须运行本命令，报表任务才会被执行。
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from finance_app.jobs import init_worker, requeue_stale_jobs, run_job
+from finance_app.models import ReportJob
+
+
+class Command(BaseCommand):
+    help = '执行后台报表生成任务（数据库任务表 + 进程池）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行进程数')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='没有任务时的轮询间隔（秒）')
+        parser.add_argument('--stale-timeout', type=int, default=settings.REPORT_JOB_STALE_TIMEOUT,
+                            help='执行超过该秒数的任务视为 worker 异常退出，重新排队')
+        parser.add_argument('--once', action='store_true', help='处理完当前排队的任务后退出')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+
+        self.stdout.write(f'报表任务 worker 已启动，{workers} 个进程')
+        running = {}
+
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+            try:
+                while True:
+                    # 回收已结束的任务
+                    for job_id, future in list(running.items()):
+                        if future.done():
+                            del running[job_id]
+                            try:
+                                status = future.result()
+                            except Exception as e:
+                                # 子进程异常退出：任务标记为失败
+                                ReportJob.objects.filter(pk=job_id).update(
+                                    status='FAILED', message=str(e)[:500], finish_time=timezone.now()
+                                )
+                                status = 'FAILED'
+                            self.stdout.write(f'任务 {job_id}：{status}')
+
+                    # 按提交顺序领取排队中的任务，进程池满时不再领取
+                    free = workers - len(running)
+                    claimed = 0
+                    if free > 0:
+                        requeued = requeue_stale_jobs(options['stale_timeout'], exclude=running)
+                        if requeued:
+                            self.stdout.write(self.style.WARNING(f'{requeued} 个超时任务已重新排队'))
+                        for job in ReportJob.objects.filter(status='PENDING').order_by('create_time')[:free]:
+                            if job.claim():
+                                running[job.pk] = executor.submit(run_job, job.pk)
+                                claimed += 1
+                                self.stdout.write(f'任务 {job.pk}：{job} 开始执行')
+
+                    if options['once'] and not running and not claimed:
+                        break
+                    if not claimed:
+                        time.sleep(options['poll_interval'] if not running else 0.2)
+            except KeyboardInterrupt:
+                self.stdout.write('正在等待执行中的任务结束……')
+
+        self.stdout.write(self.style.SUCCESS('报表任务 worker 已退出'))
@@ -0,0 +1,85 @@
+# finance_app/management/commands/seed_benchmark_data.py
+"""
+生成性能基准测试数据
+  python manage.py seed_benchmark_data --lines 1000000 --months 12
+  python manage.py seed_benchmark_data --clear
+
+在每个一级科目下生成明细科目，并生成客户、供应商、采购/销售订单和约 --lines 条分录的凭证
+（约 70% 已过账、25% 已提交、5% 草稿），已过账凭证与页面过账一样增量记入总分类账。
+同一 --seed 生成的数据相同；所有数据带有 [bench] / BENCH- 标记，--clear 整体删除。
+"""
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from finance_app.benchmarks import (
+    SEED_BATCH_SIZE, clear_benchmark_data, default_seed_periods, seed_accounts, seed_orders, seed_partners,
+    seed_vouchers,
+)
+
+
+class Command(BaseCommand):
+    help = '生成性能基准测试数据（科目、客户、供应商、订单、凭证分录）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=100000, help='生成的分录条数')
+        parser.add_argument('--months', type=int, default=12, help='分布在最近几个会计期间（截止上个月）')
+        parser.add_argument('--accounts-per-parent', type=int, default=5, help='每个一级科目下的明细科目数')
+        parser.add_argument('--customers', type=int, default=1000, help='客户数')
+        parser.add_argument('--suppliers', type=int, default=500, help='供应商数')
+        parser.add_argument('--orders', type=int, default=2000, help='采购订单、销售订单各多少张')
+        parser.add_argument('--batch-size', type=int, default=SEED_BATCH_SIZE, help='每个事务写入的凭证张数')
+        parser.add_argument('--seed', type=int, default=42, help='随机数种子')
+        parser.add_argument('--user', default='admin', help='凭证制单人用户名')
+        parser.add_argument('--clear', action='store_true', help='删除已生成的测试数据后退出')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted = clear_benchmark_data()
+            self.stdout.write(self.style.SUCCESS(
+                '已删除测试数据：' + '，'.join(f'{name} {count}' for name, count in deleted.items())
+            ))
+            return
+
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'用户不存在：{options["user"]}')
+        if options['months'] < 1:
+            raise CommandError('--months 至少为 1')
+
+        rng = random.Random(options['seed'])
+        periods = default_seed_periods(options['months'])
+        started = time.perf_counter()
+
+        account_codes = seed_accounts(options['accounts_per_parent'])
+        if not account_codes:
+            raise CommandError('没有一级科目，请先导入科目表')
+        customer_ids, supplier_ids = seed_partners(options['customers'], options['suppliers'])
+        purchase_count, sales_count = seed_orders(user, options['orders'], customer_ids, supplier_ids, periods, rng)
+        self.stdout.write(
+            f'明细科目 {len(account_codes)} 个，客户 {len(customer_ids)} 个，供应商 {len(supplier_ids)} 个，'
+            f'采购订单 {purchase_count} 张，销售订单 {sales_count} 张'
+        )
+
+        total_lines = options['lines']
+        seeded = time.perf_counter()
+
+        def progress(lines_written):
+            elapsed = time.perf_counter() - seeded
+            self.stdout.write(
+                f'\r  分录 {lines_written}/{total_lines}（{lines_written / max(elapsed, 1e-9):.0f} 条/秒）',
+                ending='',
+            )
+            self.stdout.flush()
+
+        voucher_count, line_count = seed_vouchers(
+            user, total_lines, account_codes, customer_ids, supplier_ids, periods, rng,
+            batch_size=max(options['batch_size'], 1), progress=progress,
+        )
+        self.stdout.write('')
+        self.stdout.write(f'凭证 {voucher_count} 张，分录 {line_count} 条，期间 {periods[0]} ~ {periods[-1]}')
+
+        self.stdout.write(self.style.SUCCESS(f'测试数据生成完成，总耗时 {time.perf_counter() - started:.2f}s'))
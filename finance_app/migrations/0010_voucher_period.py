@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_app', '0009_purchaseorder_salesorder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voucher',
+            name='period',
+            field=models.CharField(default='', editable=False, max_length=6, verbose_name='会计期间'),
+        ),
+        migrations.AddIndex(
+            model_name='voucher',
+            index=models.Index(fields=['status', 'period'], name='vouchers_status_period_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 01:45
+
+from django.db import migrations
+
+
+def backfill_voucher_period(apps, schema_editor):
+    """根据凭证日期回填会计期间"""
+    Voucher = apps.get_model('finance_app', 'Voucher')
+
+    batch = []
+    for voucher in Voucher.objects.only('id', 'voucher_date').order_by('id').iterator(chunk_size=2000):
+        voucher.period = voucher.voucher_date.strftime('%Y%m')
+        batch.append(voucher)
+        if len(batch) >= 2000:
+            Voucher.objects.bulk_update(batch, ['period'])
+            batch = []
+
+    if batch:
+        Voucher.objects.bulk_update(batch, ['period'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_app', '0010_voucher_period'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_voucher_period, migrations.RunPython.noop),
+    ]
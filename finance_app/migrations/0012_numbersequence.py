@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 01:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_app', '0011_backfill_voucher_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=10, verbose_name='编号前缀')),
+                ('period_key', models.CharField(max_length=8, verbose_name='日期键')),
+                ('last_value', models.PositiveIntegerField(default=0, verbose_name='已分配序号')),
+            ],
+            options={
+                'verbose_name': '单据编号序列',
+                'verbose_name_plural': '单据编号序列',
+                'db_table': 'number_sequences',
+                'unique_together': {('prefix', 'period_key')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 01:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_app', '0012_numbersequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='voucher',
+            index=models.Index(fields=['voucher_date', 'voucher_id'], name='vouchers_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 01:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_app', '0013_voucher_date_id_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_type', models.CharField(choices=[('BALANCE_SHEET', '资产负债表'), ('INCOME_STATEMENT', '利润表')], max_length=20, verbose_name='报表类型')),
+                ('period', models.CharField(max_length=6, verbose_name='会计期间')),
+                ('status', models.CharField(choices=[('PENDING', '排队中'), ('RUNNING', '执行中'), ('SUCCESS', '已完成'), ('FAILED', '失败')], default='PENDING', max_length=20, verbose_name='状态')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='进度')),
+                ('message', models.CharField(blank=True, max_length=500, verbose_name='状态说明')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='提交时间')),
+                ('start_time', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('finish_time', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='提交人')),
+            ],
+            options={
+                'verbose_name': '报表生成任务',
+                'verbose_name_plural': '报表生成任务',
+                'db_table': 'report_jobs',
+                'ordering': ['-create_time'],
+                'indexes': [models.Index(fields=['status', 'create_time'], name='report_jobs_status_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'RUNNING'])), fields=('report_type', 'period'), name='report_jobs_active_unique')],
+            },
+        ),
+    ]
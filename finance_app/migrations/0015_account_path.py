@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_app', '0014_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=1, editable=False, verbose_name='科目级次'),
+        ),
+        migrations.AddField(
+            model_name='account',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255, verbose_name='科目路径'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 02:10
+
+from django.db import migrations
+
+
+def backfill_account_path(apps, schema_editor):
+    """根据父级科目回填科目路径和级次"""
+    Account = apps.get_model('finance_app', 'Account')
+
+    parents = dict(Account.objects.values_list('account_code', 'parent_account_id'))
+    paths = {}
+    for code in parents:
+        # 沿父级链向上找到已回填的科目，再依次向下计算（父级链有环时断开）
+        chain = []
+        while code is not None and code not in paths and code not in chain:
+            chain.append(code)
+            code = parents.get(code)
+        base_path, base_depth = paths.get(code, ('/', 0))
+        for item in reversed(chain):
+            base_path, base_depth = f'{base_path}{item}/', base_depth + 1
+            paths[item] = (base_path, base_depth)
+
+    batch = []
+    for account in Account.objects.only('account_code').order_by('account_code').iterator(chunk_size=2000):
+        account.path, account.depth = paths[account.account_code]
+        batch.append(account)
+        if len(batch) >= 2000:
+            Account.objects.bulk_update(batch, ['path', 'depth'])
+            batch = []
+
+    if batch:
+        Account.objects.bulk_update(batch, ['path', 'depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_app', '0015_account_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_account_path, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_app', '0016_backfill_account_path'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='journalentry',
+            options={'verbose_name': '分录明细', 'verbose_name_plural': '分录明细'},
+        ),
+        migrations.AddField(
+            model_name='journalentry',
+            name='period',
+            field=models.CharField(default='', editable=False, max_length=6, verbose_name='会计期间'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 02:14
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_journalentry_period(apps, schema_editor):
+    """从所属凭证回填分录的会计期间（一条 UPDATE）"""
+    Voucher = apps.get_model('finance_app', 'Voucher')
+    JournalEntry = apps.get_model('finance_app', 'JournalEntry')
+
+    JournalEntry.objects.update(
+        period=Subquery(Voucher.objects.filter(pk=OuterRef('voucher_id')).values('period')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_app', '0017_journalentry_period'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_journalentry_period, migrations.RunPython.noop),
+    ]
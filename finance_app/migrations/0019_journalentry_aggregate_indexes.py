@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 02:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_app', '0018_backfill_journalentry_period'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['period', 'account', 'direction', 'amount'], name='je_period_acct_dir_amt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalentry',
+            index=models.Index(fields=['account', 'period', 'direction', 'amount'], name='je_acct_period_dir_amt_idx'),
+        ),
+        # 组合索引建好后再去掉科目外键的单列索引
+        migrations.AlterField(
+            model_name='journalentry',
+            name='account',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='finance_app.account', verbose_name='会计科目'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 02:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_app', '0019_journalentry_aggregate_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountBalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=6, verbose_name='会计期间')),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='本期借方')),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='本期贷方')),
+                ('closing_balance', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='本期余额')),
+                ('closing_direction', models.CharField(choices=[('DEBIT', '借方'), ('CREDIT', '贷方')], default='DEBIT', max_length=10, verbose_name='余额方向')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='冻结时间')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='finance_app.account', verbose_name='科目')),
+            ],
+            options={
+                'verbose_name': '科目余额快照',
+                'verbose_name_plural': '科目余额快照',
+                'db_table': 'account_balance_snapshots',
+                'unique_together': {('period', 'account')},
+            },
+        ),
+    ]
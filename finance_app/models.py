@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Now, Substr
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MinLengthValidator, RegexValidator
@@ -60,6 +62,10 @@ class Account(models.Model):
         default='ACTIVE',
         verbose_name="状态"
     )
+    # 科目路径（物化路径，如 /1002/100201/）和级次（一级科目为 1），保存时根据父级科目自动维护
+    # 某个科目的全部下级科目 = 路径以该科目路径开头的科目，用一次前缀查询取出
+    path = models.CharField(max_length=255, default='', editable=False, db_index=True, verbose_name="科目路径")
+    depth = models.PositiveSmallIntegerField(default=1, editable=False, verbose_name="科目级次")
     # 新增创建/更新时间（便于追溯，可选但推荐）
     create_time = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     update_time = models.DateTimeField(auto_now=True, verbose_name="更新时间")
@@ -74,6 +80,61 @@ class Account(models.Model):
         # 打印对象时显示「科目代码-科目名称」，便于后台管理查看
         return f"{self.account_code} - {self.account_name}"
 
+    def parent_path(self):
+        """父级科目在数据库中的 (路径, 级次)，没有父级科目时返回 ('/', 0)"""
+        if self.parent_account_id is None:
+            return '/', 0
+        # 从数据库读取，避免内存中的父级科目对象在其上级调整后路径已过期
+        return Account.objects.filter(pk=self.parent_account_id).values_list('path', 'depth').get()
+
+    @staticmethod
+    def subtree_filter(path, include_self=True):
+        """
+        路径为 path 的科目及其全部下级科目的查询条件（路径前缀匹配）
+        PostgreSQL 上 Django 为 path 额外建立 varchar_pattern_ops 索引，前缀匹配与数据库排序规则无关
+        """
+        condition = models.Q(path__startswith=path)
+        if not include_self:
+            condition &= ~models.Q(path=path)
+        return condition
+
+    def descendants(self, include_self=False):
+        """全部下级科目（一条查询）"""
+        return Account.objects.filter(Account.subtree_filter(self.path, include_self))
+
+    def clean(self):
+        super().clean()
+        if self.parent_account_id is not None and self.path:
+            parent_path, _ = self.parent_path()
+            if parent_path.startswith(self.path):
+                raise ValidationError({'parent_account': '父级科目不能是本科目或其下级科目'})
+
+    def save(self, *args, **kwargs):
+        old_path, old_depth = None, None
+        if not self._state.adding:
+            old = Account.objects.filter(pk=self.pk).values_list('path', 'depth').first()
+            if old is not None:
+                old_path, old_depth = old
+
+        parent_path, parent_depth = self.parent_path()
+        if old_path and parent_path.startswith(old_path):
+            raise ValueError(f'科目 {self.account_code} 的父级科目不能是本科目或其下级科目')
+        self.path, self.depth = f"{parent_path}{self.account_code}/", parent_depth + 1
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'path', 'depth'}
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # 父级科目变化时，用一条 UPDATE 改写全部下级科目的路径前缀和级次
+            if old_path and old_path != self.path:
+                Account.objects.filter(Account.subtree_filter(old_path, include_self=False)).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (self.depth - old_depth),
+                    update_time=Now(),
+                )
+
 
 # -------------------------- 客户表（customers） --------------------------
 class Customer(models.Model):
@@ -165,6 +226,61 @@ class Supplier(models.Model):
         return f"{self.supplier_id} - {self.supplier_name}"
 
 
+# -------------------------- 单据编号序列 --------------------------
+class NumberSequence(models.Model):
+    """
+    单据编号序列表
+    每个「前缀 + 日期键」一行（如 V + 202401、PO + 20240115），
+    通过原子 UPDATE 递增序号，避免每次新建单据都扫描已有编号，并发新建时也不会取到相同编号。
+    """
+    prefix = models.CharField(max_length=10, verbose_name="编号前缀")
+    period_key = models.CharField(max_length=8, verbose_name="日期键")  # 格式：202401 或 20240115
+    last_value = models.PositiveIntegerField(default=0, verbose_name="已分配序号")
+
+    class Meta:
+        db_table = 'number_sequences'
+        verbose_name = "单据编号序列"
+        verbose_name_plural = "单据编号序列"
+        unique_together = [['prefix', 'period_key']]
+
+    def __str__(self):
+        return f"{self.prefix}{self.period_key} - {self.last_value}"
+
+    @classmethod
+    def allocate(cls, prefix, period_key, count=1, seed=None):
+        """
+        分配 count 个连续序号，返回第一个序号
+        seed: 序列首次创建时调用，返回已有单据的最大序号（兼容引入序列表之前的数据）
+        """
+        with transaction.atomic():
+            sequence = cls.objects.filter(prefix=prefix, period_key=period_key)
+
+            # UPDATE 会锁住该行直到事务结束，其他并发请求在此等待
+            if not sequence.update(last_value=F('last_value') + count):
+                try:
+                    with transaction.atomic():
+                        start = seed() if seed else 0
+                        cls.objects.create(prefix=prefix, period_key=period_key, last_value=start + count)
+                    return start + 1
+                except IntegrityError:
+                    # 其他请求已抢先创建了该序列
+                    sequence.update(last_value=F('last_value') + count)
+
+            last_value = sequence.values_list('last_value', flat=True).get()
+            return last_value - count + 1
+
+
+def last_serial_number(queryset, field, prefix):
+    """已有单据中指定前缀的最大流水号（仅在序列首次创建时调用）"""
+    last_number = queryset.filter(**{f'{field}__startswith': prefix}).order_by(
+        f'-{field}'
+    ).values_list(field, flat=True).first()
+
+    if last_number and last_number[len(prefix):].isdigit():
+        return int(last_number[len(prefix):])
+    return 0
+
+
 # -------------------------- 会计凭证核心模型 --------------------------
 
 class Voucher(models.Model):
@@ -175,10 +291,14 @@ class Voucher(models.Model):
         ('AUDITED', '已审核'),
         ('POSTED', '已过账'),
     ]
+    # 记入总分类账的状态
+    LEDGER_STATUSES = ['AUDITED', 'POSTED']
 
     # 凭证编号（自动生成：V2024010001）
     voucher_id = models.CharField(max_length=20, unique=True, verbose_name="凭证编号")
     voucher_date = models.DateField(default=timezone.now, verbose_name="凭证日期")
+    # 会计期间（由凭证日期自动计算，格式：202401）
+    period = models.CharField(max_length=6, default='', editable=False, verbose_name="会计期间")
     description = models.TextField(verbose_name="摘要")
 
     # 借贷总额（自动计算）
@@ -217,33 +337,97 @@ class Voucher(models.Model):
         verbose_name = "会计凭证"
         verbose_name_plural = "会计凭证"
         ordering = ['-voucher_date', 'voucher_id']
+        indexes = [
+            # 报表按「状态 + 期间」筛选凭证
+            models.Index(fields=['status', 'period'], name='vouchers_status_period_idx'),
+            # 凭证列表按「日期 + 编号」游标分页
+            models.Index(fields=['voucher_date', 'voucher_id'], name='vouchers_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.voucher_id} - {self.description[:30]}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录数据库中的原始状态，保存时据此判断是否需要更新总分类账
+        instance._db_status = instance.__dict__.get('status')
+        instance._db_period = instance.__dict__.get('period')
+        return instance
+
     def save(self, *args, **kwargs):
         # 自动生成凭证编号
         if not self.voucher_id:
-            today = timezone.now().strftime('%Y%m')
-            last_voucher = Voucher.objects.filter(
-                voucher_id__startswith=f"V{today}"
-            ).order_by('voucher_id').last()
-
-            if last_voucher:
-                last_num = int(last_voucher.voucher_id[-4:])
-                new_num = last_num + 1
-            else:
-                new_num = 1
-
-            self.voucher_id = f"V{today}{new_num:04d}"
-
-        super().save(*args, **kwargs)
+            self.voucher_id = Voucher.allocate_voucher_ids()[0]
+
+        # 会计期间与凭证日期保持一致
+        self.period = self.voucher_date.strftime('%Y%m')
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'voucher_date' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'period'}
+
+        was_posted = getattr(self, '_db_status', None) in self.LEDGER_STATUSES
+        is_posted = self.status in self.LEDGER_STATUSES
+
+        with transaction.atomic():
+            # 已结账期间的凭证不能修改，也不能把凭证改到已结账期间
+            ReportPeriod.check_open(self.period, getattr(self, '_db_period', None))
+            super().save(*args, **kwargs)
+
+            # 凭证日期跨期修改时同步分录上冗余的会计期间
+            db_period = getattr(self, '_db_period', None)
+            period_changed = bool(db_period) and db_period != self.period
+            if period_changed:
+                self.entries.update(period=self.period)
+
+            # 审核/过账时记入总分类账，退回时冲回；已记账的凭证跨期修改时从原期间转到新期间
+            if was_posted != is_posted:
+                from .ledger import post_voucher_to_ledger
+                post_voucher_to_ledger(self, reverse=was_posted)
+            elif is_posted and period_changed:
+                from .ledger import repost_voucher
+                repost_voucher(self, db_period)
+
+        self._db_status = self.status
+        self._db_period = self.period
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            ReportPeriod.check_open(getattr(self, '_db_period', None) or self.period)
+            # 删除已记账的凭证前先冲回总分类账
+            if getattr(self, '_db_status', None) in self.LEDGER_STATUSES:
+                from .ledger import post_voucher_to_ledger
+                post_voucher_to_ledger(self, reverse=True)
+            return super().delete(*args, **kwargs)
+
+    @classmethod
+    def allocate_voucher_ids(cls, count=1):
+        """一次分配 count 个凭证编号（V + 年月 + 4位流水号），批量导入时可整批预留"""
+        today = timezone.now().strftime('%Y%m')
+        prefix = f"V{today}"
+        first_num = NumberSequence.allocate(
+            'V', today, count,
+            seed=lambda: last_serial_number(cls.objects.all(), 'voucher_id', prefix)
+        )
+        return [f"{prefix}{num:04d}" for num in range(first_num, first_num + count)]
 
     def is_balanced(self):
         """检查借贷是否平衡"""
         return self.total_debit == self.total_credit
 
 
+class JournalEntryQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # 批量写入不经过 save()，在这里补上冗余的会计期间，并做与 check_writable 相同的检查
+        objs = list(objs)
+        for entry in objs:
+            entry.fill_period()
+            if entry.voucher.status in Voucher.LEDGER_STATUSES:
+                raise ValueError(f'凭证 {entry.voucher.voucher_id} 已审核/已过账，不能修改分录')
+        ReportPeriod.check_open(*{entry.period for entry in objs})
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class JournalEntry(models.Model):
     """分录明细表"""
     voucher = models.ForeignKey(
@@ -253,9 +437,11 @@ class JournalEntry(models.Model):
         verbose_name="所属凭证"
     )
 
+    # 外键不单独建索引，由下面以 account 开头的组合索引覆盖
     account = models.ForeignKey(
         Account,
         on_delete=models.PROTECT,
+        db_index=False,
         verbose_name="会计科目"
     )
 
@@ -269,6 +455,9 @@ class JournalEntry(models.Model):
     amount = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="金额")
     description = models.CharField(max_length=200, verbose_name="摘要", blank=True)
 
+    # 会计期间（冗余自所属凭证，凭证日期变化时同步），报表按「科目 + 期间 + 方向」汇总时不需要关联凭证表
+    period = models.CharField(max_length=6, default='', editable=False, verbose_name="会计期间")
+
     # 辅助核算（可选）
     customer = models.CharField(
         max_length=100,
@@ -285,15 +474,50 @@ class JournalEntry(models.Model):
 
     create_time = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
 
+    objects = JournalEntryQuerySet.as_manager()
+
     class Meta:
         db_table = 'journal_entries'
         verbose_name = "分录明细"
         verbose_name_plural = "分录明细"
-        ordering = ['voucher', 'id']
+        # 不设默认排序：聚合查询不需要排序，需要顺序的地方显式 order_by('voucher', 'id')
+        # 两个组合索引都包含 direction 和 amount，按科目 / 期间汇总借贷金额时只读索引不回表
+        indexes = [
+            # 单个期间内按科目汇总（报表、总分类账重建）：期间等值过滤后按科目顺序分组
+            models.Index(fields=['period', 'account', 'direction', 'amount'], name='je_period_acct_dir_amt_idx'),
+            # 单个科目跨期间查询（明细账、试算平衡表），同时作为科目外键的索引
+            models.Index(fields=['account', 'period', 'direction', 'amount'], name='je_acct_period_dir_amt_idx'),
+        ]
 
     def __str__(self):
         return f"{self.voucher.voucher_id} - {self.account.account_name}"
 
+    def fill_period(self):
+        """会计期间与所属凭证保持一致"""
+        voucher = self.voucher
+        self.period = voucher.period or voucher.voucher_date.strftime('%Y%m')
+
+    def check_writable(self):
+        """
+        分录能否写入：所在期间未结账，且所属凭证尚未审核/过账
+        已记账凭证的分录变动不会反映到总分类账，需要先把凭证退回未记账状态
+        """
+        ReportPeriod.check_open(self.period)
+        if self.voucher.status in Voucher.LEDGER_STATUSES:
+            raise ValueError(f'凭证 {self.voucher.voucher_id} 已审核/已过账，不能修改分录')
+
+    def save(self, *args, **kwargs):
+        self.fill_period()
+        self.check_writable()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'period'}
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        self.check_writable()
+        return super().delete(*args, **kwargs)
+
 
 class GeneralLedger(models.Model):
     """总分类账（用于财务报表）"""
@@ -533,6 +757,198 @@ class ReportPeriod(models.Model):
     def __str__(self):
         return f"{self.period_name} ({'已结账' if self.is_closed else '未结账'})"
 
+    @classmethod
+    def closed_periods(cls, periods=None):
+        """已结账的期间代码集合（一条查询），periods 为 None 时查询全部期间"""
+        closed = cls.objects.filter(is_closed=True)
+        if periods is not None:
+            closed = closed.filter(period_code__in=[period for period in periods if period])
+        return set(closed.values_list('period_code', flat=True))
+
+    @classmethod
+    def last_closed_period(cls):
+        """
+        最后一个已结账期间，没有时返回 None
+        它及之前的期间都不能再写入：向更早的期间记账会顺延之后各期的期初余额，改动已结账期间的总分类账
+        """
+        return cls.objects.filter(is_closed=True).order_by('-period_code').values_list(
+            'period_code', flat=True
+        ).first()
+
+    @classmethod
+    def check_open(cls, *periods):
+        """期间中有已结账（或早于最后一个已结账期间）的期间时抛出 ValueError，拒绝写入凭证和分录"""
+        last_closed = cls.last_closed_period()
+        locked = sorted({period for period in periods if period and last_closed and period <= last_closed})
+        if locked:
+            raise ValueError(f'会计期间 {last_closed} 及之前的期间已结账，不能新增、修改或删除 '
+                             f'{"、".join(locked)} 期间的凭证')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录数据库中的结账状态，保存时据此判断是否需要冻结/清除科目余额快照
+        instance._db_is_closed = instance.__dict__.get('is_closed')
+        return instance
+
+    def save(self, *args, **kwargs):
+        was_closed = bool(getattr(self, '_db_is_closed', False))
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            # 结账时冻结本期科目余额快照，反结账时清除本期快照
+            if was_closed != self.is_closed:
+                from .reports import drop_account_balances, freeze_account_balances
+                if self.is_closed:
+                    freeze_account_balances(self.period_code)
+                else:
+                    drop_account_balances(self.period_code)
+
+        self._db_is_closed = self.is_closed
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # 删除已结账的期间时一并清除快照
+            if getattr(self, '_db_is_closed', False):
+                from .reports import drop_account_balances
+                drop_account_balances(self.period_code)
+            return super().delete(*args, **kwargs)
+
+
+class AccountBalanceSnapshot(models.Model):
+    """
+    科目余额快照
+    期间结账时冻结各科目的本期发生额（只统计参与报表的凭证状态），
+    已结账期间的报表直接读取快照，未结账期间实时汇总本期分录。
+    """
+    period = models.CharField(max_length=6, verbose_name="会计期间")
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, verbose_name="科目")
+
+    # 本期发生额
+    debit_total = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="本期借方")
+    credit_total = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="本期贷方")
+
+    # 本期余额（本期借贷发生额相抵后的净额）
+    closing_balance = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="本期余额")
+    closing_direction = models.CharField(
+        max_length=10,
+        choices=[('DEBIT', '借方'), ('CREDIT', '贷方')],
+        default='DEBIT',
+        verbose_name="余额方向"
+    )
+
+    create_time = models.DateTimeField(auto_now_add=True, verbose_name="冻结时间")
+
+    class Meta:
+        db_table = 'account_balance_snapshots'
+        verbose_name = "科目余额快照"
+        verbose_name_plural = "科目余额快照"
+        unique_together = [['period', 'account']]
+
+    def __str__(self):
+        return f"{self.period}-{self.account_id}"
+
+
+class ReportJob(models.Model):
+    """
+    报表生成任务
+    网页请求只负责登记任务，由 run_report_worker 进程池在后台执行；
+    同一报表、同一期间同时只保留一个排队中/执行中的任务。
+    """
+    REPORT_TYPE_CHOICES = [
+        ('BALANCE_SHEET', '资产负债表'),
+        ('INCOME_STATEMENT', '利润表'),
+    ]
+    STATUS_CHOICES = [
+        ('PENDING', '排队中'),
+        ('RUNNING', '执行中'),
+        ('SUCCESS', '已完成'),
+        ('FAILED', '失败'),
+    ]
+    # 尚未结束的状态
+    ACTIVE_STATUSES = ['PENDING', 'RUNNING']
+
+    report_type = models.CharField(max_length=20, choices=REPORT_TYPE_CHOICES, verbose_name="报表类型")
+    period = models.CharField(max_length=6, verbose_name="会计期间")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', verbose_name="状态")
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="进度")  # 0 ~ 100
+    message = models.CharField(max_length=500, blank=True, verbose_name="状态说明")
+
+    requested_by = models.ForeignKey(
+        'auth.User', on_delete=models.SET_NULL, null=True, blank=True, verbose_name="提交人"
+    )
+    create_time = models.DateTimeField(auto_now_add=True, verbose_name="提交时间")
+    start_time = models.DateTimeField(null=True, blank=True, verbose_name="开始时间")
+    finish_time = models.DateTimeField(null=True, blank=True, verbose_name="完成时间")
+
+    class Meta:
+        db_table = 'report_jobs'
+        verbose_name = "报表生成任务"
+        verbose_name_plural = "报表生成任务"
+        ordering = ['-create_time']
+        indexes = [
+            models.Index(fields=['status', 'create_time'], name='report_jobs_status_idx'),
+        ]
+        constraints = [
+            # 同一报表、同一期间只允许一个未结束的任务
+            models.UniqueConstraint(
+                fields=['report_type', 'period'],
+                condition=models.Q(status__in=['PENDING', 'RUNNING']),
+                name='report_jobs_active_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_report_type_display()} {self.period} - {self.get_status_display()}"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+    @classmethod
+    def enqueue(cls, report_type, period, user=None):
+        """
+        登记报表生成任务，返回 (任务, 是否新建)
+        已有同类未结束任务时直接返回该任务
+        """
+        active = cls.objects.filter(report_type=report_type, period=period, status__in=cls.ACTIVE_STATUSES)
+        job = active.first()
+        if job is not None:
+            return job, False
+
+        try:
+            with transaction.atomic():
+                return cls.objects.create(report_type=report_type, period=period, requested_by=user), True
+        except IntegrityError:
+            # 其他请求已抢先登记了同一任务
+            return active.get(), False
+
+    def claim(self):
+        """把排队中的任务标记为执行中，被其他进程抢先领取时返回 False"""
+        now = timezone.now()
+        claimed = ReportJob.objects.filter(pk=self.pk, status='PENDING').update(
+            status='RUNNING', start_time=now, progress=0, message='开始执行'
+        )
+        if claimed:
+            self.status, self.start_time, self.progress, self.message = 'RUNNING', now, 0, '开始执行'
+        return bool(claimed)
+
+    def update_progress(self, progress, message=''):
+        """更新执行进度（只写进度字段）"""
+        self.progress = progress
+        self.message = message
+        ReportJob.objects.filter(pk=self.pk).update(progress=progress, message=message)
+
+    def finish(self, status, message=''):
+        """结束任务（SUCCESS / FAILED）"""
+        self.status = status
+        self.message = message[:500]
+        self.finish_time = timezone.now()
+        if status == 'SUCCESS':
+            self.progress = 100
+        self.save(update_fields=['status', 'message', 'progress', 'finish_time'])
+
 
 class PurchaseOrder(models.Model):
     """采购订单"""
@@ -580,15 +996,11 @@ class PurchaseOrder(models.Model):
         # 自动生成订单编号（如果为空）
         if not self.order_number:
             today = timezone.now().strftime('%Y%m%d')
-            last_order = PurchaseOrder.objects.filter(
-                order_number__startswith=f'PO{today}'
-            ).order_by('-order_number').first()
-
-            if last_order:
-                last_num = int(last_order.order_number[10:])
-                self.order_number = f'PO{today}{last_num + 1:04d}'
-            else:
-                self.order_number = f'PO{today}0001'
+            new_num = NumberSequence.allocate(
+                'PO', today,
+                seed=lambda: last_serial_number(PurchaseOrder.objects.all(), 'order_number', f'PO{today}')
+            )
+            self.order_number = f'PO{today}{new_num:04d}'
 
         # 自动计算总额
         self.total_amount = self.quantity * self.unit_price
@@ -648,15 +1060,11 @@ class SalesOrder(models.Model):
         # 自动生成订单编号
         if not self.order_number:
             today = timezone.now().strftime('%Y%m%d')
-            last_order = SalesOrder.objects.filter(
-                order_number__startswith=f'SO{today}'
-            ).order_by('-order_number').first()
-
-            if last_order:
-                last_num = int(last_order.order_number[10:])
-                self.order_number = f'SO{today}{last_num + 1:04d}'
-            else:
-                self.order_number = f'SO{today}0001'
+            new_num = NumberSequence.allocate(
+                'SO', today,
+                seed=lambda: last_serial_number(SalesOrder.objects.all(), 'order_number', f'SO{today}')
+            )
+            self.order_number = f'SO{today}{new_num:04d}'
 
         # 自动计算总额
         self.total_amount = self.quantity * self.unit_price
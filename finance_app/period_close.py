@@ -0,0 +1,168 @@
+# finance_app/period_close.py
+"""
+期间结账 / 反结账
+结账在一个事务内完成：
+  1. 锁定期间：select_for_update 取得（没有时新建）ReportPeriod，之前还有未结账的期间时不允许结账；
+  2. 按分录批量重算本期总分类账：期初取上一期期末，本期发生额一条 GROUP BY 查询，
+     没有发生额但有余额的科目也写入一条记录，本期期末余额完整；
+  3. 结转之后各期的期初余额：下一期没有记录的科目新建一条（只有期初余额），已有记录按期间顺序顺延；
+  4. 标记已结账：ReportPeriod.save() 冻结科目余额快照，之后写入本期及之前期间的凭证和分录由模型拒绝。
+已结账期间的数据不再变化，报表读取快照即可，不需要重新计算。
+反结账只允许从最后一个已结账期间开始，清除快照后重新开放写入。
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .ledger import LEDGER_BALANCE_FIELDS, latest_ledgers_before, next_period, set_opening_balance, signed_balance
+from .models import Account, GeneralLedger, JournalEntry, ReportPeriod, Voucher
+from .reports import period_date_range
+
+logger = logging.getLogger(__name__)
+
+
+def lock_period(period):
+    """锁定期间记录（没有时按自然月新建），返回 ReportPeriod"""
+    start, end = period_date_range(period)
+    report_period, _ = ReportPeriod.objects.select_for_update().get_or_create(
+        period_code=period,
+        defaults={
+            'period_name': f'{start.year}年{start.month}月',
+            'start_date': start,
+            'end_date': end,
+        },
+    )
+    return report_period
+
+
+def close_ledger(period, directions):
+    """
+    批量重算本期总分类账并返回各科目带符号的期末余额 {科目代码: 余额}
+    期初余额取上一期期末余额，本期发生额由分录汇总（已审核/已过账凭证）
+    """
+    balances = {
+        account_id: signed_balance(ledger.ending_balance, ledger.ending_direction)
+        for account_id, ledger in latest_ledgers_before(period).items()
+    }
+
+    rows = JournalEntry.objects.filter(
+        voucher__period=period,
+        voucher__status__in=Voucher.LEDGER_STATUSES,
+    ).values('account_id').annotate(
+        debit_sum=Sum('amount', filter=Q(direction='DEBIT')),
+        credit_sum=Sum('amount', filter=Q(direction='CREDIT')),
+    ).order_by()
+    totals = {row['account_id']: (row['debit_sum'] or 0, row['credit_sum'] or 0) for row in rows}
+
+    ledgers = []
+    for account_id in set(balances) | set(totals):
+        debit, credit = totals.get(account_id, (0, 0))
+        opening = balances.get(account_id, 0)
+        if not (opening or debit or credit):
+            continue
+        ledger = GeneralLedger(period=period, account_id=account_id, debit_total=debit, credit_total=credit)
+        set_opening_balance(ledger, opening, directions[account_id])
+        balances[account_id] = signed_balance(ledger.ending_balance, ledger.ending_direction)
+        ledgers.append(ledger)
+
+    # 期初、发生额都为零的旧记录删除
+    GeneralLedger.objects.filter(period=period).exclude(
+        account_id__in=[ledger.account_id for ledger in ledgers]
+    ).delete()
+    GeneralLedger.objects.bulk_create(
+        ledgers,
+        update_conflicts=True,
+        unique_fields=['period', 'account'],
+        update_fields=LEDGER_BALANCE_FIELDS + ['update_time'],
+    )
+    return balances
+
+
+def roll_forward(period, balances, directions):
+    """
+    以本期期末余额为起点结转之后各期的期初余额
+    下一期没有总分类账记录、但本期有余额的科目新建一条记录；之后各期已有的记录按期间顺序顺延
+    返回 (新建条数, 期初余额有变化的条数)
+    """
+    following = next_period(period)
+    later_ledgers = list(GeneralLedger.objects.select_for_update().filter(period__gt=period).order_by('period'))
+
+    seeded_accounts = {ledger.account_id for ledger in later_ledgers if ledger.period == following}
+    seeded = []
+    for account_id, balance in balances.items():
+        if balance and account_id not in seeded_accounts:
+            ledger = GeneralLedger(period=following, account_id=account_id)
+            set_opening_balance(ledger, balance, directions[account_id])
+            seeded.append(ledger)
+    GeneralLedger.objects.bulk_create(seeded)
+
+    # 总分类账平时由凭证增量维护，通常已经一致，只写回期初余额实际变化的记录
+    carried = dict(balances)
+    changed = []
+    for ledger in later_ledgers:
+        previous = (ledger.opening_balance, ledger.opening_direction)
+        set_opening_balance(ledger, carried.get(ledger.account_id, 0), directions[ledger.account_id])
+        carried[ledger.account_id] = signed_balance(ledger.ending_balance, ledger.ending_direction)
+        if (ledger.opening_balance, ledger.opening_direction) != previous:
+            changed.append(ledger)
+    if changed:
+        GeneralLedger.objects.bulk_update(changed, LEDGER_BALANCE_FIELDS, batch_size=1000)
+    return len(seeded), len(changed)
+
+
+@transaction.atomic
+def close_period(period, user):
+    """
+    期间结账（一个事务）
+    已结账或之前还有未结账的期间时抛出 ValueError
+    返回结账后的 ReportPeriod
+    """
+    report_period = lock_period(period)
+    if report_period.is_closed:
+        raise ValueError(f'会计期间 {period} 已结账')
+
+    earlier = ReportPeriod.objects.filter(period_code__lt=period, is_closed=False).order_by('period_code')
+    first_open = earlier.values_list('period_code', flat=True).first()
+    if first_open:
+        raise ValueError(f'会计期间 {first_open} 尚未结账，请按期间顺序结账')
+
+    directions = dict(Account.objects.values_list('account_code', 'balance_direction'))
+    balances = close_ledger(period, directions)
+    seeded, adjusted = roll_forward(period, balances, directions)
+
+    report_period.is_closed = True
+    report_period.closed_by = user
+    report_period.closed_date = timezone.now()
+    report_period.save()  # 冻结科目余额快照
+
+    logger.info('会计期间 %s 已结账：%d 个科目有余额，结转下期新建 %d 条、顺延 %d 条总分类账',
+                period, sum(1 for balance in balances.values() if balance), seeded, adjusted)
+    return report_period
+
+
+@transaction.atomic
+def reopen_period(period, user):
+    """
+    反结账：只允许从最后一个已结账期间开始，清除本期快照并重新开放写入
+    未结账或之后还有已结账的期间时抛出 ValueError
+    """
+    period_date_range(period)  # 校验期间格式
+    report_period = ReportPeriod.objects.select_for_update().filter(period_code=period).first()
+    if report_period is None or not report_period.is_closed:
+        raise ValueError(f'会计期间 {period} 尚未结账')
+
+    last_closed = ReportPeriod.objects.filter(
+        period_code__gt=period, is_closed=True
+    ).order_by('-period_code').values_list('period_code', flat=True).first()
+    if last_closed:
+        raise ValueError(f'会计期间 {last_closed} 已结账，请先反结账之后的期间')
+
+    report_period.is_closed = False
+    report_period.closed_by = None
+    report_period.closed_date = None
+    report_period.save()  # 清除科目余额快照
+
+    logger.info('会计期间 %s 已反结账（操作人 %s）', period, user)
+    return report_period
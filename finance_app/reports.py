@@ -0,0 +1,464 @@
+# finance_app/reports.py
+"""
+财务报表计算引擎
+所有报表都基于同一个按科目分组的聚合查询（JournalEntry JOIN Account），
+再在内存中按科目编码映射到报表项目，避免逐张凭证、逐条分录地查询数据库。
+
+报表统计已提交的凭证（REPORT_VOUCHER_STATUSES），各项目按所选期间的发生额计算；
+总分类账、试算平衡表和期间结账统计的是已审核/已过账的凭证（Voucher.LEDGER_STATUSES），两者互不影响。
+
+科目余额快照：期间结账时冻结各科目的本期发生额（AccountBalanceSnapshot）。
+  - 已结账期间的报表直接读取快照，一条查询，耗时只与科目数有关；
+  - 未结账期间的报表只汇总本期分录。
+
+日志：每张报表生成后输出一条 INFO 汇总记录（含 load / aggregate / classify / persist 各阶段耗时），
+逐科目的明细只在 finance_app.reports 开启 DEBUG 级别时输出。
+"""
+import calendar
+import logging
+import time
+from contextlib import contextmanager
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from .account_tree import get_account_tree
+from .ledger import split_balance
+from .models import AccountBalanceSnapshot, JournalEntry, BalanceSheet, IncomeStatement
+
+# 参与报表计算的凭证状态
+REPORT_VOUCHER_STATUSES = ['SUBMITTED']
+
+# 报表金额来源
+SOURCE_SNAPSHOT = 'snapshot'
+SOURCE_ENTRIES = 'entries'
+
+# 流动资产 / 流动负债科目
+CURRENT_ASSET_CODES = ['1001', '1002', '1121', '1122', '1221', '1231', '1406']
+CURRENT_LIABILITY_CODES = ['2001', '2002', '2201', '2202', '2221', '2231']
+
+# 利润表项目规则：(科目编码前缀, 利润表字段, 正常余额方向)
+# 正常余额方向为贷方的项目按「贷方 - 借方」计入，借方的按「借方 - 贷方」计入
+INCOME_STATEMENT_RULES = [
+    ('6001', 'operating_revenue', 'CREDIT'),  # 主营业务收入
+    ('6002', 'operating_revenue', 'CREDIT'),
+    ('6051', 'operating_revenue', 'CREDIT'),  # 其他业务收入
+    ('6401', 'operating_cost', 'DEBIT'),  # 主营业务成本
+    ('6402', 'operating_cost', 'DEBIT'),  # 其他业务成本
+    ('6601', 'selling_expenses', 'DEBIT'),  # 销售费用
+    ('6602', 'admin_expenses', 'DEBIT'),  # 管理费用
+    ('6603', 'financial_expenses', 'DEBIT'),  # 财务费用
+]
+
+# 利润表中不允许为负数的项目
+INCOME_STATEMENT_NON_NEGATIVE = [
+    'operating_revenue', 'operating_cost', 'selling_expenses', 'admin_expenses', 'financial_expenses',
+]
+
+INCOME_STATEMENT_FIELDS = [
+    'operating_revenue', 'other_revenue', 'operating_cost',
+    'selling_expenses', 'admin_expenses', 'financial_expenses',
+    'other_income', 'other_expenses', 'tax_expense',
+]
+
+
+class AccountCodeRules:
+    """
+    科目编码前缀规则表
+    规则在初始化时按前缀长度编译成字典，匹配时从最长前缀开始查找，
+    每个科目只需 O(前缀长度种类数) 次字典查找。
+    """
+
+    def __init__(self, rules):
+        self._rules = {prefix: (item, direction) for prefix, item, direction in rules}
+        self._prefix_lengths = sorted({len(prefix) for prefix in self._rules}, reverse=True)
+
+    def match(self, account_code):
+        """返回 (报表项目, 正常余额方向)，没有匹配的规则时返回 None"""
+        for length in self._prefix_lengths:
+            rule = self._rules.get(account_code[:length])
+            if rule is not None:
+                return rule
+        return None
+
+
+income_statement_rules = AccountCodeRules(INCOME_STATEMENT_RULES)
+
+logger = logging.getLogger(__name__)
+
+
+class PhaseTimer:
+    """
+    分阶段计时
+    with timer.phase('load'): ...  同名阶段的耗时累加，as_dict() 返回 {阶段: 毫秒}
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - started
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {name: round(seconds * 1000, 2) for name, seconds in self.phases.items()}
+
+    def __str__(self):
+        return ' '.join(f'{name}={seconds * 1000:.1f}ms' for name, seconds in self.phases.items())
+
+
+def period_date_range(period):
+    """会计期间（如202401）转换为起止日期"""
+    if not period or len(period) != 6 or not period.isdigit():
+        raise ValueError(f'无效的会计期间：{period}')
+
+    year, month = int(period[:4]), int(period[4:])
+    if not 1 <= month <= 12:
+        raise ValueError(f'无效的会计期间：{period}')
+
+    last_day = calendar.monthrange(year, month)[1]
+    return date(year, month, 1), date(year, month, last_day)
+
+
+def aggregate_account_totals(period, statuses=REPORT_VOUCHER_STATUSES, timer=None):
+    """
+    按科目汇总期间内的借贷发生额（一条 GROUP BY 查询）
+    statuses: 参与汇总的凭证状态，None 表示不限状态
+    timer: 可选的 PhaseTimer，记录 load（执行查询）和 aggregate（整理结果）两个阶段
+    返回 {科目代码: {'name': 科目名称, 'type': 科目类型, 'root': 所属一级科目代码, 'debit': 借方合计, 'credit': 贷方合计}}
+    """
+    period_date_range(period)  # 校验期间格式
+    timer = timer or PhaseTimer()
+
+    if statuses is None:
+        # 不限状态：只读分录表的 (period, account, direction, amount) 索引，不关联凭证表
+        entries = JournalEntry.objects.filter(period=period)
+    else:
+        # 按状态筛选：从凭证表的 (status, period) 索引出发，再按凭证取分录
+        entries = JournalEntry.objects.filter(voucher__period=period, voucher__status__in=statuses)
+
+    rows = entries.values(
+        'account_id', 'account__account_name', 'account__account_type'
+    ).annotate(
+        debit_sum=Sum('amount', filter=Q(direction='DEBIT')),
+        credit_sum=Sum('amount', filter=Q(direction='CREDIT')),
+    ).order_by()
+
+    with timer.phase('load'):
+        rows = list(rows)
+
+    with timer.phase('aggregate'):
+        tree = get_account_tree()
+        account_totals = {}
+        for row in rows:
+            account_totals[row['account_id']] = {
+                'name': row['account__account_name'],
+                'type': row['account__account_type'],
+                'root': tree.root_code(row['account_id']),
+                'debit': row['debit_sum'] or 0,
+                'credit': row['credit_sum'] or 0,
+            }
+    return account_totals
+
+
+def snapshot_account_totals(period, timer=None):
+    """
+    从科目余额快照读取指定期间的本期发生额（一条查询，耗时只与科目数有关）
+    返回格式同 aggregate_account_totals；期间没有快照（未结账）时返回空字典
+    """
+    timer = timer or PhaseTimer()
+    rows = AccountBalanceSnapshot.objects.filter(period=period).values(
+        'account_id', 'account__account_name', 'account__account_type', 'debit_total', 'credit_total',
+    ).order_by()
+
+    with timer.phase('load'):
+        rows = list(rows)
+
+    with timer.phase('aggregate'):
+        tree = get_account_tree()
+        account_totals = {}
+        for row in rows:
+            account_totals[row['account_id']] = {
+                'name': row['account__account_name'],
+                'type': row['account__account_type'],
+                'root': tree.root_code(row['account_id']),
+                'debit': row['debit_total'],
+                'credit': row['credit_total'],
+            }
+    return account_totals
+
+
+@transaction.atomic
+def freeze_account_balances(period):
+    """
+    冻结指定期间的科目余额快照（期间结账时调用，已有快照时重新冻结）
+    按报表口径（REPORT_VOUCHER_STATUSES）汇总本期发生额，余额为本期借贷相抵后的净额
+    返回写入的快照条数
+    """
+    account_totals = aggregate_account_totals(period)
+    tree = get_account_tree()
+
+    snapshots = []
+    for account_id, data in account_totals.items():
+        node = tree.get(account_id)
+        balance, direction = split_balance(
+            data['debit'] - data['credit'], node.balance_direction if node else 'DEBIT',
+        )
+        snapshots.append(AccountBalanceSnapshot(
+            period=period,
+            account_id=account_id,
+            debit_total=data['debit'],
+            credit_total=data['credit'],
+            closing_balance=balance,
+            closing_direction=direction,
+        ))
+
+    AccountBalanceSnapshot.objects.filter(period=period).delete()
+    AccountBalanceSnapshot.objects.bulk_create(snapshots)
+    logger.info('期间 %s 科目余额快照已冻结：%d 个科目', period, len(snapshots))
+    return len(snapshots)
+
+
+def drop_account_balances(period):
+    """清除指定期间的科目余额快照（反结账时调用），该期间的报表改为实时汇总，重新结账时再冻结"""
+    deleted, _ = AccountBalanceSnapshot.objects.filter(period=period).delete()
+    if deleted:
+        logger.info('期间 %s 的科目余额快照已清除：%d 条', period, deleted)
+    return deleted
+
+
+def build_balance_sheet_fields(account_totals):
+    """根据科目汇总结果计算资产负债表各项目金额"""
+    current_assets = 0  # 流动资产
+    fixed_assets = 0  # 固定资产
+    intangible_assets = 0  # 无形资产
+    other_assets = 0  # 其他资产
+
+    current_liabilities = 0  # 流动负债
+    long_term_liabilities = 0  # 长期负债
+
+    paid_in_capital = 0  # 实收资本
+    retained_earnings = 0  # 留存收益
+    current_profit = 0  # 本年利润
+
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for code, data in account_totals.items():
+        # 明细科目按所属一级科目的编码归类
+        account_code = data.get('root', code)
+        account_type = data['type']
+        debit_total = data['debit']
+        credit_total = data['credit']
+        if debug:
+            logger.debug('资产负债表科目 %s %s（%s）：借 %s 贷 %s',
+                         code, data['name'], account_type, debit_total, credit_total)
+
+        if account_type == 'ASSET':
+            # 资产类：借方 - 贷方
+            balance = debit_total - credit_total
+
+            if account_code in CURRENT_ASSET_CODES:
+                current_assets += balance
+            elif account_code.startswith('15') or account_code.startswith('16'):
+                fixed_assets += balance
+            elif account_code.startswith('17') or account_code.startswith('18'):
+                intangible_assets += balance
+            else:
+                other_assets += balance
+
+        elif account_type == 'LIABILITY':
+            # 负债类：贷方 - 借方
+            balance = credit_total - debit_total
+
+            if account_code in CURRENT_LIABILITY_CODES:
+                current_liabilities += balance
+            else:
+                long_term_liabilities += balance
+
+        elif account_type == 'EQUITY':
+            # 权益类：贷方 - 借方
+            balance = credit_total - debit_total
+
+            if account_code.startswith('30') or account_code.startswith('31'):
+                paid_in_capital += balance
+            elif account_code.startswith('32') or account_code == '3301':
+                retained_earnings += balance
+            elif account_code == '3131':
+                current_profit += balance
+
+        elif account_type == 'PROFIT':
+            # 损益类科目净额计入本年利润
+            if account_code.startswith('6'):  # 收入类：贷方 - 借方
+                current_profit += credit_total - debit_total
+            else:  # 费用类：借方 - 贷方
+                net_expense = debit_total - credit_total
+                if net_expense > 0:
+                    current_profit -= net_expense
+
+    # 如果差额很小，自动调整（会计中的四舍五入误差）
+    total_assets = current_assets + fixed_assets + intangible_assets + other_assets
+    total_liabilities = current_liabilities + long_term_liabilities
+    total_equity = paid_in_capital + retained_earnings + current_profit
+    balance_diff = total_assets - (total_liabilities + total_equity)
+    if 0.01 <= abs(balance_diff) < 10:
+        if balance_diff > 0:
+            other_assets += balance_diff
+        else:
+            other_assets -= balance_diff
+
+    # 确保所有值为非负
+    return {
+        'current_assets': max(current_assets, 0),
+        'fixed_assets': max(fixed_assets, 0),
+        'intangible_assets': max(intangible_assets, 0),
+        'other_assets': max(other_assets, 0),
+        'current_liabilities': max(current_liabilities, 0),
+        'long_term_liabilities': max(long_term_liabilities, 0),
+        'paid_in_capital': max(paid_in_capital, 0),
+        'retained_earnings': max(retained_earnings, 0),
+        'current_profit': max(current_profit, 0),
+    }
+
+
+def log_report_summary(report_type, period, timer, account_count, totals=None, source=SOURCE_ENTRIES):
+    """
+    每张报表输出一条汇总日志
+    extra 中附带结构化字段（report_type / period / source / accounts / phases_ms / totals），供 JSON 等格式的日志处理器使用
+    """
+    logger.info(
+        '%s %s 生成%s：%d 个科目（%s），耗时 %.1fms（%s）',
+        report_type, period, '完成' if totals is not None else '跳过（没有凭证）',
+        account_count, source, timer.elapsed * 1000, timer,
+        extra={
+            'report_type': report_type,
+            'period': period,
+            'source': source,
+            'accounts': account_count,
+            'phases_ms': timer.as_dict(),
+            'totals': {key: str(value) for key, value in (totals or {}).items()},
+        },
+    )
+
+
+def report_progress(progress, percent, message):
+    """调用进度回调（没有回调时忽略）"""
+    if progress is not None:
+        progress(percent, message)
+
+
+def generate_balance_sheet(period, user, progress=None):
+    """
+    生成（或重新生成）指定期间的资产负债表
+    期间内没有凭证时返回 None
+    progress: 可选的进度回调 progress(百分比, 说明)
+    """
+    timer = PhaseTimer()
+    report_progress(progress, 10, '汇总科目发生额')
+    # 已结账期间直接读取快照中的本期发生额
+    source = SOURCE_SNAPSHOT
+    account_totals = snapshot_account_totals(period, timer=timer)
+    if not account_totals:
+        source = SOURCE_ENTRIES
+        account_totals = aggregate_account_totals(period, timer=timer)
+    if not account_totals:
+        log_report_summary('BALANCE_SHEET', period, timer, 0, source=source)
+        return None
+
+    report_progress(progress, 70, '计算报表项目')
+    with timer.phase('classify'):
+        fields = build_balance_sheet_fields(account_totals)
+
+    report_progress(progress, 90, '保存报表')
+    with timer.phase('persist'):
+        BalanceSheet.objects.filter(period=period).delete()
+        sheet = BalanceSheet.objects.create(
+            period=period,
+            generated_by=user,
+            **fields
+        )
+
+    log_report_summary('BALANCE_SHEET', period, timer, len(account_totals), {
+        'total_assets': sheet.total_assets,
+        'total_liabilities': sheet.total_liabilities,
+        'total_equity': sheet.total_equity,
+        'is_balanced': sheet.is_balanced,
+    }, source=source)
+    return sheet
+
+
+def build_income_statement_fields(account_totals, rules=income_statement_rules):
+    """根据科目汇总结果和编码规则计算利润表各项目金额"""
+    fields = dict.fromkeys(INCOME_STATEMENT_FIELDS, 0)
+
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for account_code, data in account_totals.items():
+        # 只处理损益类科目
+        if data['type'] != 'PROFIT':
+            continue
+
+        rule = rules.match(account_code)
+        if rule is None:
+            continue
+
+        item, direction = rule
+        if debug:
+            logger.debug('利润表科目 %s %s -> %s：借 %s 贷 %s',
+                         account_code, data['name'], item, data['debit'], data['credit'])
+        if direction == 'CREDIT':
+            fields[item] += data['credit'] - data['debit']
+        else:
+            fields[item] += data['debit'] - data['credit']
+
+    # 确保非负值
+    for item in INCOME_STATEMENT_NON_NEGATIVE:
+        fields[item] = max(fields[item], 0)
+
+    return fields
+
+
+def generate_income_statement(period, user, progress=None):
+    """
+    生成（或重新生成）指定期间的利润表
+    期间内没有凭证时返回 None
+    progress: 可选的进度回调 progress(百分比, 说明)
+    """
+    timer = PhaseTimer()
+    report_progress(progress, 10, '汇总科目发生额')
+    # 已结账期间直接读取快照中的本期发生额
+    source = SOURCE_SNAPSHOT
+    account_totals = snapshot_account_totals(period, timer=timer)
+    if not account_totals:
+        source = SOURCE_ENTRIES
+        account_totals = aggregate_account_totals(period, timer=timer)
+    if not account_totals:
+        log_report_summary('INCOME_STATEMENT', period, timer, 0, source=source)
+        return None
+
+    report_progress(progress, 70, '计算报表项目')
+    with timer.phase('classify'):
+        fields = build_income_statement_fields(account_totals)
+
+    report_progress(progress, 90, '保存报表')
+    with timer.phase('persist'):
+        IncomeStatement.objects.filter(period=period).delete()
+        statement = IncomeStatement.objects.create(
+            period=period,
+            generated_by=user,
+            **fields
+        )
+
+    log_report_summary('INCOME_STATEMENT', period, timer, len(account_totals), {
+        'total_revenue': statement.total_revenue,
+        'total_cost_expense': statement.total_cost_expense,
+        'net_profit': statement.net_profit,
+    }, source=source)
+    return statement
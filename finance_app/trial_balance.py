@@ -0,0 +1,155 @@
+# finance_app/trial_balance.py
+"""
+试算平衡表
+任意期间范围内各科目的期初余额、本期借贷发生额和期末余额：
+  - 范围内的期间全部已结账时，直接读取总分类账：一条分组查询汇总本期发生额，
+    一条查询取起始期间之前最近一期的期末余额作为期初余额；
+    结账时按分录重算了总分类账，已结账期间的总分类账一定完整，未结账期间则不能保证
+    （例如凭证由脚本直接写入、尚未执行 rebuild_ledger）；
+  - 否则使用分录表上的一条分组聚合查询，用条件求和同时算出期初余额和本期发生额。
+也可以通过 source 参数明确指定数据来源。
+两种方式都只统计已审核/已过账凭证，查询次数固定，耗时取决于科目数而不是分录行数。
+明细科目金额通过科目树（account_tree）逐级汇总到上级科目，合计行只累加一级科目。
+"""
+from decimal import Decimal
+
+from django.db.models import Case, F, Q, Sum, When
+
+from .account_tree import get_account_tree
+from .ledger import latest_ledgers_before, period_range, signed_balance
+from .models import GeneralLedger, JournalEntry, ReportPeriod, Voucher
+
+SOURCE_LEDGER = 'ledger'
+SOURCE_ENTRIES = 'entries'
+SOURCES = (SOURCE_LEDGER, SOURCE_ENTRIES)
+
+AMOUNT_FIELDS = ('opening', 'debit', 'credit')
+
+CENT = Decimal('0.01')
+
+TOTAL_FIELDS = ['opening_debit', 'opening_credit', 'debit', 'credit', 'closing_debit', 'closing_credit']
+
+
+def to_amount(value):
+    """聚合结果转换为两位小数的金额（SQLite 的 SUM 可能带有浮点误差）"""
+    return Decimal(value or 0).quantize(CENT)
+
+
+def ledger_available(start, end):
+    """起止期间（含两端）是否全部已结账，即总分类账覆盖了整个范围"""
+    periods = period_range(start, end)
+    return len(ReportPeriod.closed_periods(periods)) == len(periods)
+
+
+def totals_from_ledger(start, end):
+    """
+    从总分类账读取各科目金额（两条查询）
+    返回 {科目代码: {'opening': 带符号期初余额, 'debit': 本期借方, 'credit': 本期贷方}}
+    """
+    totals = {}
+    for account_id, ledger in latest_ledgers_before(start).items():
+        totals[account_id] = {
+            'opening': signed_balance(ledger.ending_balance, ledger.ending_direction),
+            'debit': Decimal(0),
+            'credit': Decimal(0),
+        }
+
+    rows = GeneralLedger.objects.filter(period__gte=start, period__lte=end).values('account_id').annotate(
+        debit=Sum('debit_total'),
+        credit=Sum('credit_total'),
+    ).order_by()
+    for row in rows:
+        values = totals.setdefault(row['account_id'], {'opening': Decimal(0)})
+        values['debit'] = to_amount(row['debit'])
+        values['credit'] = to_amount(row['credit'])
+    return totals
+
+
+def totals_from_entries(start, end):
+    """从分录表聚合各科目金额（一条分组查询），返回格式同 totals_from_ledger"""
+    signed_amount = Case(
+        When(direction='DEBIT', then=F('amount')),
+        default=-F('amount'),
+    )
+    rows = JournalEntry.objects.filter(
+        voucher__period__lte=end,
+        voucher__status__in=Voucher.LEDGER_STATUSES,
+    ).values('account_id').annotate(
+        opening=Sum(signed_amount, filter=Q(voucher__period__lt=start)),
+        debit=Sum('amount', filter=Q(voucher__period__gte=start, direction='DEBIT')),
+        credit=Sum('amount', filter=Q(voucher__period__gte=start, direction='CREDIT')),
+    ).order_by()
+
+    return {
+        row['account_id']: {
+            'opening': to_amount(row['opening']),
+            'debit': to_amount(row['debit']),
+            'credit': to_amount(row['credit']),
+        }
+        for row in rows
+    }
+
+
+def split_sides(value):
+    """带符号余额拆分为 (借方余额, 贷方余额)"""
+    return (value, Decimal(0)) if value >= 0 else (Decimal(0), -value)
+
+
+def build_trial_balance(start, end, level=None, source=None):
+    """
+    计算起止期间（含两端）的试算平衡表
+    level: 显示到第几级科目，None 表示全部级次
+    source: SOURCE_LEDGER / SOURCE_ENTRIES，None 表示范围内的期间全部已结账时用总分类账，否则用分录表
+    返回 {'rows': [...], 'totals': {...}, 'is_balanced': bool, 'source': 数据来源}
+    每行：科目代码、名称、级次、期初借/贷、本期借/贷、期末借/贷
+    """
+    if source is None:
+        source = SOURCE_LEDGER if ledger_available(start, end) else SOURCE_ENTRIES
+    totals = totals_from_ledger(start, end) if source == SOURCE_LEDGER else totals_from_entries(start, end)
+
+    tree = get_account_tree()
+    rolled = tree.rollup(totals, fields=AMOUNT_FIELDS)
+
+    rows = []
+    summary = dict.fromkeys(TOTAL_FIELDS, Decimal(0))
+    codes = [node.code for node in tree.ordered if node.code in rolled]
+    codes += sorted(code for code in rolled if code not in tree)  # 不在科目树中的科目（理论上不会出现）
+    for code in codes:
+        values = rolled[code]
+        if not any(values.values()):
+            continue
+        node = tree.get(code)
+        depth = node.depth if node is not None else 1
+        if level is not None and depth > level:
+            continue
+
+        opening_debit, opening_credit = split_sides(values['opening'])
+        closing_debit, closing_credit = split_sides(values['opening'] + values['debit'] - values['credit'])
+        row = {
+            'account_code': code,
+            'account_name': node.name if node is not None else '',
+            'depth': depth,
+            'opening_debit': opening_debit,
+            'opening_credit': opening_credit,
+            'debit': values['debit'],
+            'credit': values['credit'],
+            'closing_debit': closing_debit,
+            'closing_credit': closing_credit,
+        }
+        rows.append(row)
+
+        # 合计只累加一级科目，避免上下级重复计算
+        if depth == 1:
+            for field in TOTAL_FIELDS:
+                summary[field] += row[field]
+
+    return {
+        'rows': rows,
+        'totals': summary,
+        'is_balanced': (
+            summary['opening_debit'] == summary['opening_credit']
+            and summary['debit'] == summary['credit']
+            and summary['closing_debit'] == summary['closing_credit']
+        ),
+        'source': source,
+    }
@@ -5,6 +5,19 @@ from . import views
 
 app_name = 'finance_app'
 
+# 路由权限：URL 前缀（相对本模块挂载位置）-> 所需会计权限，与各视图的 check_finance_permission 保持一致。
+# 由 users_app.utils.RolePermissionMiddleware 在启动时收集并编译，未登录或无权限的请求在进入视图前拦截。
+ROUTE_PERMISSIONS = [
+    ('vouchers/', 'voucher'),
+    ('api/', 'voucher'),
+    ('reports/', 'voucher'),
+    ('exports/', 'voucher'),
+    ('purchase-orders/', 'voucher'),
+    ('sales-orders/', 'voucher'),
+    ('suppliers/', 'supplier'),
+    ('customers/', 'customer'),
+]
+
 urlpatterns = [
     # 添加finance根路径，重定向到凭证列表
     path('', views.voucher_list, name='finance_home'),
@@ -32,6 +45,7 @@ urlpatterns = [
     # AJAX接口保持不变
     path('api/account/<str:account_code>/', views.get_account_info, name='get_account_info'),
     path('api/check-balance/', views.check_voucher_balance, name='check_balance'),
+    path('api/vouchers/import/', views.voucher_import, name='voucher_import'),
 
     path('reports/', views.report_home, name='report_home'),
     path('reports/balance-sheet/', views.balance_sheet_list, name='balance_sheet_list'),
@@ -46,11 +60,23 @@ urlpatterns = [
     path('reports/income-statement/<str:period>/export/', views.export_income_statement,
          name='export_income_statement'),
 
+    # 明细数据导出
+    path('exports/vouchers/', views.export_voucher_journal, name='export_voucher_journal'),
+    path('exports/general-ledger/', views.export_general_ledger, name='export_general_ledger'),
+    path('exports/accounts/<str:account_code>/', views.export_account_ledger, name='export_account_ledger'),
+    path('exports/trial-balance/', views.export_trial_balance, name='export_trial_balance'),
+
     # API接口
     path('api/balance-sheet/<str:period>/chart/', views.api_balance_sheet_chart, name='api_balance_sheet_chart'),
     path('api/income-statement/<str:period>/chart/', views.api_income_statement_chart,
          name='api_income_statement_chart'),
 
+    path('reports/trial-balance/', views.trial_balance, name='trial_balance'),
+    path('reports/accounts/<str:account_code>/ledger/', views.account_ledger, name='account_ledger'),
+    path('reports/periods/<str:period>/close/', views.period_close, name='period_close'),
+    path('reports/periods/<str:period>/reopen/', views.period_reopen, name='period_reopen'),
+
+    path('reports/jobs/<int:job_id>/', views.report_job_status, name='report_job_status'),
     path('reports/generate-direct/', views.generate_report_direct, name='generate_report_direct'),
 
     # 采购订单
@@ -1,19 +1,22 @@
 # finance_app/views.py
+import logging
 from decimal import Decimal, InvalidOperation
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction
 from django.http import JsonResponse
 from django.forms import formset_factory
 from .models import Voucher, JournalEntry, Account, Customer, Supplier,BalanceSheet,IncomeStatement
-from .forms import VoucherForm, JournalEntryForm, SupplierForm, CustomerForm
+from .forms import VoucherForm, JournalEntryForm, BaseJournalEntryFormSet, SupplierForm, CustomerForm
 import io
 import json
 from django.http import HttpResponse, JsonResponse
 from django.db.models import Sum, Q
 from decimal import Decimal
 from datetime import datetime
+from urllib.parse import urlencode
 import xlsxwriter
 from django.http import HttpResponse
 from .models import (
@@ -21,8 +24,21 @@ from .models import (
     GeneralLedger, BalanceSheet, IncomeStatement,  # 添加这3个
     Customer, Supplier  # 如果还需要的话
 )
-from .models import PurchaseOrder, SalesOrder
+from .models import PurchaseOrder, SalesOrder, ReportJob, ReportPeriod
+from .reports import period_date_range
+from .trial_balance import SOURCES as TRIAL_BALANCE_SOURCES, build_trial_balance
+from .account_ledger import LEDGER_PAGE_SIZE, account_ledger_page
+from .period_close import close_period, reopen_period
+from . import exports
+from .jobs import submit_report_job
+from .importers import IMPORT_BATCH_SIZE, IMPORT_FORMATS, VoucherImporter, detect_format, read_rows
 from django.utils import timezone
+from users_app.permissions import (
+    SUPERUSER_NAME, get_permission_name, get_user_permissions, get_user_role, user_has_role,
+)
+from users_app.utils import record_operation_log
+
+logger = logging.getLogger(__name__)
 
 
 # 添加权限检查装饰器
@@ -40,64 +56,153 @@ def check_finance_permission(permission_type):
             if not request.user.is_authenticated:
                 return redirect('users:login')
 
-            # admin用户有所有权限
-            if request.user.username == 'admin':
-                return view_func(request, *args, **kwargs)
-
-            # 检查用户是否有profile和角色
-            if not hasattr(request.user, 'profile'):
+            # 检查用户是否有profile和角色（admin用户除外）
+            if request.user.username != SUPERUSER_NAME and get_user_role(request.user)[0] is None:
                 messages.error(request, '用户信息不完整，请联系管理员')
                 return redirect('users:home')
 
-            role_code = request.user.profile.role.role_code
-
-            # 定义角色权限
-            role_permissions = {
-                'ADMIN': ['voucher', 'supplier', 'customer'],  # 管理员有所有权限
-                'GENERAL_ACCOUNTANT': ['voucher'],  # 总账会计只有凭证权限
-                'PURCHASE_ACCOUNTANT': ['voucher', 'supplier'],  # 采购会计有凭证和供应商权限
-                'SALES_ACCOUNTANT': ['voucher', 'customer'],  # 销售会计有凭证和客户权限
-                'ACCOUNTANT_SUPERVISOR': ['voucher', 'supplier', 'customer'],  # 会计主管有所有权限
-                'CASHIER': ['voucher'],  # 出纳只有凭证权限
-                'EMPLOYEE': [],  # 普通员工没有会计权限
-                'HR_STAFF': [],  # 人事没有会计权限
-            }
-
-            # 检查权限
-            if role_code in role_permissions:
-                if permission_type in role_permissions[role_code]:
-                    return view_func(request, *args, **kwargs)
-                else:
-                    messages.error(request, f'您没有{get_permission_name(permission_type)}权限')
-                    return redirect('users:home')
-            else:
+            # 检查权限（权限集合在同一请求内只解析一次）
+            permissions = get_user_permissions(request.user)
+            if permissions is None:
                 messages.error(request, '角色权限未配置，请联系管理员')
                 return redirect('users:home')
+            if permission_type in permissions:
+                return view_func(request, *args, **kwargs)
+
+            messages.error(request, f'您没有{get_permission_name(permission_type)}权限')
+            return redirect('users:home')
 
         return _wrapped_view
 
     return decorator
 
 
-def get_permission_name(permission_type):
-    """获取权限名称"""
-    permission_names = {
-        'voucher': '凭证管理',
-        'supplier': '供应商管理',
-        'customer': '客户管理',
-    }
-    return permission_names.get(permission_type, '该功能')
+# 凭证列表每页条数
+VOUCHER_PAGE_SIZE = 50
+
+
+def parse_amount(value):
+    """解析金额筛选条件，无效时返回 None"""
+    try:
+        return Decimal(value) if value else None
+    except InvalidOperation:
+        return None
+
+
+# 分录中由表单维护的字段
+JOURNAL_ENTRY_FORM_FIELDS = ['account', 'direction', 'amount', 'description', 'customer', 'supplier']
+
+
+def collect_entries(entry_formset):
+    """
+    从已校验的分录表单集中取出分录（未保存）并计算借贷合计
+    返回 (分录列表, 借方合计, 贷方合计)
+    """
+    entries = []
+    total_debit = 0
+    total_credit = 0
+    for form in entry_formset:
+        if form.cleaned_data and not form.cleaned_data.get('DELETE', False):
+            entry = form.save(commit=False)
+            if entry.direction == 'DEBIT':
+                total_debit += entry.amount
+            else:
+                total_credit += entry.amount
+            entries.append(entry)
+    return entries, total_debit, total_credit
+
+
+def sync_voucher_entries(voucher, entries):
+    """
+    按顺序把新分录与凭证原有分录逐行对比：
+    有变化的行批量更新，多出的行批量插入，不再存在的行一次删除
+    已审核/已过账的凭证不能替换分录（批量写入不会更新总分类账）
+    """
+    if voucher.status in Voucher.LEDGER_STATUSES:
+        raise ValueError(f'凭证 {voucher.voucher_id} 已审核/已过账，不能修改分录')
+    existing = list(voucher.entries.order_by('id'))
+
+    to_update = []
+    to_create = []
+    for index, entry in enumerate(entries):
+        if index < len(existing):
+            current = existing[index]
+            changed = False
+            for field in JOURNAL_ENTRY_FORM_FIELDS:
+                attname = JournalEntry._meta.get_field(field).attname
+                value = getattr(entry, attname)
+                if getattr(current, attname) != value:
+                    setattr(current, attname, value)
+                    changed = True
+            if changed:
+                to_update.append(current)
+        else:
+            entry.voucher = voucher
+            to_create.append(entry)
+
+    removed = [entry.id for entry in existing[len(entries):]]
+    if removed:
+        JournalEntry.objects.filter(id__in=removed).delete()
+    if to_update:
+        JournalEntry.objects.bulk_update(to_update, JOURNAL_ENTRY_FORM_FIELDS)
+    if to_create:
+        JournalEntry.objects.bulk_create(to_create)
 
 
 # 凭证相关视图 - 会计和admin都可以访问
 @login_required
 @check_finance_permission('voucher')
 def voucher_list(request):
-    """凭证列表"""
-    vouchers = Voucher.objects.all().order_by('-voucher_date', '-create_time')
+    """凭证列表（按 凭证日期+凭证编号 游标分页）"""
+    vouchers = Voucher.objects.select_related('created_by', 'audited_by').order_by('-voucher_date', '-voucher_id')
+
+    # 服务端筛选
+    filters = {
+        key: request.GET.get(key, '').strip()
+        for key in ('status', 'period', 'min_amount', 'max_amount', 'created_by')
+    }
+    if filters['status']:
+        vouchers = vouchers.filter(status=filters['status'])
+    if filters['period']:
+        vouchers = vouchers.filter(period=filters['period'])
+    min_amount = parse_amount(filters['min_amount'])
+    if min_amount is not None:
+        vouchers = vouchers.filter(total_debit__gte=min_amount)
+    max_amount = parse_amount(filters['max_amount'])
+    if max_amount is not None:
+        vouchers = vouchers.filter(total_debit__lte=max_amount)
+    if filters['created_by']:
+        vouchers = vouchers.filter(created_by__username=filters['created_by'])
+
+    # 游标：上一页最后一条凭证的「日期|编号」
+    cursor = request.GET.get('after', '')
+    if cursor:
+        try:
+            cursor_date, cursor_id = cursor.split('|', 1)
+            cursor_date = datetime.strptime(cursor_date, '%Y-%m-%d').date()
+        except ValueError:
+            messages.error(request, '分页参数无效')
+            return redirect('finance_app:voucher_list')
+        vouchers = vouchers.filter(
+            Q(voucher_date__lt=cursor_date) | Q(voucher_date=cursor_date, voucher_id__lt=cursor_id)
+        )
+
+    # 多取一条用于判断是否还有下一页
+    page = list(vouchers[:VOUCHER_PAGE_SIZE + 1])
+    next_cursor = ''
+    if len(page) > VOUCHER_PAGE_SIZE:
+        page = page[:VOUCHER_PAGE_SIZE]
+        last = page[-1]
+        next_cursor = f"{last.voucher_date:%Y-%m-%d}|{last.voucher_id}"
+
     context = {
-        'vouchers': vouchers,
-        'title': '会计凭证列表'
+        'vouchers': page,
+        'title': '会计凭证列表',
+        'filters': filters,
+        'filter_query': urlencode({key: value for key, value in filters.items() if value}),
+        'status_choices': Voucher.STATUS_CHOICES,
+        'is_first_page': not cursor,
+        'next_cursor': next_cursor,
     }
     return render(request, 'finance_app/voucher_list.html', context)
 
@@ -107,7 +212,7 @@ def voucher_list(request):
 def voucher_detail(request, voucher_id):
     """凭证详情"""
     voucher = get_object_or_404(Voucher, voucher_id=voucher_id)
-    entries = voucher.entries.all()
+    entries = voucher.entries.select_related('account').order_by('id')
 
     context = {
         'voucher': voucher,
@@ -121,7 +226,9 @@ def voucher_detail(request, voucher_id):
 @check_finance_permission('voucher')
 def voucher_create(request):
     """创建新凭证"""
-    JournalEntryFormSet = formset_factory(JournalEntryForm, extra=2, min_num=2, validate_min=True)
+    JournalEntryFormSet = formset_factory(
+        JournalEntryForm, formset=BaseJournalEntryFormSet, extra=2, min_num=2, validate_min=True
+    )
 
     if request.method == 'POST':
         voucher_form = VoucherForm(request.POST)
@@ -129,48 +236,36 @@ def voucher_create(request):
 
         if voucher_form.is_valid() and entry_formset.is_valid():
             try:
+                # 计算借贷总额
+                entries, total_debit, total_credit = collect_entries(entry_formset)
+
+                # 检查借贷平衡
+                if total_debit != total_credit:
+                    messages.error(request, f'借贷不平衡！借方合计：{total_debit}，贷方合计：{total_credit}')
+                    context = {
+                        'voucher_form': voucher_form,
+                        'entry_formset': entry_formset,
+                        'title': '创建会计凭证',
+                        'accounts': Account.objects.filter(status='ACTIVE'),
+                    }
+                    return render(request, 'finance_app/voucher_create.html', context)
+
                 with transaction.atomic():
-                    # 保存凭证
+                    # 设置总额并保存凭证
                     voucher = voucher_form.save(commit=False)
                     voucher.created_by = request.user
-
-                    # 计算借贷总额
-                    total_debit = 0
-                    total_credit = 0
-                    entries_data = []
-
-                    for form in entry_formset:
-                        if form.cleaned_data:
-                            entry = form.save(commit=False)
-                            if entry.direction == 'DEBIT':
-                                total_debit += entry.amount
-                            else:
-                                total_credit += entry.amount
-                            entries_data.append(entry)
-
-                    # 检查借贷平衡
-                    if total_debit != total_credit:
-                        messages.error(request, f'借贷不平衡！借方合计：{total_debit}，贷方合计：{total_credit}')
-                        context = {
-                            'voucher_form': voucher_form,
-                            'entry_formset': entry_formset,
-                            'title': '创建会计凭证',
-                            'accounts': Account.objects.filter(status='ACTIVE'),
-                        }
-                        return render(request, 'finance_app/voucher_create.html', context)
-
-                    # 设置总额并保存凭证
                     voucher.total_debit = total_debit
                     voucher.total_credit = total_credit
                     voucher.save()
 
-                    # 保存分录
-                    for entry in entries_data:
+                    # 批量保存分录
+                    for entry in entries:
                         entry.voucher = voucher
-                        entry.save()
+                    JournalEntry.objects.bulk_create(entries)
 
-                    messages.success(request, '凭证创建成功！')
-                    return redirect('finance_app:voucher_detail', voucher_id=voucher.voucher_id)
+                record_operation_log(request, 'CREATE', '凭证管理', f'创建凭证 {voucher.voucher_id}')
+                messages.success(request, '凭证创建成功！')
+                return redirect('finance_app:voucher_detail', voucher_id=voucher.voucher_id)
 
             except Exception as e:
                 messages.error(request, f'保存失败：{str(e)}')
@@ -215,7 +310,7 @@ def voucher_edit(request, voucher_id):
         messages.error(request, '只能编辑草稿状态的凭证')
         return redirect('finance_app:voucher_detail', voucher_id=voucher_id)
 
-    JournalEntryFormSet = formset_factory(JournalEntryForm, extra=1, min_num=2)
+    JournalEntryFormSet = formset_factory(JournalEntryForm, formset=BaseJournalEntryFormSet, extra=1, min_num=2)
 
     if request.method == 'POST':
         voucher_form = VoucherForm(request.POST, instance=voucher)
@@ -223,45 +318,32 @@ def voucher_edit(request, voucher_id):
 
         if voucher_form.is_valid() and entry_formset.is_valid():
             try:
-                with transaction.atomic():
-                    # 删除原有的分录
-                    voucher.entries.all().delete()
+                # 重新计算借贷总额
+                entries, total_debit, total_credit = collect_entries(entry_formset)
+
+                # 检查平衡（在写入数据库之前）
+                if total_debit != total_credit:
+                    messages.error(request, f'借贷不平衡！借方：{total_debit}，贷方：{total_credit}')
+                    return render(request, 'finance_app/voucher_edit.html', {
+                        'voucher_form': voucher_form,
+                        'entry_formset': entry_formset,
+                        'voucher': voucher,
+                        'title': f'编辑凭证 - {voucher.voucher_id}'
+                    })
 
-                    # 更新凭证
+                with transaction.atomic():
+                    # 更新总额并保存凭证
                     updated_voucher = voucher_form.save(commit=False)
-
-                    # 重新计算借贷总额
-                    total_debit = 0
-                    total_credit = 0
-
-                    for form in entry_formset:
-                        if form.cleaned_data and not form.cleaned_data.get('DELETE', False):
-                            entry = form.save(commit=False)
-                            entry.voucher = updated_voucher
-                            entry.save()
-
-                            if entry.direction == 'DEBIT':
-                                total_debit += entry.amount
-                            else:
-                                total_credit += entry.amount
-
-                    # 检查平衡
-                    if total_debit != total_credit:
-                        messages.error(request, f'借贷不平衡！借方：{total_debit}，贷方：{total_credit}')
-                        return render(request, 'finance_app/voucher_edit.html', {
-                            'voucher_form': voucher_form,
-                            'entry_formset': entry_formset,
-                            'voucher': voucher,
-                            'title': f'编辑凭证 - {voucher.voucher_id}'
-                        })
-
-                    # 更新总额并保存
                     updated_voucher.total_debit = total_debit
                     updated_voucher.total_credit = total_credit
                     updated_voucher.save()
 
-                    messages.success(request, '凭证更新成功！')
-                    return redirect('finance_app:voucher_detail', voucher_id=voucher.voucher_id)
+                    # 只写入有变化的分录
+                    sync_voucher_entries(updated_voucher, entries)
+
+                record_operation_log(request, 'UPDATE', '凭证管理', f'修改凭证 {voucher.voucher_id}')
+                messages.success(request, '凭证更新成功！')
+                return redirect('finance_app:voucher_detail', voucher_id=voucher.voucher_id)
 
             except Exception as e:
                 messages.error(request, f'更新失败：{str(e)}')
@@ -269,7 +351,7 @@ def voucher_edit(request, voucher_id):
         voucher_form = VoucherForm(instance=voucher)
 
         # 初始化分录表单集
-        entries = voucher.entries.all()
+        entries = voucher.entries.select_related('account').order_by('id')
         initial_data = []
         for entry in entries:
             initial_data.append({
@@ -302,7 +384,12 @@ def voucher_submit(request, voucher_id):
         messages.error(request, '只能提交草稿状态的凭证')
     else:
         voucher.status = 'SUBMITTED'
-        voucher.save()
+        try:
+            voucher.save()
+        except ValueError as e:  # 凭证所在期间已结账
+            messages.error(request, str(e))
+            return redirect('finance_app:voucher_detail', voucher_id=voucher_id)
+        record_operation_log(request, 'UPDATE', '凭证管理', f'提交凭证 {voucher_id} 审核')
         messages.success(request, f'凭证 {voucher_id} 已提交审核')
 
     return redirect('finance_app:voucher_detail', voucher_id=voucher_id)
@@ -345,6 +432,44 @@ def check_voucher_balance(request):
         })
 
 
+@login_required
+@check_finance_permission('voucher')
+def voucher_import(request):
+    """
+    批量导入凭证（POST 上传 CSV / JSONL 文件，字段 file）
+    可选参数：format（csv / jsonl，默认按文件名判断）、batch_size
+    文件逐行读取校验，返回导入统计和出错的行
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': '只支持 POST 请求'}, status=405)
+
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': '请上传导入文件'}, status=400)
+
+    file_format = request.POST.get('format') or detect_format(upload.name)
+    if file_format not in IMPORT_FORMATS:
+        return JsonResponse({'error': f'不支持的导入格式：{file_format}'}, status=400)
+
+    try:
+        batch_size = int(request.POST.get('batch_size') or IMPORT_BATCH_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'batch_size 必须是整数'}, status=400)
+
+    # 上传文件按行解码读取，不整体读入内存
+    stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    try:
+        result = VoucherImporter(request.user, batch_size=batch_size).run(read_rows(stream, file_format))
+    except UnicodeDecodeError:
+        return JsonResponse({'error': '文件编码必须是 UTF-8'}, status=400)
+    finally:
+        stream.detach()
+
+    record_operation_log(request, 'CREATE', '凭证管理',
+                         f'导入凭证文件 {upload.name}：成功 {result.vouchers} 张，失败 {result.failed_vouchers} 张')
+    return JsonResponse(result.as_dict())
+
+
 # 供应商相关视图 - 只有admin和有供应商权限的角色可以访问
 @login_required
 @check_finance_permission('supplier')
@@ -533,40 +658,107 @@ def customer_toggle_status(request, customer_id):
 @check_finance_permission('voucher')
 def report_home(request):
     """财务报表主页"""
-    # 获取最近的期间（从凭证编号中提取）
-    vouchers = Voucher.objects.all().order_by('-voucher_date')[:10]
-    recent_periods = []
-    for voucher in vouchers:
-        # 从凭证编号 V2024010001 中提取 202401
-        if voucher.voucher_id.startswith('V') and len(voucher.voucher_id) >= 7:
-            try:
-                period = voucher.voucher_id[1:7]  # 提取年月部分（V2024010001 -> 202401）
-                # 验证是否是有效的期间格式（6位数字）
-                if period.isdigit() and len(period) == 6:
-                    if not any(p['period'] == period for p in recent_periods):
-                        recent_periods.append({'period': period})
-            except (IndexError, ValueError):
-                continue
+    # 获取最近的期间
+    recent_periods = [
+        {'period': period}
+        for period in Voucher.objects.values_list('period', flat=True)
+        .distinct().order_by('-period')[:8]
+    ]
 
     # 获取已生成的报表
     balance_sheets = BalanceSheet.objects.all().order_by('-period')[:5]
     income_statements = IncomeStatement.objects.all().order_by('-period')[:5]
 
+    # 未结束和最近完成的报表生成任务
+    report_jobs = list(ReportJob.objects.filter(status__in=ReportJob.ACTIVE_STATUSES)) + list(
+        ReportJob.objects.exclude(status__in=ReportJob.ACTIVE_STATUSES)[:5]
+    )
+
     # 获取已生成的期间
     existing_balance_sheets = list(BalanceSheet.objects.values_list('period', flat=True))
     existing_income_statements = list(IncomeStatement.objects.values_list('period', flat=True))
 
+    # 结账状态
+    closed_periods = ReportPeriod.closed_periods(item['period'] for item in recent_periods)
+    for item in recent_periods:
+        item['is_closed'] = item['period'] in closed_periods
+
     context = {
         'title': '财务报表',
-        'recent_periods': recent_periods[:8],  # 最多显示8个期间
+        'recent_periods': recent_periods,  # 最多显示8个期间
         'balance_sheets': balance_sheets,
         'income_statements': income_statements,
         'existing_balance_sheets': existing_balance_sheets,
         'existing_income_statements': existing_income_statements,
+        'report_jobs': report_jobs,
+        'can_close_periods': can_close_periods(request.user),
     }
     return render(request, 'finance_app/report_home.html', context)
 
 
+# 报表类型 -> (列表页, 详情页)
+REPORT_JOB_URLS = {
+    'BALANCE_SHEET': ('finance_app:balance_sheet_list', 'finance_app:balance_sheet_detail'),
+    'INCOME_STATEMENT': ('finance_app:income_statement_list', 'finance_app:income_statement_detail'),
+}
+
+
+def report_job_data(job):
+    """报表任务的 JSON 数据"""
+    data = {
+        'id': job.pk,
+        'report_type': job.report_type,
+        'report_type_display': job.get_report_type_display(),
+        'period': job.period,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'message': job.message,
+        'status_url': reverse('finance_app:report_job_status', args=[job.pk]),
+        'result_url': None,
+    }
+    if job.status == 'SUCCESS':
+        data['result_url'] = reverse(REPORT_JOB_URLS[job.report_type][1], kwargs={'period': job.period})
+    return data
+
+
+def submit_report_job_response(request, report_type, period):
+    """提交报表生成任务：AJAX 请求返回任务 JSON，普通表单提交跳转到报表主页查看进度"""
+    list_url, detail_url = REPORT_JOB_URLS[report_type]
+    try:
+        job, created = submit_report_job(report_type, period, request.user)
+    except ValueError as e:
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse({'error': str(e)}, status=400)
+        messages.error(request, str(e))
+        return redirect(list_url)
+
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({**report_job_data(job), 'created': created}, status=202 if created else 200)
+
+    # REPORT_JOBS_RUN_INLINE 时任务已在本次请求中执行完毕
+    if job.status == 'SUCCESS':
+        messages.success(request, job.message)
+        return redirect(detail_url, period=period)
+    if job.status == 'FAILED':
+        messages.error(request, job.message)
+        return redirect(list_url)
+
+    if created:
+        messages.info(request, f'{period}{job.get_report_type_display()}生成任务已提交（任务号 {job.pk}），请稍候')
+    else:
+        messages.info(request, f'{period}{job.get_report_type_display()}已在生成中（任务号 {job.pk}）')
+    return redirect('finance_app:report_home')
+
+
+@login_required
+@check_finance_permission('voucher')
+def report_job_status(request, job_id):
+    """报表生成任务状态（供前端轮询）"""
+    job = get_object_or_404(ReportJob, pk=job_id)
+    return JsonResponse(report_job_data(job))
+
+
 @login_required
 @check_finance_permission('voucher')
 def balance_sheet_list(request):
@@ -597,223 +789,13 @@ def balance_sheet_generate(request):
             messages.error(request, '请选择会计期间')
             return redirect('finance_app:balance_sheet_list')
 
-        try:
-            print(f"🎯 开始生成资产负债表，期间: {period}")
-
-            # 删除已存在的报表
-            BalanceSheet.objects.filter(period=period).delete()
-
-            # 获取该期间凭证
-            period_vouchers = []
-            for voucher in Voucher.objects.filter(status='SUBMITTED'):
-                if voucher.voucher_id.startswith('V') and len(voucher.voucher_id) >= 7:
-                    voucher_period = voucher.voucher_id[1:7]
-                    if voucher_period == period:
-                        period_vouchers.append(voucher)
-
-            print(f"📅 期间 {period} 的凭证: {len(period_vouchers)} 张")
-
-            if not period_vouchers:
-                messages.error(request, f'期间 {period} 没有找到凭证')
-                return redirect('finance_app:balance_sheet_list')
-
-            # 🔥 初始化各项金额
-            current_assets = 0  # 流动资产
-            fixed_assets = 0  # 固定资产
-            intangible_assets = 0  # 无形资产
-            other_assets = 0  # 其他资产
-
-            current_liabilities = 0  # 流动负债
-            long_term_liabilities = 0  # 长期负债
-
-            paid_in_capital = 0  # 实收资本
-            retained_earnings = 0  # 留存收益
-            current_profit = 0  # 本年利润
-
-            # 🔥 详细记录每个科目的发生额
-            account_totals = {}
-
-            # 遍历所有凭证分录
-            for voucher in period_vouchers:
-                print(f"\n📋 凭证: {voucher.voucher_id}")
-
-                for entry in voucher.entries.all():
-                    account = entry.account
-                    account_code = account.account_code
-                    account_name = account.account_name
-                    amount = entry.amount
-                    direction = entry.direction
-
-                    # 记录到账户总计
-                    if account_code not in account_totals:
-                        account_totals[account_code] = {
-                            'name': account_name,
-                            'type': account.account_type,
-                            'debit': 0,
-                            'credit': 0
-                        }
-
-                    if direction == 'DEBIT':
-                        account_totals[account_code]['debit'] += amount
-                    else:
-                        account_totals[account_code]['credit'] += amount
-
-                    print(f"   {account_code} - {account_name}: {direction} {amount}")
-
-            # 🔥 根据科目类型计算余额
-            for account_code, data in account_totals.items():
-                account_type = data['type']
-                debit_total = data['debit']
-                credit_total = data['credit']
-
-                # 计算科目余额
-                if account_type == 'ASSET':
-                    # 资产类：借方 - 贷方
-                    balance = debit_total - credit_total
-
-                    # 根据科目编码分类
-                    if account_code in ['1001', '1002', '1121', '1122', '1221', '1231', '1406']:
-                        current_assets += balance
-                        print(f"📦 流动资产 - {data['name']}: {balance}")
-                    elif account_code.startswith('15') or account_code.startswith('16'):
-                        fixed_assets += balance
-                    elif account_code.startswith('17') or account_code.startswith('18'):
-                        intangible_assets += balance
-                    else:
-                        other_assets += balance
-
-                elif account_type == 'LIABILITY':
-                    # 负债类：贷方 - 借方
-                    balance = credit_total - debit_total
-
-                    if account_code in ['2001', '2002', '2201', '2202', '2221', '2231']:
-                        current_liabilities += balance
-                        print(f"🧾 流动负债 - {data['name']}: {balance}")
-                    else:
-                        long_term_liabilities += balance
-
-                elif account_type == 'EQUITY':
-                    # 权益类：贷方 - 借方
-                    balance = credit_total - debit_total
-
-                    if account_code.startswith('30') or account_code.startswith('31'):
-                        paid_in_capital += balance
-                    elif account_code.startswith('32') or account_code == '3301':
-                        retained_earnings += balance
-                    elif account_code == '3131':
-                        current_profit += balance
-
-                elif account_type == 'PROFIT':
-                    # 🔥 关键修复：损益类科目净额计入本年利润
-                    # 收入类：贷方 - 借方（正数表示收入）
-                    # 费用类：借方 - 贷方（正数表示费用）
-
-                    if account_code.startswith('6'):  # 收入类
-                        net_income = credit_total - debit_total
-                        if net_income > 0:
-                            current_profit += net_income
-                            print(f"💰 收入 - {data['name']}: +{net_income}")
-                        else:
-                            current_profit += net_income  # 可能是负数（收入减少）
-                    else:  # 费用类
-                        net_expense = debit_total - credit_total
-                        if net_expense > 0:
-                            current_profit -= net_expense  # 费用减少利润
-                            print(f"💸 费用 - {data['name']}: -{net_expense}")
-
-            # 🔥 验证平衡
-            total_assets = current_assets + fixed_assets + intangible_assets + other_assets
-            total_liabilities = current_liabilities + long_term_liabilities
-            total_equity = paid_in_capital + retained_earnings + current_profit
-
-            print(f"\n{'=' * 60}")
-            print(f"📊 平衡验证:")
-            print(f"  资产总计: {total_assets:.2f}")
-            print(f"  负债总计: {total_liabilities:.2f}")
-            print(f"  权益总计: {total_equity:.2f}")
-            print(f"  差额: {total_assets - (total_liabilities + total_equity):.2f}")
-
-            # 如果差额很小，自动调整（会计中的四舍五入误差）
-            balance_diff = total_assets - (total_liabilities + total_equity)
-            if abs(balance_diff) < 0.01:
-                print("✅ 资产负债表平衡！")
-            elif abs(balance_diff) < 10:  # 小误差调整到其他资产
-                print(f"⚠️  有小误差 {balance_diff:.2f}，自动调整")
-                if balance_diff > 0:
-                    other_assets += balance_diff
-                else:
-                    other_assets -= balance_diff  # other_assets可能变负，但会被max修正
-            else:
-                print(f"❌ 资产负债表不平衡！差额: {balance_diff:.2f}")
-                # 可以在这里抛出错误或记录日志
-
-            # 确保所有值为非负
-            current_assets = max(current_assets, 0)
-            fixed_assets = max(fixed_assets, 0)
-            intangible_assets = max(intangible_assets, 0)
-            other_assets = max(other_assets, 0)
-
-            current_liabilities = max(current_liabilities, 0)
-            long_term_liabilities = max(long_term_liabilities, 0)
-
-            paid_in_capital = max(paid_in_capital, 0)
-            retained_earnings = max(retained_earnings, 0)
-            current_profit = max(current_profit, 0)
-
-            # 重新计算总计（调整后）
-            total_assets = current_assets + fixed_assets + intangible_assets + other_assets
-            total_liabilities = current_liabilities + long_term_liabilities
-            total_equity = paid_in_capital + retained_earnings + current_profit
-
-            print(f"\n📈 最终结果:")
-            print(f"  流动资产: {current_assets:.2f}")
-            print(f"  固定资产: {fixed_assets:.2f}")
-            print(f"  无形资产: {intangible_assets:.2f}")
-            print(f"  其他资产: {other_assets:.2f}")
-            print(f"  流动负债: {current_liabilities:.2f}")
-            print(f"  长期负债: {long_term_liabilities:.2f}")
-            print(f"  实收资本: {paid_in_capital:.2f}")
-            print(f"  留存收益: {retained_earnings:.2f}")
-            print(f"  本年利润: {current_profit:.2f}")
-            print(f"  资产总计: {total_assets:.2f}")
-            print(f"  负债和权益总计: {(total_liabilities + total_equity):.2f}")
-
-            # 创建资产负债表
-            sheet = BalanceSheet.objects.create(
-                period=period,
-                generated_by=request.user,
-                current_assets=current_assets,
-                fixed_assets=fixed_assets,
-                intangible_assets=intangible_assets,
-                other_assets=other_assets,
-                current_liabilities=current_liabilities,
-                long_term_liabilities=long_term_liabilities,
-                paid_in_capital=paid_in_capital,
-                retained_earnings=retained_earnings,
-                current_profit=current_profit,
-            )
-
-            sheet.save()
-
-            messages.success(request, f'{period}资产负债表已生成！')
-            return redirect('finance_app:balance_sheet_detail', period=period)
-
-        except Exception as e:
-            messages.error(request, f'生成失败：{str(e)}')
-            import traceback
-            traceback.print_exc()
-            return redirect('finance_app:balance_sheet_list')
-
-    # GET请求（保持不变）
-    periods_set = set()
-
-    for voucher in Voucher.objects.filter(status='SUBMITTED'):
-        if voucher.voucher_id.startswith('V') and len(voucher.voucher_id) >= 7:
-            period = voucher.voucher_id[1:7]
-            if period.isdigit() and len(period) == 6:
-                periods_set.add(period)
+        return submit_report_job_response(request, 'BALANCE_SHEET', period)
 
-    periods = sorted(periods_set, reverse=True)[:12]
+    # GET请求：已提交凭证涉及的期间
+    periods = list(
+        Voucher.objects.filter(status='SUBMITTED').values_list('period', flat=True)
+        .distinct().order_by('-period')[:12]
+    )
 
     context = {
         'periods': periods,
@@ -980,144 +962,13 @@ def income_statement_generate(request):
             messages.error(request, '请选择会计期间')
             return redirect('finance_app:income_statement_list')
 
-        try:
-            print(f"🎯 开始生成利润表，期间: {period}")
-
-            # 🔥 允许重新生成
-            IncomeStatement.objects.filter(period=period).delete()
-            print(f"📝 已删除旧的 {period} 期间利润表")
-
-            # 🔥 获取该期间凭证（使用相同的提取逻辑）
-            period_vouchers = []
-            for voucher in Voucher.objects.filter(status='SUBMITTED'):
-                voucher_period = None
-
-                # 从凭证编号提取
-                if voucher.voucher_id.startswith('V') and len(voucher.voucher_id) >= 7:
-                    period_part = voucher.voucher_id[1:7]
-                    if period_part.isdigit() and len(period_part) == 6:
-                        voucher_period = period_part
-
-                # 从凭证日期提取
-                if not voucher_period and voucher.voucher_date:
-                    voucher_period = voucher.voucher_date.strftime('%Y%m')
-
-                if voucher_period == period:
-                    period_vouchers.append(voucher)
-
-            print(f"📅 期间 {period} 匹配到的凭证: {len(period_vouchers)} 张")
-
-            if not period_vouchers:
-                messages.error(request, f'期间 {period} 没有找到已提交的凭证')
-                return redirect('finance_app:income_statement_list')
-
-            # 初始化（和原来一样）
-            operating_revenue = 0
-            other_revenue = 0
-            operating_cost = 0
-            selling_expenses = 0
-            admin_expenses = 0
-            financial_expenses = 0
-            other_income = 0
-            other_expenses = 0
-            tax_expense = 0
-
-            # 遍历凭证（和原来一样）
-            for voucher in period_vouchers:
-                for entry in voucher.entries.all():
-                    account = entry.account
-
-                    # 只处理损益类科目
-                    if account.account_type != 'PROFIT':
-                        continue
-
-                    account_code = account.account_code
-
-                    # 收入类科目
-                    if account_code in ['6001', '6002', '6051']:
-                        if entry.direction == 'CREDIT':
-                            operating_revenue += entry.amount
-                        else:
-                            operating_revenue -= entry.amount
-
-                    # 成本费用类科目
-                    elif account_code in ['6401', '6402']:
-                        if entry.direction == 'DEBIT':
-                            operating_cost += entry.amount
-                        else:
-                            operating_cost -= entry.amount
-
-                    # 期间费用
-                    elif account_code.startswith('660'):
-                        if entry.direction == 'DEBIT':
-                            if account_code.startswith('6601'):
-                                selling_expenses += entry.amount
-                            elif account_code.startswith('6602'):
-                                admin_expenses += entry.amount
-                            elif account_code.startswith('6603'):
-                                financial_expenses += entry.amount
-                        else:
-                            if account_code.startswith('6601'):
-                                selling_expenses -= entry.amount
-                            elif account_code.startswith('6602'):
-                                admin_expenses -= entry.amount
-                            elif account_code.startswith('6603'):
-                                financial_expenses -= entry.amount
-
-            # 确保非负值
-            operating_revenue = max(operating_revenue, 0)
-            operating_cost = max(operating_cost, 0)
-            selling_expenses = max(selling_expenses, 0)
-            admin_expenses = max(admin_expenses, 0)
-            financial_expenses = max(financial_expenses, 0)
-
-            # 打印汇总
-            print(f"\n{'=' * 60}")
-            print(f"📈 利润表计算结果:")
-            print(f"  营业收入: {operating_revenue:.2f}")
-            print(f"  营业成本: {operating_cost:.2f}")
-            print(f"  销售费用: {selling_expenses:.2f}")
-            print(f"  管理费用: {admin_expenses:.2f}")
-
-            # 创建利润表
-            statement = IncomeStatement.objects.create(
-                period=period,
-                generated_by=request.user,
-                operating_revenue=operating_revenue,
-                other_revenue=other_revenue,
-                operating_cost=operating_cost,
-                selling_expenses=selling_expenses,
-                admin_expenses=admin_expenses,
-                financial_expenses=financial_expenses,
-                other_income=other_income,
-                other_expenses=other_expenses,
-                tax_expense=tax_expense,
-            )
-
-            statement.save()
-
-            messages.success(request, f'{period}利润表已成功生成！')
-            return redirect('finance_app:income_statement_detail', period=period)
+        return submit_report_job_response(request, 'INCOME_STATEMENT', period)
 
-        except Exception as e:
-            messages.error(request, f'生成失败：{str(e)}')
-            import traceback
-            traceback.print_exc()
-            return redirect('finance_app:income_statement_list')
-
-    # 🔥 GET请求时智能提取期间（和资产负债表一样）
-    periods_set = set()
-
-    for voucher in Voucher.objects.filter(status='SUBMITTED'):
-        if voucher.voucher_id.startswith('V') and len(voucher.voucher_id) >= 7:
-            period = voucher.voucher_id[1:7]
-            if period.isdigit() and len(period) == 6:
-                periods_set.add(period)
-        elif voucher.voucher_date:
-            period = voucher.voucher_date.strftime('%Y%m')
-            periods_set.add(period)
-
-    periods = sorted(periods_set, reverse=True)
+    # 🔥 GET请求时提取期间（和资产负债表一样）
+    periods = list(
+        Voucher.objects.filter(status='SUBMITTED').values_list('period', flat=True)
+        .distinct().order_by('-period')
+    )
 
     # 如果没有凭证，提供最近3个月
     if not periods:
@@ -1232,10 +1083,158 @@ def income_statement_detail(request, period):
         return redirect('finance_app:income_statement_list')
     except Exception as e:
         messages.error(request, f'加载利润表失败：{str(e)}')
-        import traceback
-        traceback.print_exc()
+        logger.exception('加载利润表失败：%s', period)
         return redirect('finance_app:income_statement_list')
 
+def parse_trial_balance_params(request):
+    """
+    试算平衡表参数：start / end 为起止期间（默认当前期间），level 为显示的科目级次（默认全部），
+    source 为数据来源（ledger / entries，默认按期间是否已结账自动选择）
+    参数无效时抛出 ValueError
+    """
+    current_period = timezone.now().strftime('%Y%m')
+    start = parse_export_period(request, 'start') or current_period
+    end = parse_export_period(request, 'end') or start
+    if start > end:
+        raise ValueError(f'起始期间 {start} 晚于结束期间 {end}')
+
+    level = request.GET.get('level', '').strip()
+    if level:
+        if not level.isdigit() or int(level) < 1:
+            raise ValueError(f'无效的科目级次：{level}')
+        level = int(level)
+
+    source = request.GET.get('source', '').strip()
+    if source and source not in TRIAL_BALANCE_SOURCES:
+        raise ValueError(f'无效的数据来源：{source}')
+    return start, end, level or None, source or None
+
+
+@login_required
+@check_finance_permission('voucher')
+def trial_balance(request):
+    """试算平衡表（任意期间范围，各科目期初余额、本期发生额、期末余额）"""
+    try:
+        start, end, level, source = parse_trial_balance_params(request)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('finance_app:report_home')
+
+    result = build_trial_balance(start, end, level=level, source=source)
+    context = {
+        'title': '试算平衡表',
+        'start': start,
+        'end': end,
+        'level': level or '',
+        'levels': range(1, 5),
+        'rows': result['rows'],
+        'totals': result['totals'],
+        'is_balanced': result['is_balanced'],
+        'source': result['source'],
+        'requested_source': source or '',
+        'export_query': urlencode({'start': start, 'end': end, 'level': level or '', 'source': source or ''}),
+        'ledger_query': urlencode({
+            'start': period_date_range(start)[0].isoformat(),
+            'end': period_date_range(end)[1].isoformat(),
+        }),
+    }
+    return render(request, 'finance_app/trial_balance.html', context)
+
+
+def parse_ledger_date(request, key, default):
+    """读取 YYYY-MM-DD 格式的日期参数，未提供时返回默认值，无效时抛出 ValueError"""
+    value = request.GET.get(key, '').strip()
+    if not value:
+        return default
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'无效的日期：{value}')
+
+
+@login_required
+@check_finance_permission('voucher')
+def account_ledger(request, account_code):
+    """科目明细账（start / end 为起止日期，默认本月；cursor 为翻页游标）"""
+    account = get_object_or_404(Account, account_code=account_code)
+
+    today = timezone.localdate()
+    try:
+        start = parse_ledger_date(request, 'start', today.replace(day=1))
+        end = parse_ledger_date(request, 'end', today)
+        if start > end:
+            raise ValueError(f'起始日期 {start} 晚于结束日期 {end}')
+        page = account_ledger_page(account, start, end, cursor=request.GET.get('cursor') or None)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('finance_app:report_home')
+
+    query = {'start': start.isoformat(), 'end': end.isoformat()}
+    context = {
+        'title': f'{account.account_code} {account.account_name} 明细账',
+        'account': account,
+        'start': start,
+        'end': end,
+        'opening': page['opening'],
+        'rows': page['rows'],
+        'page_size': LEDGER_PAGE_SIZE,
+        'first_page_query': urlencode(query),
+        'next_page_query': urlencode({**query, 'cursor': page['next_cursor']}) if page['next_cursor'] else '',
+        'export_query': urlencode({'start': start.strftime('%Y%m'), 'end': end.strftime('%Y%m')}),
+    }
+    return render(request, 'finance_app/account_ledger.html', context)
+
+
+# 可以结账 / 反结账的角色
+PERIOD_CLOSE_ROLES = ('ADMIN', 'ACCOUNTANT_SUPERVISOR')
+
+
+def can_close_periods(user):
+    """用户是否可以结账 / 反结账"""
+    return user.username == SUPERUSER_NAME or user_has_role(user, PERIOD_CLOSE_ROLES)
+
+
+@login_required
+@check_finance_permission('voucher')
+def period_close(request, period):
+    """期间结账（POST）：重算总分类账、结转下期期初、冻结余额快照，之后拒绝写入本期凭证"""
+    if request.method != 'POST':
+        return redirect('finance_app:report_home')
+    if not can_close_periods(request.user):
+        messages.error(request, '只有管理员和会计主管可以结账')
+        return redirect('finance_app:report_home')
+
+    try:
+        close_period(period, request.user)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('finance_app:report_home')
+
+    record_operation_log(request, 'UPDATE', '财务报表', f'期间 {period} 结账')
+    messages.success(request, f'会计期间 {period} 已结账')
+    return redirect('finance_app:report_home')
+
+
+@login_required
+@check_finance_permission('voucher')
+def period_reopen(request, period):
+    """期间反结账（POST）：清除余额快照，重新开放本期凭证写入"""
+    if request.method != 'POST':
+        return redirect('finance_app:report_home')
+    if not can_close_periods(request.user):
+        messages.error(request, '只有管理员和会计主管可以反结账')
+        return redirect('finance_app:report_home')
+
+    try:
+        reopen_period(period, request.user)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('finance_app:report_home')
+
+    record_operation_log(request, 'UPDATE', '财务报表', f'期间 {period} 反结账')
+    messages.success(request, f'会计期间 {period} 已反结账')
+    return redirect('finance_app:report_home')
+
 # ======================== 报表导出功能 ========================
 
 @login_required
@@ -1244,6 +1243,7 @@ def export_balance_sheet(request, period):
     """导出资产负债表为Excel"""
 
     sheet = get_object_or_404(BalanceSheet, period=period)
+    record_operation_log(request, 'EXPORT', '财务报表', f'导出{period}资产负债表')
 
     # 创建HTTP响应
     response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
@@ -1345,6 +1345,7 @@ def export_income_statement(request, period):
     """导出利润表为Excel"""
 
     statement = get_object_or_404(IncomeStatement, period=period)
+    record_operation_log(request, 'EXPORT', '财务报表', f'导出{period}利润表')
 
     response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
     response['Content-Disposition'] = f'attachment; filename="利润表_{period}.xlsx"'
@@ -1434,6 +1435,81 @@ def export_income_statement(request, period):
     return response
 
 
+# ======================== 明细数据导出（流式） ========================
+
+def parse_export_period(request, key='period'):
+    """读取并校验导出参数中的会计期间，未提供时返回空字符串"""
+    period = request.GET.get(key, '').strip()
+    if period:
+        period_date_range(period)  # 无效时抛出 ValueError
+    return period
+
+
+@login_required
+@check_finance_permission('voucher')
+def export_voucher_journal(request):
+    """导出凭证序时账（可按期间、状态筛选）"""
+    try:
+        period = parse_export_period(request)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('finance_app:voucher_list')
+
+    status = request.GET.get('status', '').strip()
+    record_operation_log(request, 'EXPORT', '凭证管理', f'导出凭证序时账（期间：{period or "全部"}，状态：{status or "全部"}）')
+    return exports.export_voucher_journal(period, status)
+
+
+@login_required
+@check_finance_permission('voucher')
+def export_general_ledger(request):
+    """导出总分类账（可按期间筛选）"""
+    try:
+        period = parse_export_period(request)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('finance_app:report_home')
+
+    record_operation_log(request, 'EXPORT', '账簿', f'导出总分类账（期间：{period or "全部"}）')
+    return exports.export_general_ledger(period)
+
+
+@login_required
+@check_finance_permission('voucher')
+def export_account_ledger(request, account_code):
+    """导出科目明细账（start / end 为起止期间，默认当前期间）"""
+    account = get_object_or_404(Account, account_code=account_code)
+
+    current_period = timezone.now().strftime('%Y%m')
+    try:
+        start = parse_export_period(request, 'start') or current_period
+        end = parse_export_period(request, 'end') or start
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('finance_app:report_home')
+
+    if start > end:
+        messages.error(request, f'起始期间 {start} 晚于结束期间 {end}')
+        return redirect('finance_app:report_home')
+
+    record_operation_log(request, 'EXPORT', '账簿', f'导出科目 {account_code} 明细账（{start} ~ {end}）')
+    return exports.export_account_ledger(account, start, end)
+
+
+@login_required
+@check_finance_permission('voucher')
+def export_trial_balance(request):
+    """导出试算平衡表（参数同试算平衡表页面）"""
+    try:
+        start, end, level, source = parse_trial_balance_params(request)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('finance_app:report_home')
+
+    record_operation_log(request, 'EXPORT', '财务报表', f'导出试算平衡表（{start} ~ {end}）')
+    return exports.export_trial_balance(build_trial_balance(start, end, level=level, source=source), start, end)
+
+
 # ======================== API接口（用于图表） ========================
 
 @login_required
@@ -1546,8 +1622,7 @@ def generate_report_direct(request):
 
     except Exception as e:
         messages.error(request, f'生成失败：{str(e)}')
-        import traceback
-        traceback.print_exc()
+        logger.exception('直接生成财务报表失败：%s', period)
         return redirect('finance_app:report_home')
 
 
@@ -1651,8 +1726,7 @@ def purchase_order_create(request):
 
         except Exception as e:
             messages.error(request, f'创建失败：{str(e)}')
-            import traceback
-            traceback.print_exc()
+            logger.exception('创建采购订单失败')
             return redirect('finance_app:purchase_order_create')
 
     # GET请求：显示表单
@@ -1803,8 +1877,7 @@ def sales_order_create(request):
 
         except Exception as e:
             messages.error(request, f'创建失败：{str(e)}')
-            import traceback
-            traceback.print_exc()
+            logger.exception('创建销售订单失败')
             return redirect('finance_app:sales_order_create')
 
     # GET请求：显示表单
@@ -1,6 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
+from users_app.archive import ARCHIVE_QUERY_LIMIT, list_archives, search_archive
 from users_app.models import Role, UserProfile, UserOperationLog  # 关键：改为users_app
 
 # 内联显示用户扩展信息
@@ -54,12 +58,53 @@ class UserOperationLogAdmin(admin.ModelAdmin):
     list_display = ('user', 'operate_type', 'operate_module', 'operate_time', 'ip_address')
     search_fields = ('user__username', 'operate_module', 'operate_content')
     list_filter = ('operate_type', 'operate_module', 'operate_time')
+    list_select_related = ('user',)
     readonly_fields = ('user', 'operate_type', 'operate_module', 'operate_content', 'operate_time', 'ip_address')
     def has_change_permission(self, request, obj=None):
         return False
     def has_delete_permission(self, request, obj=None):
         return False
 
+    def get_urls(self):
+        urls = [
+            path('archives/', self.admin_site.admin_view(self.archive_view), name='users_app_useroperationlog_archives'),
+        ]
+        return urls + super().get_urls()
+
+    def archive_view(self, request):
+        """查询已归档（archive_oplog）的操作日志，按月读取归档文件"""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        archives = list_archives()
+        month = request.GET.get('month') or (archives[0][0] if archives else '')
+        username = request.GET.get('username', '').strip()
+        operate_type = request.GET.get('operate_type', '')
+        keyword = request.GET.get('q', '').strip()
+
+        total, records = 0, []
+        if month in {archive_month for archive_month, _ in archives}:
+            total, records = search_archive(month, username, operate_type, keyword)
+            operate_type_names = dict(UserOperationLog.OPERATE_TYPE_CHOICES)
+            for record in records:
+                record['operate_type_display'] = operate_type_names.get(record['operate_type'], record['operate_type'])
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': '归档操作日志',
+            'archives': archives,
+            'month': month,
+            'username': username,
+            'operate_type': operate_type,
+            'keyword': keyword,
+            'operate_types': UserOperationLog.OPERATE_TYPE_CHOICES,
+            'total': total,
+            'records': records,
+            'limit': ARCHIVE_QUERY_LIMIT,
+        }
+        return TemplateResponse(request, 'admin/users_app/useroperationlog/archives.html', context)
+
 # 注册用户扩展信息
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
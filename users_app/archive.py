@@ -0,0 +1,163 @@
+# users_app/archive.py
+"""
+操作日志归档
+超过保留期的操作日志按月写入 gzip 压缩的 JSONL 文件（每月一个文件，oplog-YYYYMM.jsonl.gz），
+写入成功后再从日志表中删除，日志表只保留最近几个月的数据。
+归档文件按需读取查询（后台“归档日志”页面），不会重新导入数据库。
+
+重复归档同一个月时以新的 gzip 段追加到原文件；如果写文件后、删除前中断，
+重新归档会写入重复记录，读取时按日志 id 去重。
+"""
+import gzip
+import json
+import os
+import re
+from collections import deque
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UserOperationLog
+
+# 默认保留最近几个月的日志
+DEFAULT_RETENTION_MONTHS = 6
+
+# 每次从数据库读取的行数
+ARCHIVE_CHUNK_SIZE = 2000
+
+# 后台查询归档时最多返回的记录数
+ARCHIVE_QUERY_LIMIT = 500
+
+ARCHIVE_FILE_RE = re.compile(r'^oplog-(\d{6})\.jsonl\.gz$')
+
+ARCHIVE_FIELDS = ['id', 'user_id', 'user__username', 'operate_type', 'operate_module',
+                  'operate_content', 'operate_time', 'ip_address']
+
+
+def get_archive_dir():
+    """归档文件目录（OPERATION_LOG_ARCHIVE_DIR）"""
+    return getattr(settings, 'OPERATION_LOG_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archives', 'oplog'))
+
+
+def archive_path(month, archive_dir=None):
+    return os.path.join(archive_dir or get_archive_dir(), f'oplog-{month}.jsonl.gz')
+
+
+def month_start(month):
+    """期间字符串 YYYYMM 对应的月初时间（当前时区）"""
+    return timezone.make_aware(datetime.strptime(month, '%Y%m'))
+
+
+def next_month(month):
+    year, mon = int(month[:4]), int(month[4:])
+    return f'{year + mon // 12}{mon % 12 + 1:02d}'
+
+
+def archive_cutoff(months, now=None):
+    """保留最近 months 个月（含本月）时的截止月份，早于该月的日志需要归档"""
+    now = timezone.localtime(now)
+    index = now.year * 12 + now.month - 1 - (months - 1)
+    return f'{index // 12}{index % 12 + 1:02d}'
+
+
+def pending_months(cutoff):
+    """日志表中早于截止月份、需要归档的月份列表"""
+    first = UserOperationLog.objects.filter(operate_time__lt=month_start(cutoff)).order_by('operate_time').first()
+    if first is None:
+        return []
+    months = []
+    month = timezone.localtime(first.operate_time).strftime('%Y%m')
+    while month < cutoff:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+def archive_month(month, archive_dir=None):
+    """
+    把一个月的日志追加写入归档文件，然后从日志表中删除
+    只删除已写入文件的记录（id 不超过写入的最大 id），返回归档条数
+    """
+    start, end = month_start(month), month_start(next_month(month))
+    logs = UserOperationLog.objects.filter(operate_time__gte=start, operate_time__lt=end)
+    rows = logs.order_by('operate_time', 'id').values_list(*ARCHIVE_FIELDS)
+
+    archive_dir = archive_dir or get_archive_dir()
+    os.makedirs(archive_dir, exist_ok=True)
+
+    count = 0
+    max_id = None
+    with gzip.open(archive_path(month, archive_dir), 'at', encoding='utf-8') as f:
+        for log_id, user_id, username, operate_type, operate_module, content, operate_time, ip in rows.iterator(
+                chunk_size=ARCHIVE_CHUNK_SIZE):
+            f.write(json.dumps({
+                'id': log_id,
+                'user_id': user_id,
+                'username': username,
+                'operate_type': operate_type,
+                'operate_module': operate_module,
+                'operate_content': content,
+                'operate_time': operate_time.isoformat(),
+                'ip_address': ip,
+            }, ensure_ascii=False))
+            f.write('\n')
+            count += 1
+            max_id = log_id if max_id is None else max(max_id, log_id)
+
+    if count:
+        with transaction.atomic():
+            logs.filter(id__lte=max_id).delete()
+    return count
+
+
+def list_archives(archive_dir=None):
+    """已有的归档文件：[(月份, 文件大小), ...]，按月份倒序"""
+    archive_dir = archive_dir or get_archive_dir()
+    if not os.path.isdir(archive_dir):
+        return []
+    archives = []
+    for name in os.listdir(archive_dir):
+        match = ARCHIVE_FILE_RE.match(name)
+        if match:
+            archives.append((match.group(1), os.path.getsize(os.path.join(archive_dir, name))))
+    return sorted(archives, reverse=True)
+
+
+def read_archive(month, archive_dir=None):
+    """逐条读取一个月的归档记录（按日志 id 去重）"""
+    path = archive_path(month, archive_dir)
+    if not os.path.exists(path):
+        return
+    seen = set()
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record['id'] in seen:
+                continue
+            seen.add(record['id'])
+            yield record
+
+
+def search_archive(month, username='', operate_type='', keyword='', limit=ARCHIVE_QUERY_LIMIT, archive_dir=None):
+    """
+    按条件查询一个月的归档记录
+    返回 (匹配总数, 最近的 limit 条记录)，记录按操作时间倒序
+    """
+    matched = deque(maxlen=limit)  # 文件按时间顺序写入，只保留最后 limit 条
+    total = 0
+    for record in read_archive(month, archive_dir):
+        if username and record['username'] != username:
+            continue
+        if operate_type and record['operate_type'] != operate_type:
+            continue
+        if keyword and keyword not in record['operate_module'] and keyword not in record['operate_content']:
+            continue
+        total += 1
+        matched.append(record)
+
+    records = list(reversed(matched))
+    for record in records:
+        record['operate_time'] = datetime.fromisoformat(record['operate_time'])
+    return total, records
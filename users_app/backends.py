@@ -0,0 +1,18 @@
+# users_app/backends.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+
+class ProfileModelBackend(ModelBackend):
+    """
+    认证后端：每次请求加载当前用户时一并取出扩展信息和角色（一条查询），
+    后续的权限判断和页面显示角色名称不再单独查询数据库
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related('profile__role').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
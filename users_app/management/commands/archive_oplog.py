@@ -0,0 +1,55 @@
+# users_app/management/commands/archive_oplog.py
+"""
+归档操作日志
+  python manage.py archive_oplog --months 6
+
+早于最近 N 个月（含本月）的操作日志按月写入 gzip 压缩的 JSONL 文件，写入后从日志表删除。
+归档文件可在后台“用户操作日志 - 归档日志”页面查询。
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users_app.archive import (
+    DEFAULT_RETENTION_MONTHS, archive_cutoff, archive_month, archive_path, get_archive_dir, pending_months,
+)
+
+
+class Command(BaseCommand):
+    help = '把超过保留期的操作日志按月归档为压缩文件，并从日志表中删除'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int,
+            default=getattr(settings, 'OPERATION_LOG_RETENTION_MONTHS', DEFAULT_RETENTION_MONTHS),
+            help='日志表保留最近几个月的日志（含本月）',
+        )
+        parser.add_argument('--archive-dir', help='归档文件目录（默认 OPERATION_LOG_ARCHIVE_DIR）')
+        parser.add_argument('--dry-run', action='store_true', help='只列出需要归档的月份，不写文件也不删除')
+
+    def handle(self, *args, **options):
+        if options['months'] < 1:
+            raise CommandError('--months 至少为 1')
+
+        archive_dir = options['archive_dir'] or get_archive_dir()
+        cutoff = archive_cutoff(options['months'])
+        months = pending_months(cutoff)
+        if not months:
+            self.stdout.write(self.style.WARNING(f'没有早于 {cutoff} 的操作日志，无需归档'))
+            return
+
+        self.stdout.write(f'归档 {months[0]} ~ {months[-1]} 的操作日志，共 {len(months)} 个月')
+        if options['dry_run']:
+            return
+
+        started = time.perf_counter()
+        total = 0
+        for month in months:
+            count = archive_month(month, archive_dir)
+            total += count
+            if count:
+                self.stdout.write(f'  {month}：{count} 条 -> {archive_path(month, archive_dir)}')
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'归档完成，共 {total} 条，耗时 {elapsed:.2f}s'))
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 01:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users_app', '0002_useroperationlog'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='useroperationlog',
+            name='operate_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='操作时间'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users_app', '0003_operation_log_time_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='useroperationlog',
+            index=models.Index(fields=['operate_time'], name='oplog_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useroperationlog',
+            index=models.Index(fields=['user', 'operate_time'], name='oplog_user_time_idx'),
+        ),
+    ]
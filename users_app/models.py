@@ -66,13 +66,18 @@ class UserOperationLog(models.Model):
     operate_type = models.CharField(max_length=20, choices=OPERATE_TYPE_CHOICES, verbose_name="操作类型")
     operate_module = models.CharField(max_length=50, verbose_name="操作模块")
     operate_content = models.TextField(verbose_name="操作内容")
-    operate_time = models.DateTimeField(auto_now_add=True, verbose_name="操作时间")
+    # 日志由后台线程批量写入，操作时间在记录时取值，而不是写库时
+    operate_time = models.DateTimeField(default=timezone.now, editable=False, verbose_name="操作时间")
     ip_address = models.CharField(max_length=50, blank=True, null=True, verbose_name="IP地址")
 
     class Meta:
         verbose_name = "用户操作日志"
         verbose_name_plural = "用户操作日志"
         ordering = ['-operate_time']
+        indexes = [
+            models.Index(fields=['operate_time'], name='oplog_time_idx'),
+            models.Index(fields=['user', 'operate_time'], name='oplog_user_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.get_operate_type_display()} - {self.operate_module} - {self.operate_time}"
\ No newline at end of file
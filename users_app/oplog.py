@@ -0,0 +1,176 @@
+# users_app/oplog.py
+"""
+操作日志缓冲写入
+record_operation_log 只把日志对象放入进程内队列，由后台线程攒批后用 bulk_create 写入：
+  - 攒够 OPERATION_LOG_BATCH_SIZE 条，或队列中最早的日志已等待 OPERATION_LOG_FLUSH_INTERVAL_MS 毫秒时写入一次；
+  - 进程退出时（atexit）把队列中剩余的日志全部写完；
+  - OPERATION_LOG_ASYNC = False 时在调用处同步写入（测试使用）。
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL_MS = 500
+
+# 队列上限：数据库长时间不可写时丢弃新日志，而不是无限占用内存
+DEFAULT_MAX_QUEUE_SIZE = 10000
+
+# 退出时等待后台线程写完的最长秒数
+STOP_TIMEOUT = 5
+
+logger = logging.getLogger(__name__)
+
+# 通知后台线程写完当前批次后退出
+_STOP = object()
+
+
+class OperationLogWriter:
+    """操作日志的后台批量写入线程"""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, flush_interval_ms=DEFAULT_FLUSH_INTERVAL_MS,
+                 max_queue_size=DEFAULT_MAX_QUEUE_SIZE):
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = max(flush_interval_ms, 0) / 1000
+        self.max_queue_size = max_queue_size
+        self.queue = queue.Queue(max_queue_size)
+        self.written = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+
+    def put(self, log):
+        """把一条未保存的 UserOperationLog 放入队列，不等待写库"""
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(log)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning('操作日志队列已满，丢弃日志：%s %s', log.operate_type, log.operate_module)
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != pid:
+                # fork 出的子进程不会继承后台线程，继承来的队列内容由父进程负责写入
+                self.queue = queue.Queue(self.max_queue_size)
+                self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='operation-log-writer', daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def _run(self):
+        batch = []
+        deadline = None
+        try:
+            while True:
+                # 队列为空时一直等待；已有日志时最多等到本批次的写入时限
+                timeout = None if not batch else max(deadline - time.monotonic(), 0)
+                try:
+                    log = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    log = None
+
+                if log is _STOP:
+                    self.write(batch)
+                    return
+                if log is not None:
+                    if not batch:
+                        deadline = time.monotonic() + self.flush_interval
+                    batch.append(log)
+
+                if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                    self.write(batch)
+                    batch = []
+        finally:
+            connection.close()
+
+    def write(self, logs):
+        """bulk_create 写入一批日志，写库失败时记录错误并丢弃该批"""
+        if not logs:
+            return
+        from .models import UserOperationLog
+
+        try:
+            UserOperationLog.objects.bulk_create(logs)
+        except DatabaseError:
+            self.dropped += len(logs)
+            logger.exception('操作日志写入失败，丢弃 %d 条', len(logs))
+            connection.close()  # 下次写入时重新连接
+            return
+        self.written += len(logs)
+
+    def flush(self):
+        """在调用线程中写入队列里剩余的日志"""
+        logs = []
+        while True:
+            try:
+                log = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if log is _STOP:
+                continue
+            logs.append(log)
+            if len(logs) >= self.batch_size:
+                self.write(logs)
+                logs = []
+        self.write(logs)
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """通知后台线程写完已入队的日志并退出（进程退出时自动调用）"""
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and thread.is_alive():
+            try:
+                self.queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            thread.join(timeout)
+        self._thread = None
+        # 后台线程未能及时退出或未启动时，由当前线程补写
+        self.flush()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """进程内共享的写入器（按配置懒加载）"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = OperationLogWriter(
+                    batch_size=getattr(settings, 'OPERATION_LOG_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+                    flush_interval_ms=getattr(settings, 'OPERATION_LOG_FLUSH_INTERVAL_MS', DEFAULT_FLUSH_INTERVAL_MS),
+                )
+    return _writer
+
+
+def record(log):
+    """记录一条操作日志：默认进入缓冲队列，OPERATION_LOG_ASYNC = False 时同步写入"""
+    if getattr(settings, 'OPERATION_LOG_ASYNC', True):
+        get_writer().put(log)
+    else:
+        log.save()
+
+
+def flush():
+    """立即写入当前进程中尚未写库的日志"""
+    if _writer is not None:
+        _writer.flush()
@@ -0,0 +1,97 @@
+# users_app/permissions.py
+"""
+角色权限服务
+视图装饰器、权限中间件和模板过滤器统一通过这里判断权限：
+  - 角色 -> 权限 的映射只在 ROLE_PERMISSIONS 中定义一次；
+  - 当前用户的角色随用户一起加载（见 users_app.backends.ProfileModelBackend），
+    解析出的权限集合缓存在本次请求的用户对象上。
+用户的角色编码由外键保证存在于角色表中，权限只取决于 ROLE_PERMISSIONS，判断权限时不再查询角色表。
+"""
+
+# 超级管理员用户名（拥有全部权限）
+SUPERUSER_NAME = 'admin'
+
+# 会计系统权限
+PERMISSION_NAMES = {
+    'voucher': '凭证管理',
+    'supplier': '供应商管理',
+    'customer': '客户管理',
+}
+ALL_PERMISSIONS = frozenset(PERMISSION_NAMES)
+
+# 角色权限
+ROLE_PERMISSIONS = {
+    'ADMIN': ALL_PERMISSIONS,  # 管理员有所有权限
+    'GENERAL_ACCOUNTANT': frozenset(['voucher']),  # 总账会计只有凭证权限
+    'PURCHASE_ACCOUNTANT': frozenset(['voucher', 'supplier']),  # 采购会计有凭证和供应商权限
+    'SALES_ACCOUNTANT': frozenset(['voucher', 'customer']),  # 销售会计有凭证和客户权限
+    'ACCOUNTANT_SUPERVISOR': ALL_PERMISSIONS,  # 会计主管有所有权限
+    'CASHIER': frozenset(['voucher']),  # 出纳只有凭证权限
+    'EMPLOYEE': frozenset(),  # 普通员工没有会计权限
+    'HR_STAFF': frozenset(),  # 人事没有会计权限
+}
+
+def get_user_role(user):
+    """
+    用户的 (角色编码, 账号状态)，没有扩展信息时返回 (None, None)
+    结果缓存在用户对象上，同一请求内只解析一次
+    """
+    try:
+        return user._role_info
+    except AttributeError:
+        pass
+
+    role_info = (None, None)
+    if user.is_authenticated:
+        try:
+            profile = user.profile
+        except AttributeError:  # 没有扩展信息（RelatedObjectDoesNotExist）
+            profile = None
+        if profile is not None:
+            role_info = (profile.role_id, profile.status)
+
+    user._role_info = role_info
+    return role_info
+
+
+def get_user_permissions(user):
+    """
+    用户拥有的权限集合，角色未配置权限时返回 None
+    结果缓存在用户对象上，同一请求内只计算一次
+    """
+    try:
+        return user._finance_permissions
+    except AttributeError:
+        pass
+
+    if not user.is_authenticated:
+        permissions = frozenset()
+    elif user.username == SUPERUSER_NAME:
+        permissions = ALL_PERMISSIONS
+    else:
+        role_code, _ = get_user_role(user)
+        if role_code is None:
+            permissions = frozenset()
+        else:
+            permissions = ROLE_PERMISSIONS.get(role_code)
+
+    user._finance_permissions = permissions
+    return permissions
+
+
+def has_permission(user, permission_type):
+    """用户是否拥有指定权限"""
+    return permission_type in (get_user_permissions(user) or ())
+
+
+def user_has_role(user, role_codes):
+    """用户是否为启用状态且属于指定角色之一"""
+    if not user.is_active:
+        return False
+    role_code, status = get_user_role(user)
+    return status == 'ACTIVE' and role_code in role_codes
+
+
+def get_permission_name(permission_type):
+    """获取权限名称"""
+    return PERMISSION_NAMES.get(permission_type, '该功能')
@@ -0,0 +1,16 @@
+# users_app/templatetags/permission_tags.py
+from django import template
+
+from users_app.permissions import has_permission as user_has_permission
+
+register = template.Library()
+
+
+@register.filter
+def has_permission(user, permission_type):
+    """
+    模板标签：检查用户是否有特定权限
+    permission_type: 'voucher', 'supplier', 'customer'
+    权限集合在同一请求内只解析一次，菜单中多次调用不会重复查询
+    """
+    return user_has_permission(user, permission_type)
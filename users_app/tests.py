@@ -1,3 +1,203 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+from datetime import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from .archive import archive_cutoff, archive_month, archive_path, pending_months, read_archive
+from .models import Role, UserOperationLog, UserProfile
+from .oplog import OperationLogWriter
+from .permissions import ALL_PERMISSIONS, get_user_permissions, has_permission, user_has_role
+from .utils import RouteMatcher, collect_route_rules, record_operation_log
+
+
+class PermissionTestCase(TestCase):
+    """公共测试数据：角色和带扩展信息的用户"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for role_code in ('GENERAL_ACCOUNTANT', 'SALES_ACCOUNTANT', 'EMPLOYEE'):
+            Role.objects.create(role_code=role_code, role_name=role_code)
+
+    def make_user(self, username, role_code=None, status='ACTIVE'):
+        user = User.objects.create_user(username, password=username)
+        if role_code is not None:
+            UserProfile.objects.create(user=user, role_id=role_code, department='财务部',
+                                       employee_id=f'E{user.pk:04d}', status=status)
+        # 与 ProfileModelBackend 一样随用户一并加载扩展信息
+        return User.objects.select_related('profile__role').get(pk=user.pk)
+
+
+class RolePermissionTests(PermissionTestCase):
+    """角色权限判断"""
+
+    def test_role_permissions(self):
+        accountant = self.make_user('accountant', 'GENERAL_ACCOUNTANT')
+        self.assertEqual(get_user_permissions(accountant), frozenset(['voucher']))
+        self.assertFalse(has_permission(accountant, 'customer'))
+
+        seller = self.make_user('seller', 'SALES_ACCOUNTANT')
+        self.assertTrue(has_permission(seller, 'customer'))
+
+    def test_superuser_and_user_without_profile(self):
+        self.assertEqual(get_user_permissions(self.make_user('admin')), ALL_PERMISSIONS)
+        self.assertEqual(get_user_permissions(self.make_user('nobody')), frozenset())
+
+    def test_inactive_profile_has_no_role(self):
+        user = self.make_user('former', 'EMPLOYEE', status='INACTIVE')
+        self.assertFalse(user_has_role(user, ['EMPLOYEE']))
+        self.assertTrue(user_has_role(self.make_user('staff', 'EMPLOYEE'), ['EMPLOYEE']))
+
+    def test_permissions_resolved_without_queries(self):
+        Role.objects.create(role_code='CASHIER', role_name='CASHIER')
+        Role.objects.create(role_code='AUDITOR', role_name='AUDITOR')
+        cashier = self.make_user('cashier', 'CASHIER')
+        auditor = self.make_user('auditor', 'AUDITOR')
+        # 角色随用户加载，权限只取决于 ROLE_PERMISSIONS；未配置权限的角色返回 None
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_permissions(cashier), frozenset(['voucher']))
+            self.assertIsNone(get_user_permissions(auditor))
+            self.assertFalse(has_permission(auditor, 'voucher'))
+
+
+class RouteMatcherTests(TestCase):
+    """路由权限匹配"""
+
+    def test_longest_prefix_wins(self):
+        matcher = RouteMatcher([('/finance/', 'voucher'), ('/finance/customers/', 'customer')])
+        self.assertEqual(matcher.match('/finance/customers/1/'), 'customer')
+        self.assertEqual(matcher.match('/finance/vouchers/'), 'voucher')
+        self.assertIsNone(matcher.match('/users/home/'))
+
+    def test_prefixes_are_literal(self):
+        matcher = RouteMatcher([('/a.b/', 'voucher')])
+        self.assertIsNone(matcher.match('/axb/'))
+        self.assertIsNone(RouteMatcher([]).match('/a.b/'))
+
+    def test_rules_collected_from_urlconf(self):
+        rules = dict(collect_route_rules())
+        self.assertEqual(rules['/finance/customers/'], 'customer')
+        self.assertEqual(rules['/finance/vouchers/'], 'voucher')
+
+    def test_middleware_redirects_anonymous_user(self):
+        response = self.client.get('/finance/vouchers/')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('login', response['Location'])
+
+
+class OperationLogTests(TestCase):
+    """操作日志写入"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='operator')
+
+    def make_log(self, content):
+        return UserOperationLog(user=self.user, operate_type='CREATE', operate_module='凭证管理',
+                                operate_content=content)
+
+    @override_settings(OPERATION_LOG_ASYNC=False)
+    def test_sync_mode_writes_in_request(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        request.user = self.user
+        record_operation_log(request, 'CREATE', '凭证管理', '新增凭证')
+        log = UserOperationLog.objects.get()
+        self.assertEqual((log.operate_content, log.ip_address), ('新增凭证', '10.0.0.1'))
+
+    def test_flush_writes_queued_logs_in_batches(self):
+        writer = OperationLogWriter(batch_size=2)
+        for index in range(5):
+            writer.queue.put_nowait(self.make_log(f'日志 {index}'))
+        with self.assertNumQueries(3):
+            writer.flush()
+        self.assertEqual((writer.written, UserOperationLog.objects.count()), (5, 5))
+
+    def test_stop_without_thread_flushes_in_caller(self):
+        writer = OperationLogWriter()
+        writer.queue.put_nowait(self.make_log('退出前的日志'))
+        writer.stop()
+        self.assertTrue(UserOperationLog.objects.filter(operate_content='退出前的日志').exists())
+
+
+class OperationLogArchiveTests(TestCase):
+    """操作日志归档"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='operator')
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.archive_dir = temp_dir.name
+
+    def make_log(self, year, month, day, content='日志'):
+        return UserOperationLog.objects.create(
+            user=self.user, operate_type='CREATE', operate_module='凭证管理', operate_content=content,
+            operate_time=timezone.make_aware(datetime(year, month, day, 12)),
+        )
+
+    def test_cutoff_keeps_current_month_and_crosses_years(self):
+        now = timezone.make_aware(datetime(2024, 7, 15))
+        self.assertEqual(archive_cutoff(6, now), '202402')
+        self.assertEqual(archive_cutoff(1, now), '202407')
+        self.assertEqual(archive_cutoff(9, now), '202311')
+
+    def test_pending_months_start_at_oldest_log(self):
+        self.make_log(2023, 11, 30)
+        self.make_log(2024, 3, 1)
+        self.assertEqual(pending_months('202403'), ['202311', '202312', '202401', '202402'])
+        self.assertEqual(pending_months('202311'), [])
+
+    def test_archive_writes_file_then_deletes_month(self):
+        archived = [self.make_log(2024, 1, day, f'一月 {day}') for day in (1, 31)]
+        kept = self.make_log(2024, 2, 1)
+        self.assertEqual(archive_month('202401', self.archive_dir), 2)
+        self.assertEqual(list(UserOperationLog.objects.values_list('id', flat=True)), [kept.id])
+        records = list(read_archive('202401', self.archive_dir))
+        self.assertEqual([record['id'] for record in records], [log.id for log in archived])
+        self.assertEqual(records[0]['username'], 'operator')
+
+    def test_failed_delete_keeps_rows_and_rerun_does_not_duplicate(self):
+        logs = [self.make_log(2024, 1, day) for day in (1, 2)]
+        with mock.patch.object(QuerySet, 'delete', side_effect=RuntimeError('磁盘已满')):
+            with self.assertRaises(RuntimeError):
+                archive_month('202401', self.archive_dir)
+        # 已写入文件但删除失败：日志仍在表中，重新归档时文件里出现重复记录，读取时按 id 去重
+        self.assertEqual(UserOperationLog.objects.count(), 2)
+        self.assertEqual(archive_month('202401', self.archive_dir), 2)
+        self.assertFalse(UserOperationLog.objects.exists())
+        self.assertEqual([record['id'] for record in read_archive('202401', self.archive_dir)],
+                         [log.id for log in logs])
+
+    def test_command_rerun_has_nothing_to_archive(self):
+        now = timezone.localtime()
+        self.make_log(now.year - 2, 1, 15)
+        current = self.make_log(now.year, now.month, 1)
+        out = io.StringIO()
+        call_command('archive_oplog', months=6, archive_dir=self.archive_dir, stdout=out)
+        self.assertIn('共 1 条', out.getvalue())
+        size = os.path.getsize(archive_path(f'{now.year - 2}01', self.archive_dir))
+
+        out = io.StringIO()
+        call_command('archive_oplog', months=6, archive_dir=self.archive_dir, stdout=out)
+        self.assertIn('无需归档', out.getvalue())
+        self.assertEqual(os.path.getsize(archive_path(f'{now.year - 2}01', self.archive_dir)), size)
+        self.assertEqual(list(UserOperationLog.objects.values_list('id', flat=True)), [current.id])
+
+    def test_admin_view_searches_archive(self):
+        self.make_log(2024, 1, 5, '创建凭证 V1')
+        self.make_log(2024, 1, 6, '删除凭证 V2')
+        archive_month('202401', self.archive_dir)
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        with override_settings(OPERATION_LOG_ARCHIVE_DIR=self.archive_dir):
+            response = self.client.get('/admin/users_app/useroperationlog/archives/', {'q': '删除'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['month'], '202401')
+        self.assertEqual([record['operate_content'] for record in response.context['records']], ['删除凭证 V2'])
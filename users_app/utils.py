@@ -1,21 +1,23 @@
+from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test
+from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
+import re
 import socket
 
+from . import oplog
+from .permissions import get_permission_name, has_permission, user_has_role
+
 
 # -------------------------- 基础角色权限装饰器 --------------------------
 def has_role(role_codes):
     """通用角色校验装饰器"""
 
     def check_role(user):
-        if not user.is_active:
-            return False
-        if not hasattr(user, 'profile'):
-            return False
-        if user.profile.status != 'ACTIVE':
-            return False
-        return user.profile.role.role_code in role_codes
+        return user_has_role(user, role_codes)
 
     return user_passes_test(check_role, login_url='/login/')
 
@@ -32,35 +34,89 @@ is_hr_staff = has_role(['HR_STAFF', 'ADMIN'])
 
 
 # -------------------------- 权限中间件 --------------------------
+# 不做权限检查的路径（在访问 request.user 之前直接放行，不产生数据库查询）
+EXEMPT_PATHS = frozenset(['/login/', '/logout/'])
+EXEMPT_PREFIXES = ('/static/', '/admin/')
+
+# 其他模块的路由角色（完整路径前缀 -> 允许的角色）；
+# 会计模块的路由权限在 finance_app/urls.py 的 ROUTE_PERMISSIONS 中声明
+ROUTE_ROLES = [
+    ('/employee/expense/', ['EMPLOYEE', 'ADMIN']),
+    ('/hr/employee_info/', ['HR_STAFF', 'ADMIN']),
+]
+
+
+def collect_route_rules(resolver=None, prefix='/'):
+    """
+    收集路由权限规则 [(完整路径前缀, 权限或角色列表), ...]
+    遍历根 URLconf 中 include 的模块，读取模块内声明的 ROUTE_PERMISSIONS
+    """
+    from django.urls import URLResolver, get_resolver
+
+    if resolver is None:
+        resolver = get_resolver()
+
+    rules = []
+    for pattern in resolver.url_patterns:
+        if not isinstance(pattern, URLResolver):
+            continue
+        module_prefix = prefix + str(pattern.pattern)
+        for route_prefix, requirement in getattr(pattern.urlconf_module, 'ROUTE_PERMISSIONS', ()):
+            rules.append((module_prefix + route_prefix, requirement))
+        rules.extend(collect_route_rules(pattern, module_prefix))
+    return rules
+
+
+class RouteMatcher:
+    """
+    URL 前缀匹配器
+    所有前缀在初始化时编译成一个正则（长前缀优先），每次请求只需一次匹配
+    """
+
+    def __init__(self, rules):
+        rules = sorted(rules, key=lambda rule: len(rule[0]), reverse=True)
+        self.requirements = {f'r{index}': requirement for index, (_, requirement) in enumerate(rules)}
+        alternatives = '|'.join(
+            f'(?P<r{index}>{re.escape(route_prefix)})' for index, (route_prefix, _) in enumerate(rules)
+        )
+        self.pattern = re.compile(f'^(?:{alternatives})') if rules else None
+
+    def match(self, path):
+        """返回路径对应的权限要求，没有规则时返回 None"""
+        if self.pattern is None:
+            return None
+        match = self.pattern.match(path)
+        return self.requirements[match.lastgroup] if match else None
+
+
 class RolePermissionMiddleware(MiddlewareMixin):
+    """
+    路由级权限检查
+    requirement 为字符串时表示会计权限（如 'voucher'），为列表时表示允许的角色
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.matcher = RouteMatcher(ROUTE_ROLES + collect_route_rules())
+
     def process_request(self, request):
-        if request.path in ['/login/', '/logout/'] or request.path.startswith('/static/') or request.path.startswith(
-                '/admin/'):
+        path = request.path_info
+        if path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+            return None
+
+        requirement = self.matcher.match(path)
+        if requirement is None:
             return None
 
-        url_role_map = {
-            '/finance/voucher/': ['GENERAL_ACCOUNTANT', 'ADMIN'],
-            '/finance/posting/': ['GENERAL_ACCOUNTANT', 'ADMIN'],
-            '/finance/reconciliation/': ['GENERAL_ACCOUNTANT', 'CASHIER', 'ADMIN'],
-            '/finance/tax/': ['GENERAL_ACCOUNTANT', 'ADMIN'],
-            '/finance/currency/': ['GENERAL_ACCOUNTANT', 'ADMIN'],
-            '/finance/report/': ['GENERAL_ACCOUNTANT', 'ACCOUNTANT_SUPERVISOR', 'ADMIN'],
-            '/finance/yearly_close/': ['ACCOUNTANT_SUPERVISOR', 'ADMIN'],
-            '/finance/supplier/': ['PURCHASE_ACCOUNTANT', 'ADMIN'],
-            '/finance/purchase_order/': ['PURCHASE_ACCOUNTANT', 'ADMIN'],
-            '/finance/customer/': ['SALES_ACCOUNTANT', 'ADMIN'],
-            '/finance/sales_order/': ['SALES_ACCOUNTANT', 'ADMIN'],
-            '/employee/expense/': ['EMPLOYEE', 'ADMIN'],
-            '/hr/employee_info/': ['HR_STAFF', 'ADMIN'],
-        }
-
-        for url_prefix, allowed_roles in url_role_map.items():
-            if request.path.startswith(url_prefix):
-                if not request.user.is_authenticated:
-                    from django.shortcuts import redirect
-                    return redirect('/login/')
-                if not has_role(allowed_roles)(request.user):
-                    raise PermissionDenied("你没有访问该功能的权限，请联系管理员")
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+
+        if isinstance(requirement, str):
+            if not has_permission(request.user, requirement):
+                messages.error(request, f'您没有{get_permission_name(requirement)}权限')
+                return redirect('users:home')
+        elif not user_has_role(request.user, requirement):
+            raise PermissionDenied("你没有访问该功能的权限，请联系管理员")
         return None
 
 
@@ -76,13 +132,17 @@ def get_client_ip(request):
 
 
 def record_operation_log(request, operate_type, operate_module, operate_content):
-    """记录用户操作日志（这里修改为users_app）"""
+    """
+    记录用户操作日志（这里修改为users_app）
+    日志进入缓冲队列，由后台线程批量写入，不占用请求时间（见 users_app.oplog）
+    """
     from users_app.models import UserOperationLog  # 关键：改为users_app
     if request.user.is_authenticated:
-        UserOperationLog.objects.create(
-            user=request.user,
+        oplog.record(UserOperationLog(
+            user_id=request.user.pk,
             operate_type=operate_type,
             operate_module=operate_module,
             operate_content=operate_content,
+            operate_time=timezone.now(),
             ip_address=get_client_ip(request)
-        )
\ No newline at end of file
+        ))
\ No newline at end of file